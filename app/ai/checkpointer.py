@@ -0,0 +1,297 @@
+import logging
+import queue
+import sqlite3
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from app.controller.manager.settings_manager import load_settings
+from app.models.database_models import (
+    DEFAULT_POOL_MAX_SIZE,
+    DEFAULT_POOL_MIN_SIZE,
+    DEFAULT_POOL_TIMEOUT,
+    build_postgres_conninfo,
+    pool_registry,
+)
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQLを使用しない場合にチャットの履歴を保存するSQLiteのファイル
+CHAT_MEMORY_DB_PATH = "chat_memory.db"
+# SQLiteのロックが解除されるまで待つ時間(秒)と、1つのトランザクションでまとめて書き込む最大の件数
+SQLITE_BUSY_TIMEOUT = 5.0
+SQLITE_WRITE_BATCH_SIZE = 64
+
+
+@dataclass
+class _WriteJob:
+    # (executemanyかどうか, SQL, パラメータ)のリスト
+    statements: list[tuple[bool, str, Any]]
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Exception | None = None
+
+
+class _BatchedCursor:
+    """実行したSQLを記録し、カーソルを閉じた時にまとめて書き込むためのカーソル"""
+
+    def __init__(self):
+        self.statements: list[tuple[bool, str, Any]] = []
+
+    def execute(self, sql: str, parameters: Any = ()):
+        self.statements.append((False, sql, parameters))
+
+    def executemany(self, sql: str, seq_of_parameters: Any):
+        self.statements.append((True, sql, list(seq_of_parameters)))
+
+
+class WalSqliteSaver(SqliteSaver):
+    """
+    複数のチャットから同時に使用できるSQLiteのチェックポイントの保存先
+
+    SqliteSaverは1つの接続をロックで共有するため、同時に使用するチャットが増えると読み込みも書き込みも直列になる。
+    このクラスはWALモードで、読み込みはスレッドごとの接続で並行して行い、書き込みは専用のスレッドに集めて
+    同時に届いた書き込みを1つのトランザクションでコミットする(コミットの回数を減らし、書き込み同士のロックの競合を防ぐ)。
+    書き込みはコミットされるまで呼び出し元を待たせるため、書き込んだ直後の読み込みで結果を取得できる。
+    """
+
+    def __init__(
+        self,
+        database: str,
+        busy_timeout: float = SQLITE_BUSY_TIMEOUT,
+        max_batch_size: int = SQLITE_WRITE_BATCH_SIZE,
+        *,
+        serde: SerializerProtocol | None = None,
+    ):
+        self.database = database
+        self.busy_timeout = busy_timeout
+        self.max_batch_size = max(max_batch_size, 1)
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._queue: queue.Queue[_WriteJob | None] = queue.Queue()
+        self._closed = False
+        self._counters = {"writes": 0, "batches": 0, "errors": 0}
+        super().__init__(self._connect(), serde=serde)
+        self.setup()
+        self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """呼び出し元のスレッドの読み込み用の接続"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @conn.setter
+    def conn(self, conn: sqlite3.Connection):
+        self._local.conn = conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # トランザクションは明示的に開始するため自動コミットで接続する(読み込みがスナップショットを保持し続けない)
+        conn = sqlite3.connect(self.database, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        with self.lock:
+            super().setup()
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor | _BatchedCursor]:
+        """
+        読み込みの場合はスレッドごとの接続のカーソルを返す
+        書き込みの場合はSQLを記録するカーソルを返し、閉じた時に書き込み用のスレッドでまとめて書き込む
+        """
+        self.setup()
+        if not transaction:
+            cur = self.conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+            return
+
+        batched = _BatchedCursor()
+        yield batched
+        self._submit(batched.statements)
+
+    def _submit(self, statements: list[tuple[bool, str, Any]]):
+        if not statements:
+            return
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed checkpointer.")
+        job = _WriteJob(statements)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+
+    def _write_loop(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+            # 書き込み中に届いた書き込みを、同じトランザクションにまとめる
+            jobs = [job]
+            while len(jobs) < self.max_batch_size:
+                try:
+                    next_job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_job is None:
+                    stopping = True
+                    break
+                jobs.append(next_job)
+            self._write_batch(conn, jobs)
+            for finished_job in jobs:
+                finished_job.done.set()
+
+        # 閉じた後に届いた書き込みは失敗させる
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.error = sqlite3.ProgrammingError("Cannot operate on a closed checkpointer.")
+                job.done.set()
+
+    def _write_batch(self, conn: sqlite3.Connection, jobs: list[_WriteJob]):
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            for job in jobs:
+                # 1件の書き込みが失敗しても、同じトランザクションの他の書き込みは取り消さない
+                conn.execute("SAVEPOINT job;")
+                try:
+                    for many, sql, parameters in job.statements:
+                        if many:
+                            conn.executemany(sql, parameters)
+                        else:
+                            conn.execute(sql, parameters)
+                    conn.execute("RELEASE job;")
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO job;")
+                    conn.execute("RELEASE job;")
+                    job.error = e
+            conn.execute("COMMIT;")
+        except sqlite3.Error as e:
+            logger.error(f"Error writing checkpoints: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            for job in jobs:
+                job.error = job.error or e
+        self._counters["batches"] += 1
+        self._counters["writes"] += len(jobs)
+        self._counters["errors"] += sum(job.error is not None for job in jobs)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        書き込みの統計を取得する
+        :return: 書き込み数・トランザクション数・失敗数と、1トランザクションあたりの平均の書き込み数
+        """
+        counters = dict(self._counters)
+        return {**counters, "avg_batch_size": counters["writes"] / counters["batches"] if counters["batches"] else 0.0}
+
+    def close(self):
+        """書き込み用のスレッドを止め、全ての接続を閉じる"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class CheckpointerCache:
+    """
+    LangGraphのチェックポイント(チャットの履歴)の保存先をプロセス内で共有するクラス
+
+    PostgreSQLの場合はDatabaseHandlerと同じ共有のコネクションプールを使用し、テーブルの作成(setup)は
+    接続先ごとに1回だけ行う。チャットページやエージェントを作り直しても、接続は作り直さない。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkpointers: dict[str, BaseCheckpointSaver] = {}
+
+    def get(self, database_settings: dict | None = None) -> BaseCheckpointSaver:
+        """
+        設定に対応するチェックポイントの保存先を取得する(存在しない場合は作成する)
+        :param database_settings: database_settingsの設定(省略時は設定ファイルから読み込む)
+        :return: PostgresSaverまたはSqliteSaver
+        """
+        database_settings = database_settings if database_settings is not None else load_settings("database_settings")
+        if database_settings.get("use_postgres"):
+            postgres_settings = database_settings["postgres_settings"]
+            key = build_postgres_conninfo(
+                postgres_settings["user"],
+                postgres_settings["password"],
+                postgres_settings["host"],
+                postgres_settings["port"],
+                postgres_settings["database"],
+            )
+        else:
+            postgres_settings = None
+            key = CHAT_MEMORY_DB_PATH
+
+        with self._lock:
+            checkpointer = self._checkpointers.get(key)
+            if postgres_settings is not None:
+                # プールの大きさの変更を反映するため、作成済みの場合もプールを取得する
+                pool = pool_registry.get_pool(
+                    key,
+                    min_size=int(postgres_settings.get("pool_min_size", DEFAULT_POOL_MIN_SIZE)),
+                    max_size=int(postgres_settings.get("pool_max_size", DEFAULT_POOL_MAX_SIZE)),
+                    timeout=float(postgres_settings.get("pool_timeout", DEFAULT_POOL_TIMEOUT)),
+                )
+                if checkpointer is None or checkpointer.conn is not pool:
+                    checkpointer = PostgresSaver(pool)
+                    checkpointer.setup()
+                    logger.info("Postgres checkpointer initialized.")
+            elif checkpointer is None:
+                checkpointer = WalSqliteSaver(key)
+                logger.info("SQLite checkpointer initialized.")
+            self._checkpointers[key] = checkpointer
+            return checkpointer
+
+    def close(self):
+        """SQLiteの接続を閉じ、共有のコネクションプールを閉じる"""
+        with self._lock:
+            for checkpointer in self._checkpointers.values():
+                if isinstance(checkpointer, WalSqliteSaver):
+                    logger.info(f"SQLite checkpointer stats: {checkpointer.stats()}")
+                    checkpointer.close()
+            self._checkpointers.clear()
+        logger.info(f"Connection pool stats: {pool_registry.get_stats()}")
+        pool_registry.close_all()
+
+
+checkpointer_cache = CheckpointerCache()
+
+
+def get_checkpointer(database_settings: dict | None = None) -> BaseCheckpointSaver:
+    """
+    共有のチェックポイントの保存先を取得する
+    :param database_settings: database_settingsの設定(省略時は設定ファイルから読み込む)
+    :return: PostgresSaverまたはSqliteSaver
+    """
+    return checkpointer_cache.get(database_settings)
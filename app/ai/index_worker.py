@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+
+from app.ai.query_cache import query_cache
+from app.ai.search import lexical_index
+from app.ai.vector_db import delete_document_from_vectorstore, indexing_documents
+from app.controller.manager.documents_manager import DocumentsManager
+from app.controller.manager.index_job_manager import DELETE_OPERATION, INDEX_OPERATION, IndexJobManager
+from app.controller.manager.settings_manager import SettingsManager
+from app.models.database_models import DatabaseHandler
+
+logger = logging.getLogger(__name__)
+
+# 1回の処理でまとめてインデックスするドキュメント数
+INDEX_JOB_BATCH_SIZE = 8
+# 新しいジョブがない場合に待機する最大時間(秒)
+INDEX_POLL_INTERVAL = 30
+# 保存が続いた場合にまとめて処理するため、ジョブが登録されてから処理を始めるまで待つ時間(秒)
+INDEX_BATCH_WAIT = 1.0
+# 失敗したジョブの再試行の間隔(秒)と回数
+INDEX_RETRY_BASE_DELAY = 5
+INDEX_RETRY_MAX_DELAY = 600
+INDEX_MAX_ATTEMPTS = 5
+
+
+class IndexWorker:
+    """
+    ドキュメントのインデックス作成をバックグラウンドで行うクラス
+
+    ジョブはindex_jobsテーブルに保存されるため、アプリを再起動しても処理が引き継がれる。
+    待機中のジョブは最大INDEX_JOB_BATCH_SIZE件をまとめて取得し、1回のindexで埋め込みを計算する。
+    失敗したジョブは指数的に間隔を空けて再試行し、INDEX_MAX_ATTEMPTS回失敗した場合は失敗のままにする。
+    """
+
+    def __init__(self, batch_size: int = INDEX_JOB_BATCH_SIZE, poll_interval: float = INDEX_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.job_manager: IndexJobManager | None = None
+        self.docs_manager: DocumentsManager | None = None
+        self.thread: threading.Thread | None = None
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+
+    def start(self, db_handler: DatabaseHandler | None = None):
+        """
+        ワーカーを起動する
+        前回の起動時に実行中のまま中断されたジョブは待機中に戻してから処理する
+        """
+        if self.thread and self.thread.is_alive():
+            return
+        try:
+            db_handler = db_handler or DatabaseHandler(SettingsManager())
+            self.job_manager = IndexJobManager(db_handler)
+            self.docs_manager = DocumentsManager(db_handler)
+            self.job_manager.create_schema()
+            self.job_manager.reset_running()
+        except Exception as e:
+            logger.error(f"Error starting index worker: {e}")
+            self.job_manager = None
+            return
+
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="index-worker", daemon=True)
+        self.thread.start()
+        logger.info("Index worker started.")
+
+    def stop(self):
+        """ワーカーを停止する"""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=3)
+        logger.info("Index worker stopped.")
+
+    def enqueue(self, document_id: int, operation: str = INDEX_OPERATION):
+        """
+        ジョブを登録してワーカーに通知する
+        :param document_id: ドキュメントID
+        :param operation: 操作（"index" または "delete"）
+        """
+        if self.job_manager is None:
+            raise RuntimeError("Index worker is not started.")
+        self.job_manager.enqueue(document_id, operation)
+        self._wakeup.set()
+
+    def get_statuses(self) -> dict[int, dict]:
+        """ドキュメントごとのインデックスの状態を取得する"""
+        if self.job_manager is None:
+            return {}
+        return self.job_manager.get_statuses()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.run_once():
+                    continue
+                next_run_at = self.job_manager.get_next_run_at()
+            except Exception as e:
+                logger.error(f"Error processing index jobs: {e}")
+                next_run_at = None
+
+            timeout = self.poll_interval
+            if next_run_at is not None:
+                timeout = min(max(next_run_at - time.time(), 0), self.poll_interval)
+            if self._wakeup.wait(timeout=timeout):
+                self._stop_event.wait(INDEX_BATCH_WAIT)
+            self._wakeup.clear()
+
+    def run_once(self) -> int:
+        """
+        実行時刻を過ぎたジョブをまとめて処理する
+        :return: 処理したジョブの数
+        """
+        jobs = self.job_manager.fetch_due(self.batch_size)
+        if not jobs:
+            return 0
+
+        contents: dict[int, str] = {}
+        for job in jobs:
+            document_id = job["document_id"]
+            self.job_manager.mark_running(document_id)
+            if job["operation"] == DELETE_OPERATION:
+                lexical_index.remove_document(document_id)
+                self._run_job(job, delete_document_from_vectorstore, document_id)
+                continue
+            try:
+                contents[document_id] = self.docs_manager.get_document_by_id(document_id)["content"] or ""
+            except ValueError:
+                # インデックスする前にドキュメントが削除された場合はベクトルストアからも削除する
+                lexical_index.remove_document(document_id)
+                self._run_job(job, delete_document_from_vectorstore, document_id)
+                continue
+            # 全文検索のインデックスは埋め込みを必要としないため、ベクトルストアより先に更新する
+            lexical_index.update_document(document_id, contents[document_id])
+
+        if contents:
+            index_jobs = [job for job in jobs if job["document_id"] in contents]
+            try:
+                indexing_documents(contents)
+            except Exception as e:
+                for job in index_jobs:
+                    self._fail(job, e)
+            else:
+                for job in index_jobs:
+                    self.job_manager.mark_done(job["document_id"])
+                    # 保存時に破棄した後、インデックスが更新されるまでの間にキャッシュされた検索結果も破棄する
+                    query_cache.invalidate_source(job["document_id"])
+                logger.info(f"Indexed documents: {list(contents)}")
+        return len(jobs)
+
+    def _run_job(self, job: dict, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.job_manager.mark_done(job["document_id"])
+            query_cache.invalidate_source(job["document_id"])
+
+    def _fail(self, job: dict, error: Exception):
+        attempts = job["attempts"] + 1
+        if attempts >= INDEX_MAX_ATTEMPTS:
+            next_run_at = None
+            logger.error(f"Index job failed: {job['document_id']} ({job['operation']}): {error}")
+        else:
+            delay = min(INDEX_RETRY_BASE_DELAY * 2 ** (attempts - 1), INDEX_RETRY_MAX_DELAY)
+            next_run_at = time.time() + delay
+            logger.warning(
+                f"Index job failed, retrying in {delay} s: {job['document_id']} ({job['operation']}): {error}"
+            )
+        self.job_manager.mark_failed(job["document_id"], str(error), next_run_at)
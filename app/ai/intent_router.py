@@ -0,0 +1,145 @@
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+DISPLAY_AGENT = "DisplayControlAgent"
+DOCUMENT_AGENT = "DocumentSearchAgent"
+
+# 長い入力は複数の要求を含むことが多いため、ルールでは判定せずにLLMに任せる
+MAX_ROUTE_LENGTH = 60
+# 「〜してから」「ついでに」など、複数の要求を含むことを示す表現
+_COMPOUND_PATTERN = re.compile(r"てから|た(後|あと)|それから|そして|ついでに|あとで|も(教えて|説明|解説)")
+
+
+@dataclass(frozen=True)
+class IntentRule:
+    """
+    ユーザーの入力を部署に振り分けるルール
+
+    Attributes:
+        name (str): ルールの名前(ログと統計に使用する)
+        agent (str): 振り分ける部署の名前
+        pattern (re.Pattern): 正規化した入力に対して検索する正規表現
+    """
+
+    name: str
+    agent: str
+    pattern: re.Pattern
+
+
+@dataclass
+class RouteDecision:
+    """
+    ルールによる振り分けの結果
+
+    Attributes:
+        agent (str | None): 振り分ける部署の名前(確信が持てない場合はNoneで、LLMに任せる)
+        rule (str | None): 振り分けたルールの名前
+        matched (list[str]): 一致した全てのルールの名前
+        reason (str): 判定の理由
+    """
+
+    agent: str | None
+    rule: str | None = None
+    matched: list[str] = field(default_factory=list)
+    reason: str = ""
+
+
+DEFAULT_RULES = [
+    IntentRule(
+        "scene_change",
+        DISPLAY_AGENT,
+        re.compile(r"(次|前|つぎ|まえ|別)の(シーン|モデル)|シーン.{0,3}(変|切り?替|進|戻)"),
+    ),
+    IntentRule(
+        "model_change",
+        DISPLAY_AGENT,
+        re.compile(r"(モデル|表示|オブジェクト).{0,10}(変更|変え|切り?替え)|(に|へ)(変更|変えて|切り?替えて)"),
+    ),
+    IntentRule(
+        "current_display",
+        DISPLAY_AGENT,
+        re.compile(r"(映|写|表示|出て)[^。?]{0,8}(何|なに|なん|どれ|誰|だれ)|(何|なに)が(映|写|表示)"),
+    ),
+    IntentRule(
+        "model_list",
+        DISPLAY_AGENT,
+        re.compile(r"(表示|映)(でき|出来|可能)[^。?]{0,10}(モデル|もの|一覧)|モデル(の)?(一覧|リスト)"),
+    ),
+    # 「今映っているモデルの解説」のように表示中のモデルを指す場合は、DocumentSearchAgentのルールと競合させてLLMに任せる
+    IntentRule(
+        "display_reference", DISPLAY_AGENT, re.compile(r"(映って|写って|表示して|表示され|表示中|出てる|出ている)")
+    ),
+    IntentRule(
+        "explanation",
+        DOCUMENT_AGENT,
+        re.compile(r"(解説|説明|詳しく|詳細|ドキュメント|資料|由来|歴史|特徴)|(について|とは)(教えて|知りたい|\?|$)"),
+    ),
+]
+
+
+class IntentRouter:
+    """
+    ユーザーの入力をルールで部署に振り分けるクラス
+
+    明らかな要求(「次のシーン」「モデルを変更して」「今映ってるのは何」など)はスーパーバイザーのLLMを呼ばずに振り分ける。
+    一致したルールが1つの部署に定まらない場合や、複数の要求を含みそうな場合はNoneを返し、LLMに任せる。
+    ルールを調整できるように、判定の結果はログに出力し、ルールごとの件数を集計する。
+    """
+
+    def __init__(self, rules: list[IntentRule] | None = None, max_length: int = MAX_ROUTE_LENGTH):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.max_length = max_length
+        self._lock = threading.Lock()
+        self._counters: Counter[str] = Counter()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """全角・半角と大文字・小文字を揃え、空白を取り除く"""
+        return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text).lower())
+
+    def route(self, text: str, record: bool = True) -> RouteDecision:
+        """
+        入力を振り分ける部署を判定する
+        :param text: ユーザーの入力
+        :param record: 判定の結果をログに出力し、統計に加える
+        :return: 判定の結果(agentがNoneの場合はLLMで判定する)
+        """
+        normalized = self.normalize(text)
+        matched = [rule for rule in self.rules if rule.pattern.search(normalized)]
+        names = [rule.name for rule in matched]
+
+        if not matched:
+            decision = RouteDecision(agent=None, reason="no_match")
+        elif len(normalized) > self.max_length:
+            decision = RouteDecision(agent=None, matched=names, reason="too_long")
+        elif _COMPOUND_PATTERN.search(normalized):
+            decision = RouteDecision(agent=None, matched=names, reason="compound")
+        elif len({rule.agent for rule in matched}) > 1:
+            decision = RouteDecision(agent=None, matched=names, reason="ambiguous")
+        else:
+            decision = RouteDecision(agent=matched[0].agent, rule=matched[0].name, matched=names, reason="rule")
+
+        if record:
+            with self._lock:
+                self._counters[decision.rule or f"fallback:{decision.reason}"] += 1
+            logger.info(
+                f"Intent route: agent={decision.agent or 'LLM'}, reason={decision.reason}, "
+                f"matched={decision.matched}, text={normalized[:80]!r}"
+            )
+        return decision
+
+    def stats(self) -> dict[str, int]:
+        """
+        ルールごとの振り分けの件数と、LLMに任せた理由ごとの件数を取得する
+        """
+        with self._lock:
+            return dict(self._counters)
+
+
+intent_router = IntentRouter()
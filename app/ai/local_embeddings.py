@@ -0,0 +1,108 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_BATCH_SIZE = 32
+DEFAULT_LOCAL_MAX_WORKERS = 2
+
+# モデルの読み込みには数秒かかるため、同じモデルはプロセス内で使い回す
+_models: dict[tuple[str, str], "SentenceTransformer"] = {}
+_models_lock = threading.Lock()
+# 埋め込みの計算用のスレッドプールは、ベクトルストアを作り直しても増えないように同じスレッド数ごとに使い回す
+_executors: dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def is_available() -> bool:
+    """ローカルの埋め込みモデルに必要なsentence-transformersがインストールされているかどうか"""
+    return SentenceTransformer is not None
+
+
+def _load_model(model_name: str, device: str) -> "SentenceTransformer":
+    if not is_available():
+        raise ImportError(
+            "ローカルの埋め込みモデルを使用するにはsentence-transformersが必要です: "
+            "poetry install --extras local-embeddings (または pip install sentence-transformers)"
+        )
+    key = (model_name, device)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            logger.info(f"ローカルの埋め込みモデルを読み込みます: {model_name} ({device})")
+            model = SentenceTransformer(model_name, device=device)
+            _models[key] = model
+        return model
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="local-embeddings")
+            _executors[max_workers] = executor
+        return executor
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformersのモデルでCPU上で埋め込みを計算するEmbeddings
+
+    ネットワークを使用しないため、オフラインの環境でもドキュメントを検索できる。
+    ドキュメントはbatch_size件ずつに分けてスレッドプールで計算し、クエリは呼び出し元のスレッドで1件だけ計算する。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cpu",
+        batch_size: int = DEFAULT_LOCAL_BATCH_SIZE,
+        max_workers: int = DEFAULT_LOCAL_MAX_WORKERS,
+        query_prefix: str = "",
+        document_prefix: str = "",
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = max(batch_size, 1)
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self._model = _load_model(model_name, device)
+        self._executor = _get_executor(max(max_workers, 1))
+
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        embeddings = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return embeddings.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        ドキュメントの埋め込みを計算する
+        :param texts: ドキュメントのリスト
+        :return: 埋め込みのリスト(textsと同じ順序)
+        """
+        texts = [f"{self.document_prefix}{text}" for text in texts]
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._encode(texts) if texts else []
+        return [embedding for result in self._executor.map(self._encode, batches) for embedding in result]
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        クエリの埋め込みを計算する
+        :param text: クエリ
+        :return: 埋め込み
+        """
+        return self._encode([f"{self.query_prefix}{text}"])[0]
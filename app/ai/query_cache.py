@@ -0,0 +1,151 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# キャッシュするクエリの最大数と有効期間(秒)
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = 600
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# 末尾の記号はクエリの意味を変えないため、正規化時に取り除く
+_TRAILING_PUNCTUATION = "?？!！。.、,"
+
+
+def normalize_query(query: str) -> str:
+    """
+    キャッシュのキーにするためにクエリを正規化する関数
+    全角・半角と大文字・小文字を揃え、連続する空白と末尾の記号を取り除く
+    """
+    query = unicodedata.normalize("NFKC", query).lower()
+    return _WHITESPACE_PATTERN.sub(" ", query).strip().rstrip(_TRAILING_PUNCTUATION).strip()
+
+
+@dataclass
+class _CacheEntry:
+    expires_at: float
+    embedding: list[float] | None = None
+    k: int = 0
+    results: list[Any] | None = None
+    sources: set[str] = field(default_factory=set)
+
+
+class QueryCache:
+    """
+    ドキュメント検索の結果をクエリごとに保持するLRUキャッシュ
+
+    正規化したクエリごとに、クエリの埋め込みと検索結果(上位k件)を保持する。
+    検索結果に含まれるドキュメントが更新・削除された場合は検索結果のみを破棄し、埋め込みは再利用する。
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._counters = dict.fromkeys(
+            ("hits", "misses", "embedding_hits", "embedding_misses", "evictions", "expirations", "invalidations"), 0
+        )
+
+    def _get_entry(self, key: str) -> _CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_results(self, query: str, k: int) -> list[Any] | None:
+        """
+        キャッシュした検索結果を取得する
+        :param query: 検索クエリ
+        :param k: 取得する件数
+        :return: 検索結果(キャッシュにない場合はNone)
+        """
+        with self._lock:
+            entry = self._get_entry(normalize_query(query))
+            if entry is None or entry.results is None or entry.k < k:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            return entry.results[:k]
+
+    def get_embedding(self, query: str) -> list[float] | None:
+        """
+        キャッシュしたクエリの埋め込みを取得する
+        :param query: 検索クエリ
+        :return: 埋め込み(キャッシュにない場合はNone)
+        """
+        with self._lock:
+            entry = self._get_entry(normalize_query(query))
+            if entry is None or entry.embedding is None:
+                self._counters["embedding_misses"] += 1
+                return None
+            self._counters["embedding_hits"] += 1
+            return entry.embedding
+
+    def put(self, query: str, k: int, results: list[Any], embedding: list[float] | None = None):
+        """
+        検索結果をキャッシュする
+        :param query: 検索クエリ
+        :param k: 検索した件数
+        :param results: 検索結果(metadataのsourceにドキュメントIDを持つDocumentのリスト)
+        :param embedding: クエリの埋め込み(埋め込みを計算していない場合はNone)
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                entry = _CacheEntry(expires_at=time.monotonic() + self.ttl)
+                self._entries[key] = entry
+            entry.k = k
+            entry.results = list(results)
+            entry.sources = {str(result.metadata.get("source")) for result in results}
+            if embedding is not None:
+                entry.embedding = embedding
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate_source(self, document_id: int | str):
+        """
+        指定したドキュメントを含む検索結果を破棄する
+        :param document_id: 更新・削除されたドキュメントID
+        """
+        source = str(document_id)
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.results is not None and source in entry.sources:
+                    entry.results = None
+                    entry.sources = set()
+                    self._counters["invalidations"] += 1
+
+    def clear(self):
+        """全てのキャッシュを破棄する"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        キャッシュの統計を取得する
+        :return: ヒット数・ミス数などのカウンタと、キャッシュの件数・ヒット率
+        """
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "size": len(self._entries),
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryCache()
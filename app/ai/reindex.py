@@ -0,0 +1,286 @@
+"""
+documentsテーブルからベクトルストアのインデックスを一括で作り直す
+
+ドキュメントはdocument_id順にページ単位で読み込み、ページ内のドキュメントを
+最大concurrency件の並列でチャンクに分割して埋め込みを計算し、batch_size件ずつベクトルストアに書き込む。
+全てのドキュメントを処理した後、今回の処理で更新されなかったレコード(削除されたドキュメントや
+変更前のチャンク)をまとめて削除する。
+
+使い方:
+    python -m app.ai.reindex [--page-size 100] [--concurrency 4] [--batch-size 100] [--rebuild]
+    python -m app.ai.reindex --fake-embeddings 1536  # 埋め込みのAPIを呼ばずに処理速度を計測する
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from langchain.indexes import SQLRecordManager, index
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import VectorStore
+
+from app.ai.query_cache import query_cache
+from app.ai.search import lexical_index
+from app.ai.vector_db import (
+    COLLECTION_NAME,
+    INDEX_BATCH_SIZE,
+    RECORD_MANAGER_NAMESPACE,
+    get_record_manager,
+    get_vector_store,
+    split_document,
+)
+from app.models.database_models import DatabaseHandler
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# 1ページで読み込むドキュメント数と、並列でインデックスするドキュメントのグループ数
+REINDEX_PAGE_SIZE = 100
+REINDEX_CONCURRENCY = 4
+# トークン数の計算に使用するエンコーディング(tiktokenがない場合は4文字を1トークンとして概算する)
+TOKEN_ENCODING = "cl100k_base"
+
+
+@dataclass
+class ReindexOptions:
+    """
+    一括インデックスの設定
+
+    Attributes:
+        page_size (int): 1ページで読み込むドキュメント数
+        concurrency (int): 並列でインデックスするドキュメントのグループ数
+        batch_size (int): ベクトルストアに1回で書き込むチャンク数
+        rebuild (bool): 既存のインデックスを全て削除してから作成する
+        fake_embedding_size (int | None): 指定した場合は埋め込みのAPIを呼ばず、
+            この次元の固定の埋め込みで一時的なベクトルストアに書き込む(処理速度の計測用)
+    """
+
+    page_size: int = REINDEX_PAGE_SIZE
+    concurrency: int = REINDEX_CONCURRENCY
+    batch_size: int = INDEX_BATCH_SIZE
+    rebuild: bool = False
+    fake_embedding_size: int | None = None
+
+
+@dataclass
+class ReindexStats:
+    """
+    一括インデックスの進捗と処理速度
+    """
+
+    total_docs: int = 0
+    docs: int = 0
+    chunks: int = 0
+    tokens: int = 0
+    added: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """残りの処理時間(秒)の見込み"""
+        if not self.docs or self.docs_per_sec == 0:
+            return None
+        return max(self.total_docs - self.docs, 0) / self.docs_per_sec
+
+    def update_elapsed(self):
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def to_dict(self) -> dict:
+        stats = asdict(self)
+        stats.pop("started_at")
+        stats.update(docs_per_sec=self.docs_per_sec, tokens_per_sec=self.tokens_per_sec, eta=self.eta)
+        return stats
+
+    def __str__(self):
+        eta = "-" if self.eta is None else f"{self.eta:.1f} s"
+        return (
+            f"{self.docs}/{self.total_docs} docs, {self.chunks} chunks, {self.tokens} tokens "
+            f"(added: {self.added}, skipped: {self.skipped}, deleted: {self.deleted}) "
+            f"{self.docs_per_sec:.1f} docs/s, {self.tokens_per_sec:.0f} tokens/s, ETA {eta}"
+        )
+
+
+def _get_token_counter() -> Callable[[str], int]:
+    """
+    テキストのトークン数を数える関数を返す
+    """
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            logger.warning(f"トークナイザーを読み込めないため、トークン数を概算します: {e}")
+    return lambda text: len(text) // 4
+
+
+def iter_document_pages(db_handler: DatabaseHandler, page_size: int = REINDEX_PAGE_SIZE) -> Iterator[list[tuple]]:
+    """
+    documentsテーブルをdocument_id順にページ単位で読み込む
+    OFFSETを使わずに前のページの最後のIDから読み込むため、ページ数が増えても遅くならない
+
+    Yields:
+        list[tuple]: (document_id, content)のリスト
+    """
+    last_id = 0
+    query = "SELECT document_id, content FROM documents WHERE document_id > %s ORDER BY document_id ASC LIMIT %s;"
+    while rows := db_handler.fetch_query(query, (last_id, page_size)):
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _create_fake_target(embedding_size: int) -> tuple[VectorStore, SQLRecordManager]:
+    """
+    処理速度の計測用に、固定の埋め込みを返すEmbeddingsを使った一時的なベクトルストアを作成する
+    本番のコレクションとレコードマネージャーには書き込まない
+    """
+    work_dir = tempfile.mkdtemp(prefix="reindex_benchmark_")
+    vector_store = Chroma(
+        collection_name=f"{COLLECTION_NAME}_benchmark",
+        embedding_function=DeterministicFakeEmbedding(size=embedding_size),
+        persist_directory=os.path.join(work_dir, "chroma_db"),
+    )
+    record_manager = SQLRecordManager(
+        namespace=f"{RECORD_MANAGER_NAMESPACE}_benchmark",
+        db_url=f"sqlite:///{os.path.join(work_dir, 'indexing.db')}",
+    )
+    record_manager.create_schema()
+    logger.info(f"計測用のベクトルストアを作成しました: {work_dir}")
+    return vector_store, record_manager
+
+
+def _delete_keys(vector_store: VectorStore, record_manager: SQLRecordManager, keys: list[str]) -> int:
+    if keys:
+        vector_store.delete(ids=keys)
+        record_manager.delete_keys(keys)
+    return len(keys)
+
+
+def reindex_documents(
+    db_handler: DatabaseHandler,
+    options: ReindexOptions | None = None,
+    on_progress: Callable[[ReindexStats], None] | None = None,
+    target: tuple[VectorStore, SQLRecordManager] | None = None,
+) -> ReindexStats:
+    """
+    documentsテーブルの全てのドキュメントからインデックスを作り直す
+
+    Args:
+        db_handler (DatabaseHandler): documentsテーブルを読み込むDatabaseHandler
+        options (ReindexOptions | None, optional): 一括インデックスの設定. Defaults to None.
+        on_progress (Callable[[ReindexStats], None] | None, optional): ページごとに進捗を受け取るコールバック.
+        target (tuple[VectorStore, SQLRecordManager] | None, optional): 書き込み先のベクトルストアと
+            レコードマネージャー(省略時はアプリのベクトルストア). Defaults to None.
+
+    Returns:
+        ReindexStats: 処理結果と処理速度
+    """
+    options = options or ReindexOptions()
+    concurrency = max(options.concurrency, 1)
+    if target is None and options.fake_embedding_size:
+        target = _create_fake_target(options.fake_embedding_size)
+    is_app_target = target is None
+    vector_store, record_manager = target or (get_vector_store(), get_record_manager())
+    count_tokens = _get_token_counter()
+
+    stats = ReindexStats(total_docs=db_handler.fetch_query("SELECT COUNT(*) FROM documents;")[0][0])
+    if options.rebuild:
+        stats.deleted += _delete_keys(vector_store, record_manager, record_manager.list_keys())
+    # この時刻より前に更新されたレコードは、最後にまとめて削除する
+    index_started_at = record_manager.get_time()
+
+    def index_group(group: list[Document]) -> dict:
+        return index(
+            group, record_manager, vector_store, cleanup=None, source_id_key="source", batch_size=options.batch_size
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reindex") as executor:
+        for rows in iter_document_pages(db_handler, options.page_size):
+            # 同じドキュメントのチャンクは同じグループに入れる
+            groups: list[list[Document]] = [[] for _ in range(concurrency)]
+            for i, (document_id, content) in enumerate(rows):
+                chunks = split_document(content or "", document_id)
+                groups[i % len(groups)].extend(chunks)
+                stats.chunks += len(chunks)
+                stats.tokens += sum(count_tokens(chunk.page_content) for chunk in chunks)
+
+            for result in executor.map(index_group, [group for group in groups if group]):
+                stats.added += result["num_added"]
+                stats.skipped += result["num_skipped"]
+            stats.docs += len(rows)
+            stats.update_elapsed()
+            logger.info(f"Reindex progress: {stats}")
+            if on_progress:
+                on_progress(stats)
+
+    # 削除されたドキュメントや、変更前のチャンクのレコードを削除する
+    stale_keys = record_manager.list_keys(before=index_started_at)
+    stats.deleted += _delete_keys(vector_store, record_manager, stale_keys)
+    if is_app_target:
+        # 全文検索のインデックスも次の検索時にdocumentsテーブルから作り直す
+        lexical_index.clear()
+        query_cache.clear()
+    stats.update_elapsed()
+    logger.info(f"Reindex completed: {stats}")
+    if on_progress:
+        on_progress(stats)
+    return stats
+
+
+if __name__ == "__main__":
+    import json
+
+    from app.controller.manager.settings_manager import SettingsManager
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="documentsテーブルからベクトルストアのインデックスを一括で作り直す")
+    parser.add_argument("--page-size", type=int, default=REINDEX_PAGE_SIZE, help="1ページで読み込むドキュメント数")
+    parser.add_argument("--concurrency", type=int, default=REINDEX_CONCURRENCY, help="並列でインデックスする数")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE, help="1回で書き込むチャンク数")
+    parser.add_argument("--rebuild", action="store_true", help="既存のインデックスを全て削除してから作成する")
+    parser.add_argument(
+        "--fake-embeddings",
+        type=int,
+        metavar="SIZE",
+        help="埋め込みのAPIを呼ばず、指定した次元の固定の埋め込みで処理速度を計測する",
+    )
+    args = parser.parse_args()
+
+    db_handler = DatabaseHandler(SettingsManager())
+    try:
+        result = reindex_documents(
+            db_handler,
+            ReindexOptions(
+                page_size=args.page_size,
+                concurrency=args.concurrency,
+                batch_size=args.batch_size,
+                rebuild=args.rebuild,
+                fake_embedding_size=args.fake_embeddings,
+            ),
+            on_progress=lambda stats: print(stats, flush=True),
+        )
+        print(json.dumps(result.to_dict(), indent=2))
+    finally:
+        db_handler.close_connection()
@@ -0,0 +1,245 @@
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from app.ai.query_cache import query_cache
+from app.ai.vector_db import get_vector_store, split_document
+from app.controller.manager.settings_manager import SettingsManager
+from app.models.database_models import DatabaseHandler
+
+logger = logging.getLogger(__name__)
+
+# BM25のパラメータ
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal Rank Fusionの順位に加える定数
+RRF_K = 60
+# 融合する前にそれぞれの検索で取得する候補の数
+SEARCH_CANDIDATES = 20
+DEFAULT_SEARCH_K = 4
+
+# 英数字の連続は単語として、それ以外の文字(日本語など)の連続は文字n-gramとして扱う
+_WORD_PATTERN = re.compile(r"[0-9a-z]+|[^\W0-9a-z_]+")
+_ASCII_WORD_PATTERN = re.compile(r"[0-9a-z]+")
+NGRAM_SIZE = 2
+# 型番やモデル名などの1語のクエリは、埋め込みを計算せずに全文検索の結果だけを返す
+_LEXICAL_QUERY_PATTERN = re.compile(r"[0-9A-Za-z][0-9A-Za-z_\-.]{0,63}")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    全文検索用にテキストをトークンに分割する関数
+    全角・半角と大文字・小文字を揃えた後、英数字は単語単位、日本語などは文字bigram(1文字の場合はその文字)に分割する
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for word in _WORD_PATTERN.findall(text):
+        if _ASCII_WORD_PATTERN.fullmatch(word) or len(word) <= NGRAM_SIZE:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i : i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1))
+    return tokens
+
+
+def is_lexical_query(query: str) -> bool:
+    """型番やモデル名など、全文検索だけで十分なクエリかどうかを判定する関数"""
+    return bool(_LEXICAL_QUERY_PATTERN.fullmatch(unicodedata.normalize("NFKC", query).strip()))
+
+
+def _document_key(document: Document) -> tuple[str, str]:
+    return document.metadata.get("source", ""), document.page_content
+
+
+class LexicalIndex:
+    """
+    documentsテーブルのチャンクに対するBM25の転置インデックス
+
+    ベクトルストアと同じくsplit_documentで分割したチャンクを保持するため、検索結果をベクトル検索の結果と融合できる。
+    最初の検索時にdocumentsテーブルから作成し、以降はドキュメントの保存・削除に合わせて更新する。
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._chunks: dict[tuple[int, int], Document] = {}
+        self._lengths: dict[tuple[int, int], int] = {}
+        self._postings: dict[str, dict[tuple[int, int], int]] = defaultdict(dict)
+        self._document_chunks: dict[int, list[tuple[int, int]]] = {}
+        self._total_length = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, db_handler: DatabaseHandler | None = None):
+        """documentsテーブルの全てのドキュメントからインデックスを作成する"""
+        db_handler = db_handler or DatabaseHandler(SettingsManager())
+        rows = db_handler.fetch_query("SELECT document_id, content FROM documents;")
+        with self._lock:
+            self.clear()
+            for document_id, content in rows:
+                self._add(document_id, content or "")
+            self._loaded = True
+        logger.info(f"Lexical index loaded: {len(rows)} documents, {len(self._chunks)} chunks")
+
+    def clear(self):
+        """インデックスを破棄する(次の検索時に作り直す)"""
+        with self._lock:
+            self._chunks.clear()
+            self._lengths.clear()
+            self._postings.clear()
+            self._document_chunks.clear()
+            self._total_length = 0
+            self._loaded = False
+
+    def update_document(self, document_id: int, content: str):
+        """
+        ドキュメントのチャンクを置き換える
+        インデックスが作成される前の場合は、作成時にdocumentsテーブルから読み込むため何もしない
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(document_id)
+            self._add(document_id, content)
+
+    def remove_document(self, document_id: int):
+        """ドキュメントのチャンクを削除する"""
+        with self._lock:
+            if self._loaded:
+                self._remove(document_id)
+
+    def _add(self, document_id: int, content: str):
+        if not content.strip():
+            return
+        keys = []
+        for i, chunk in enumerate(split_document(content, document_id)):
+            key = (document_id, i)
+            tokens = tokenize(chunk.page_content)
+            for token, count in Counter(tokens).items():
+                self._postings[token][key] = count
+            self._chunks[key] = chunk
+            self._lengths[key] = len(tokens)
+            self._total_length += len(tokens)
+            keys.append(key)
+        self._document_chunks[document_id] = keys
+
+    def _remove(self, document_id: int):
+        for key in self._document_chunks.pop(document_id, []):
+            tokens = set(tokenize(self._chunks.pop(key).page_content))
+            self._total_length -= self._lengths.pop(key)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[token]
+
+    def search(self, query: str, k: int = SEARCH_CANDIDATES) -> list[tuple[Document, float]]:
+        """
+        BM25でチャンクを検索する
+        :param query: 検索クエリ
+        :param k: 取得する最大件数
+        :return: (チャンク, スコア)のリスト(スコアの高い順)
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+        with self._lock:
+            if not self._chunks:
+                return []
+            n = len(self._chunks)
+            avg_length = self._total_length / n
+            scores: dict[tuple[int, int], float] = defaultdict(float)
+            for token, query_count in Counter(tokenize(query)).items():
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[key] / avg_length)
+                    scores[key] += query_count * idf * tf * (self.k1 + 1) / (tf + norm)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._chunks[key], score) for key, score in ranked]
+
+
+lexical_index = LexicalIndex()
+
+
+def reciprocal_rank_fusion(result_lists: list[list[Document]], k: int = RRF_K) -> list[Document]:
+    """
+    複数の検索結果をReciprocal Rank Fusionで1つの順位にまとめる関数
+    同じドキュメントの同じチャンクは1件にまとめる
+    """
+    scores: dict[tuple[str, str], float] = defaultdict(float)
+    documents: dict[tuple[str, str], Document] = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = _document_key(document)
+            scores[key] += 1 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def hybrid_search(
+    query: str,
+    k: int = DEFAULT_SEARCH_K,
+    vector_store: VectorStore | None = None,
+    index: LexicalIndex | None = None,
+    use_cache: bool = True,
+) -> list[Document]:
+    """
+    全文検索とベクトル検索の結果を融合してドキュメントを検索する関数
+    型番やモデル名などの1語のクエリで全文検索の結果がある場合は、埋め込みを計算せずに全文検索の結果を返す
+    ベクトル検索に失敗した場合も全文検索の結果を返す
+    検索結果とクエリの埋め込みはquery_cacheにキャッシュする
+
+    Args:
+        query (str): 検索クエリ
+        k (int, optional): 取得する件数. Defaults to DEFAULT_SEARCH_K.
+        vector_store (VectorStore | None, optional): 検索するベクトルストア(省略時はget_vector_store). Defaults to None.
+        index (LexicalIndex | None, optional): 検索する全文検索のインデックス(省略時はlexical_index). Defaults to None.
+        use_cache (bool, optional): query_cacheを使用する. Defaults to True.
+
+    Returns:
+        list[Document]: 検索結果のチャンク
+    """
+    if use_cache:
+        cached_results = query_cache.get_results(query, k)
+        if cached_results is not None:
+            return cached_results
+
+    index = index or lexical_index
+    lexical_results = [document for document, _ in index.search(query, SEARCH_CANDIDATES)]
+    if lexical_results and is_lexical_query(query):
+        results = lexical_results[:k]
+        if use_cache:
+            query_cache.put(query, k, results)
+        return results
+
+    try:
+        vector_store = vector_store or get_vector_store()
+        embedding = query_cache.get_embedding(query) if use_cache else None
+        if embedding is None:
+            embedding = vector_store.embeddings.embed_query(query)
+        vector_results = vector_store.similarity_search_by_vector(embedding, k=SEARCH_CANDIDATES)
+    except Exception as e:
+        if not lexical_results:
+            raise
+        logger.warning(f"ベクトル検索に失敗したため、全文検索の結果のみを返します: {e}")
+        return lexical_results[:k]
+    results = reciprocal_rank_fusion([lexical_results, vector_results])[:k]
+    if use_cache:
+        query_cache.put(query, k, results, embedding)
+    return results
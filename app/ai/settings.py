@@ -6,8 +6,9 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 
+from app.ai.local_embeddings import LocalEmbeddings
 from app.controller.manager.settings_manager import load_settings
-from app.models.settings_models import EmbeddingProvider, LlmProvider
+from app.models.settings_models import EmbeddingProvider, LlmProvider, LocalEmbeddingSettings
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,18 @@ def embedding_model_settings():
             azure_endpoint=settings.get("endpoint"),
             openai_api_version=settings.get("api_version"),
         )
+    elif settings.get("embedding_provider") == EmbeddingProvider.LOCAL.value:
+        settings = settings.get("local_embedding_settings", {})
+        local_settings = LocalEmbeddingSettings(**settings)
+        logger.info(f"Local embedding model is configured: {local_settings.model_name}")
+        return LocalEmbeddings(
+            model_name=local_settings.model_name,
+            device=local_settings.device,
+            batch_size=int(local_settings.batch_size),
+            max_workers=int(local_settings.max_workers),
+            query_prefix=local_settings.query_prefix,
+            document_prefix=local_settings.document_prefix,
+        )
     else:
         raise ValueError(f"Invalid embedding model type: {settings.get("embedding_provider")}")
 
@@ -8,7 +8,7 @@ from langchain_core.documents import Document
 from langchain_core.tools import BaseTool, tool
 from pydantic import BaseModel, Field
 
-from app.ai.vector_db import get_vector_store
+from app.ai.search import hybrid_search
 from app.controller.manager.server_manager import ServerManager
 from app.models.command_models import ControlCommand, UpdateCommand
 
@@ -23,9 +23,7 @@ def search_documents_tool(query: str) -> list[Document]:
     ドキュメントを検索する関数
     この関数で取得したドキュメントをユーザーに返す場合は"[参考にしたドキュメント](metadataのsourceに格納されている数値)"のような形で返す
     """
-    results = get_vector_store().similarity_search(
-        query=query,
-    )
+    results = hybrid_search(query)
     # results = {
     #     "content": res["content"],
     # }
@@ -1,13 +1,130 @@
+import hashlib
+import json
+import logging
+import threading
+
+from langchain.embeddings import CacheBackedEmbeddings
 from langchain.indexes import SQLRecordManager, index
+from langchain.storage import EncoderBackedStore
 from langchain_chroma import Chroma
+from langchain_community.storage import SQLStore
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 
+from app.ai.query_cache import query_cache
 from app.ai.settings import embedding_model_settings
-from app.controller.manager.settings_manager import SettingsManager, load_settings
-from app.models.database_models import DatabaseHandler
+from app.controller.manager.settings_manager import get_settings_fingerprint, load_settings
+from app.models.settings_models import EmbeddingProvider
 
 # from app.db_conn import DatabaseHandler
 
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "document_collection"
+PERSIST_DIRECTORY = "./chroma_db"
+RECORD_MANAGER_NAMESPACE = f"chromadb/{COLLECTION_NAME}"
+# 埋め込みのキャッシュの名前空間と、キャッシュにないテキストを1回のリクエストで送信する件数の既定値
+EMBEDDING_CACHE_NAMESPACE = "embedding_cache"
+DEFAULT_EMBEDDING_BATCH_SIZE = 64
+
+# ドキュメントを分割する際のチャンクの最大文字数と重複させる文字数
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# 分割の区切りにするMarkdownの見出し(見出しはチャンクのメタデータにも保存する)
+MARKDOWN_HEADERS = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+# インデックス作成時に1回の埋め込みの計算で送信するチャンク数
+INDEX_BATCH_SIZE = 100
+
+
+def get_collection_name(embedding_provider: str | None = None) -> str:
+    """
+    埋め込みのプロバイダーに対応するコレクション名を取得する関数
+    プロバイダーによって埋め込みの次元が異なるため、Azure以外のプロバイダーは別のコレクションに保存する
+    """
+    if embedding_provider is None:
+        embedding_provider = load_settings("llm_settings").get("embedding_provider", EmbeddingProvider.AZURE.value)
+    if embedding_provider == EmbeddingProvider.AZURE.value:
+        return COLLECTION_NAME
+    return f"{COLLECTION_NAME}_{embedding_provider}"
+
+
+def get_record_manager_namespace(collection_name: str) -> str:
+    """コレクションに対応するレコードマネージャーの名前空間を取得する関数"""
+    return f"chromadb/{collection_name}"
+
+
+class VectorStoreCache:
+    """
+    プロセス内で使い回すベクトルストアとレコードマネージャーを保持するクラス
+
+    ベクトルストアは設定ファイルが更新された場合のみLLMの設定を読み直し、
+    LLM・埋め込みモデルの設定が変わっていた場合に作り直す。
+    現在の設定のレコードマネージャーも、設定ファイルが更新された場合のみ接続先と名前空間を読み直す。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vector_store: Chroma | None = None
+        self._settings: str | None = None
+        self._fingerprint: tuple[int, int] | None = None
+        self._record_managers: dict[tuple[str, str], SQLRecordManager] = {}
+        # (設定ファイルのフィンガープリント, そのときの設定のレコードマネージャー)
+        self._current_record_manager: tuple[tuple[int, int], SQLRecordManager] | None = None
+
+    def get_vector_store(self) -> Chroma:
+        fingerprint = get_settings_fingerprint()
+        vector_store = self._vector_store
+        if vector_store is not None and fingerprint == self._fingerprint:
+            return vector_store
+
+        with self._lock:
+            if self._vector_store is not None and fingerprint == self._fingerprint:
+                return self._vector_store
+            # 設定ファイルが更新されても、LLMの設定が変わっていなければ作り直さない
+            settings = json.dumps(load_settings("llm_settings"), sort_keys=True)
+            if self._vector_store is None or settings != self._settings:
+                logger.info("ベクトルストアを作成します。")
+                self._vector_store = Chroma(
+                    collection_name=get_collection_name(),
+                    embedding_function=create_cached_embeddings(embedding_model_settings()),
+                    persist_directory=PERSIST_DIRECTORY,
+                )
+                self._settings = settings
+                # 埋め込みモデルが変わった可能性があるため、キャッシュしたクエリの埋め込みも破棄する
+                query_cache.clear()
+            self._fingerprint = fingerprint
+            return self._vector_store
+
+    def get_record_manager(self, db_url: str, namespace: str = RECORD_MANAGER_NAMESPACE) -> SQLRecordManager:
+        with self._lock:
+            record_manager = self._record_managers.get((db_url, namespace))
+            if record_manager is None:
+                record_manager = SQLRecordManager(namespace=namespace, db_url=db_url)
+                record_manager.create_schema()
+                self._record_managers[(db_url, namespace)] = record_manager
+            return record_manager
+
+    def get_current_record_manager(self) -> SQLRecordManager:
+        fingerprint = get_settings_fingerprint()
+        current = self._current_record_manager
+        if current is not None and current[0] == fingerprint:
+            return current[1]
+
+        record_manager = self.get_record_manager(get_main_db(), get_record_manager_namespace(get_collection_name()))
+        self._current_record_manager = (fingerprint, record_manager)
+        return record_manager
+
+    def clear(self):
+        with self._lock:
+            self._vector_store = None
+            self._settings = None
+            self._fingerprint = None
+            self._current_record_manager = None
+
+
+_cache = VectorStoreCache()
+
 
 def create_document_obj(content: str, document_id: int, return_list: bool = True) -> Document | list[Document]:
     """
@@ -20,6 +137,21 @@ def create_document_obj(content: str, document_id: int, return_list: bool = True
         return document
 
 
+def split_document(content: str, document_id: int) -> list[Document]:
+    """
+    ドキュメントをチャンクに分割する関数
+    Markdownの見出しで区切った後、長いセクションはCHUNK_SIZE文字ごとにCHUNK_OVERLAP文字重ねて分割する
+    チャンクの内容とメタデータからハッシュが計算されるため、メタデータには位置などの情報を含めず、
+    変更のないチャンクは再インデックス時に埋め込みを計算し直さないようにする
+    """
+    header_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=MARKDOWN_HEADERS, strip_headers=False)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = text_splitter.split_documents(header_splitter.split_text(content))
+    for chunk in chunks:
+        chunk.metadata["source"] = f"{document_id}"
+    return chunks
+
+
 def get_main_db() -> str:
     """
     メインDBを取得する関数
@@ -31,36 +163,134 @@ def get_main_db() -> str:
         return "sqlite:///indexing.db"
 
 
-def get_vector_store():
+def get_embedding_model_name(embeddings: Embeddings) -> str:
     """
-    ベクトルストアを作成する関数
+    埋め込みモデルの名前を取得する関数
+    モデルが変わった場合に別のキャッシュを使用するため、キャッシュのキーに含める
     """
-    embeddings = embedding_model_settings()
-    return Chroma(
-        collection_name="document_collection",
-        embedding_function=embeddings,
-        persist_directory="./chroma_db",
+    for attr in ("model", "model_name", "deployment"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(embeddings).__name__
+
+
+def get_embedding_cache_namespace(embeddings: Embeddings) -> str:
+    """
+    埋め込みのキャッシュの名前空間を取得する関数
+    モデル名に加えて、テキストの前に付ける接頭辞(ローカルの埋め込みモデルの設定)が変わった場合も別のキャッシュを使用する
+    接頭辞がない場合はモデル名のみとし、既存のキャッシュをそのまま使用する
+    """
+    namespace = get_embedding_model_name(embeddings)
+    prefixes = [getattr(embeddings, attr, "") for attr in ("document_prefix", "query_prefix")]
+    if any(prefixes):
+        namespace += "/" + json.dumps(prefixes, ensure_ascii=False)
+    return namespace
+
+
+def get_embedding_batch_size() -> int:
+    """
+    キャッシュにないテキストを1回のリクエストで送信する件数を設定から取得する関数
+    """
+    try:
+        return max(int(load_settings("llm_settings").get("embedding_batch_size", DEFAULT_EMBEDDING_BATCH_SIZE)), 1)
+    except (TypeError, ValueError):
+        return DEFAULT_EMBEDDING_BATCH_SIZE
+
+
+def create_embedding_cache_store(namespace: str, db_url: str) -> EncoderBackedStore:
+    """
+    埋め込みのキャッシュを保存するストアを作成する関数
+    キーは名前空間とテキストのSHA-256のハッシュから作成し、埋め込みはJSONに変換して保存する
+    """
+    store = SQLStore(namespace=EMBEDDING_CACHE_NAMESPACE, db_url=db_url)
+    store.create_schema()
+    return EncoderBackedStore(
+        store,
+        key_encoder=lambda text: f"{namespace}/{hashlib.sha256(text.encode('utf-8')).hexdigest()}",
+        value_serializer=lambda embedding: json.dumps(embedding).encode("utf-8"),
+        value_deserializer=lambda data: json.loads(data.decode("utf-8")),
     )
 
 
+def create_cached_embeddings(
+    embeddings: Embeddings, batch_size: int | None = None, db_url: str | None = None
+) -> CacheBackedEmbeddings:
+    """
+    埋め込みの結果をDBに保存するEmbeddingsを作成する関数
+    キャッシュはレコードマネージャーと同じDBに保存し、キーはモデル名・接頭辞とテキストのハッシュから作成する
+    同じ内容を再インデックスする場合は埋め込みのAPIを呼び出さない
+
+    Args:
+        embeddings (Embeddings): 埋め込みを計算するEmbeddings
+        batch_size (int, optional): キャッシュにないテキストを1回のリクエストで送信する件数. Defaults to 設定の値.
+        db_url (str, optional): キャッシュを保存するDBのURL. Defaults to メインDB.
+    """
+    store = create_embedding_cache_store(get_embedding_cache_namespace(embeddings), db_url or get_main_db())
+    return CacheBackedEmbeddings(embeddings, store, batch_size=batch_size or get_embedding_batch_size())
+
+
+def get_vector_store() -> Chroma:
+    """
+    ベクトルストアを取得する関数
+    プロセス内で1つのインスタンスを使い回し、LLM・埋め込みモデルの設定が変更された場合のみ作り直す
+    """
+    return _cache.get_vector_store()
+
+
+def reset_vector_store():
+    """
+    キャッシュしているベクトルストアを破棄する関数
+    次回のget_vector_storeで作り直す
+    """
+    _cache.clear()
+
+
+def get_record_manager() -> SQLRecordManager:
+    """
+    レコードマネージャーを取得する関数
+    接続先のDBと埋め込みのプロバイダーごとに1つのインスタンスを使い回し、スキーマの作成は初回のみ行う
+    接続先と名前空間の設定は、設定ファイルが更新された場合のみ読み直す
+    """
+    return _cache.get_current_record_manager()
+
+
 def indexing_document(content: str, document_id: int):
     """
-    ドキュメントをインデックスする関数
+    ドキュメントをチャンクに分割してインデックスする関数
+    変更されたチャンクのみ埋め込みを計算し、不要になったチャンクは削除する
     """
-    docs = create_document_obj(content, document_id)
+    indexing_documents({document_id: content})
+
+
+def indexing_documents(documents: dict[int, str], batch_size: int = INDEX_BATCH_SIZE):
+    """
+    複数のドキュメントをまとめてインデックスする関数
+    全てのドキュメントのチャンクをまとめてindexに渡し、batch_size件ごとに埋め込みを計算する
+
+    Args:
+        documents (dict[int, str]): {ドキュメントID: 内容}
+        batch_size (int, optional): 1回の埋め込みの計算で送信するチャンク数. Defaults to INDEX_BATCH_SIZE.
+    """
+    docs = []
+    for document_id, content in documents.items():
+        chunks = split_document(content, document_id)
+        if not chunks:
+            # 内容が空の場合はincrementalのクリーンアップが行われないため、明示的に削除する
+            delete_document_from_vectorstore(document_id)
+        docs.extend(chunks)
+    if not docs:
+        return
 
     vector_store = get_vector_store()
-    record_manager = SQLRecordManager(
-        namespace="chromadb/document_collection",
-        db_url=get_main_db(),
-    )
-    record_manager.create_schema()
+    record_manager = get_record_manager()
     result = index(
         docs,
         record_manager,
         vector_store,
         cleanup="incremental",
         source_id_key="source",
+        batch_size=batch_size,
     )
     print(f"{result=}")
     print("Document indexed.")
@@ -69,28 +299,18 @@ def indexing_document(content: str, document_id: int):
 def delete_document_from_vectorstore(document_id: int):
     """
     ドキュメントをベクトルストアから削除する関数
+    レコードマネージャーからドキュメントのsourceに対応するキーだけを取得して削除するため、
+    処理時間は他のドキュメントの数に依存しない
     """
-    # 削除するドキュメント以外のドキュメントを取得する
-    settings_manager = SettingsManager()
-    db = DatabaseHandler(settings_manager)
-    all_documents = db.fetch_query("SELECT * FROM documents WHERE document_id != %s", (document_id,))
-    docs = []
-    for doc in all_documents:
-        docs.append(create_document_obj(doc[2], doc[0], return_list=False))
-    vector_store = get_vector_store()
-    record_manager = SQLRecordManager(
-        namespace="chromadb/document_collection",
-        db_url=get_main_db(),
-    )
-    result = index(
-        docs,
-        record_manager,
-        vector_store,
-        cleanup="full",
-        source_id_key="source",
-    )
-    print(f"{result=}")
-    print("Document deleted from vector store.")
+    record_manager = get_record_manager()
+    keys = record_manager.list_keys(group_ids=[str(document_id)])
+    if not keys:
+        logger.info(f"ベクトルストアに削除するドキュメントがありません: {document_id}")
+        return
+    # indexで登録したドキュメントはレコードマネージャーのキーをベクトルストアのIDとして使用している
+    get_vector_store().delete(ids=keys)
+    record_manager.delete_keys(keys)
+    logger.info(f"ベクトルストアからドキュメントを削除しました: {document_id} ({len(keys)}件)")
 
 
 # def add_document_to_vectorstore(content: str, document_id: int):
@@ -107,10 +327,7 @@ def delete_document_from_vectorstore(document_id: int):
 
 def _clear_vectordb():
     vectorstore = get_vector_store()
-    record_manager = SQLRecordManager(
-        namespace="chromadb/document_collection",
-        db_url=get_main_db(),
-    )
+    record_manager = get_record_manager()
     """Hacky helper method to clear content. See the `full` mode section to to understand why it works."""
     index([], record_manager, vectorstore, cleanup="full", source_id_key="source")
     print("Vector store cleared.")
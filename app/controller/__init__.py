@@ -1,7 +1,6 @@
-from .chat_controller import ChatController
-from .documents_controller import DocumentsController
+# ChatController・DocumentsController・SettingsControllerはapp.aiを使用するため、ここでは読み込まない
+# (app.aiのモジュールが読み込むSettingsManagerから、app.aiが循環importされないようにする)
 from .home_controller import HomeController
-from .settings_controller import SettingsController
 from .unity_controller import UnityController
 from .auth_controller import AuthController, LogoutController, UpdateController
 
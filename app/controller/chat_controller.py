@@ -13,10 +13,8 @@ from app.controller.manager import (
     SettingsManager,
 )
 from app.controller.manager.agent_manager import (
-    DisplayInfoTool,
-    ModelChangeTool,
-    ModelListTool,
     SupervisorAgent,
+    agent_runtime,
     sub_agents_with_generic,
     summarize_agent,
 )
@@ -61,25 +59,13 @@ class ChatController(AbstractController):
         logger.info(f"Session ID set: {self.session_id}")
         return self.session_id
 
-    def _initialize_agent(self):
-        agent = SupervisorAgent(
-            sub_agents_with_generic,
-            settings_manager=self.settings_manager,
-            thread_id=self.session_id,
-        )
-        # ここにDisplayAgentに全てのツールを登録しなおす
-        agent.sub_agents[0].rebind_tools(
-            [
-                DisplayInfoTool(obj_manager=self.obj_manager),
-                ModelChangeTool(obj_manager=self.obj_manager),
-                ModelListTool(obj_database_manager=self.obj_database_manager),
-            ]
-        )
-        return agent
+    def _initialize_agent(self) -> SupervisorAgent:
+        # エージェントとツールはプロセス内で共有し、会話はセッションIDごとに分ける
+        return agent_runtime.get_supervisor(self.settings_manager)
 
     def get_chat_history(self) -> list[Message]:
         # chat_history = self.chatbot.graph.get_state(self.chatbot.memory_config)
-        chat_history = self.agent.graph.get_state(self.agent.memory_config)
+        chat_history = self.agent.graph.get_state(self.agent.get_memory_config(self.session_id))
         try:
             chat_history = chat_history.values["messages"]
             messages = []
@@ -129,15 +115,23 @@ class ChatController(AbstractController):
             return True
         return False
 
-    def _is_correct_agent(self, metadata: dict) -> bool:
-        if self._is_first_thinking() and not self.view.chat_list.controls[-1].thinking_chat.visible:
-            self.view.chat_list.controls[-1].thinking_chat.visible = True
-            return False
-        before_agent = self.view.chat_list.controls[-1].thinking_chat.controls[-1].name.value
-        after_agent = metadata.get("tags")[0]
-        if before_agent == after_agent:
-            return True
-        return False
+    def _append_agent_message(self, agent_tiles: dict, metadata: dict, content: str):
+        """
+        部署の回答をThinking_flowに追加する
+        同時に実行した部署の回答は交互に届くため、部署と実行ステップごとのタイルに追加する
+        """
+        thinking_chat = self.view.chat_list.controls[-1].thinking_chat
+        agent_name = metadata.get("tags")[0]
+        tile_key = (agent_name, metadata.get("langgraph_step"))
+        tile = agent_tiles.get(tile_key)
+        if tile is None:
+            # 新たな部署の回答の場合は、新たにタイルを追加
+            thinking_chat.visible = True
+            tile = create_chat_message_tile(agent_name, content, self.tap_link)
+            thinking_chat.controls.append(tile)
+            agent_tiles[tile_key] = tile
+        else:
+            tile.body.value += content
 
     def send_message(self, _):
         if self.view.text_field.value != "":
@@ -163,7 +157,9 @@ class ChatController(AbstractController):
                     )
                 )
 
-                for res, metadata in self.agent.stream(message):
+                self.agent = self._initialize_agent()
+                agent_tiles = {}
+                for res, metadata in self.agent.stream(message, thread_id=self.session_id):
                     if res.content:  # ストリーミングの結果がある場合
                         if summarize_agent.name in metadata.get("tags", []):  # summarize_agentの結果の場合
                             if self._is_first_thinking():
@@ -172,17 +168,7 @@ class ChatController(AbstractController):
                                 self.view.chat_list.controls[-1].body.value += res.content
                         elif any(agent.name in metadata.get("tags", []) for agent in sub_agents_with_generic):
                             # sub_agents_with_genericの結果の場合
-                            if not self._is_correct_agent(metadata):
-                                # 前回のAIの名前と違う場合は、新たにタイルを追加
-                                history_tile = create_chat_message_tile(
-                                    metadata.get("tags")[0],
-                                    res.content,
-                                    self.tap_link,
-                                )
-                                self.view.chat_list.controls[-1].thinking_chat.controls.append(history_tile)
-                            else:
-                                # 前回のAIの名前と同じ場合は、前回のAIのメッセージに追加
-                                self.view.chat_list.controls[-1].thinking_chat.controls[-1].body.value += res.content
+                            self._append_agent_message(agent_tiles, metadata, res.content)
                         self.view.chat_list.update()
             except Exception as err:
                 logger.error(f"Error sending message: {err}")
@@ -194,7 +180,6 @@ class ChatController(AbstractController):
 
     def init_chat_button(self, _):
         self._init_session()
-        self._initialize_agent()
         self.view.chat_list.controls.clear()
         self.page.update()
 
@@ -234,6 +219,7 @@ if __name__ == "__main__":
         server = ServerManager()
         obj_database_manager = ObjectDatabaseManager(db_handler)
         obj_manager = ObjectManager(obj_database_manager, server)
+        agent_runtime.bind_display_tools(server)
         chat_page = ChatController(page, server, settings_manager, obj_manager, obj_database_manager)
         page.add(chat_page.get_view())
 
@@ -3,12 +3,13 @@ import os
 
 from flet import FilePicker, FilePickerResultEvent, FilePickerUploadFile, InputBorder, Page, TextButton, TextField
 
-from app.ai.vector_db import delete_document_from_vectorstore, indexing_document
+from app.ai.index_worker import IndexWorker
 from app.controller.core import AbstractController
 from app.controller.manager import (
     AuthManager,
     DocumentsManager,
 )
+from app.controller.manager.index_job_manager import DELETE_OPERATION, FAILED_STATUS, PENDING_STATUS, RUNNING_STATUS
 from app.controller.utils import markitdown
 from app.views.core import BannerView
 from app.views.documents_view import (
@@ -26,12 +27,26 @@ from app.views.documents_view import (
 
 logger = logging.getLogger(__name__)
 
+# サイドバーに表示するインデックスの状態(完了したドキュメントは表示しない)
+INDEX_STATUS_LABELS = {
+    PENDING_STATUS: "⏳",
+    RUNNING_STATUS: "🔄",
+    FAILED_STATUS: "⚠️",
+}
+
 
 class DocumentsSidebarController(AbstractController):
-    def __init__(self, page: Page, docs_manager: DocumentsManager, is_authenticated: bool = False):
+    def __init__(
+        self,
+        page: Page,
+        docs_manager: DocumentsManager,
+        is_authenticated: bool = False,
+        index_worker: IndexWorker | None = None,
+    ):
         super().__init__(page)
         self.manager = docs_manager
         self.is_authenticated = is_authenticated
+        self.index_worker = index_worker
         self.banner = BannerView(page)
         self.add_doc_modal = None
 
@@ -52,11 +67,15 @@ class DocumentsSidebarController(AbstractController):
     def _create_nav_rail_item(self):
         items = []
         documents_list = self.manager.get_all_documents()
+        index_statuses = self.index_worker.get_statuses() if self.index_worker else {}
         for doc in documents_list:
+            # インデックスが完了していないドキュメントはタイトルに状態を表示する
+            index_status = index_statuses.get(doc["id"], {}).get("status")
+            status_label = INDEX_STATUS_LABELS.get(index_status)
             items.append(
                 create_nav_rail_item(
                     self.page,
-                    doc["title"],
+                    f"{doc['title']} {status_label}" if status_label else doc["title"],
                     doc["id"],
                     self.is_authenticated,
                 )
@@ -119,12 +138,14 @@ class DocumentsController(AbstractController):
         page: Page,
         docs_manager: DocumentsManager,
         auth_manager: AuthManager,
+        index_worker: IndexWorker,
         document_id: int | None = None,
         is_edit: bool = False,
     ):
         super().__init__(page)
         self.manager = docs_manager
         self.auth_manager = auth_manager
+        self.index_worker = index_worker
         self.is_authenticated = self.auth_manager.check_is_authenticated()
         self.docs_view = None
         self.edit_body = None
@@ -132,7 +153,9 @@ class DocumentsController(AbstractController):
         self.sidebar = None
         self.edit_doc_modal = None
         self.banner = BannerView(page)
-        self.docs_sidebar_controller = DocumentsSidebarController(page, docs_manager, self.is_authenticated)
+        self.docs_sidebar_controller = DocumentsSidebarController(
+            page, docs_manager, self.is_authenticated, index_worker
+        )
         self.document_id = document_id
         self.is_edit = is_edit
 
@@ -147,7 +170,8 @@ class DocumentsController(AbstractController):
             content = self.edit_view.edit_body.text_field.value
             try:
                 self.manager.update_document(self.document_id, title, content)
-                indexing_document(content, self.document_id)
+                # インデックスの作成はバックグラウンドで行い、保存後すぐに画面を戻す
+                self.index_worker.enqueue(self.document_id)
                 self._back_page(_)
             except Exception as err:
                 logger.error(f"Error saving document: {err}")
@@ -159,7 +183,7 @@ class DocumentsController(AbstractController):
         if self.edit_view:
             try:
                 self.manager.delete_document(self.document_id)
-                delete_document_from_vectorstore(self.document_id)
+                self.index_worker.enqueue(self.document_id, DELETE_OPERATION)
                 self.page.go("/documents")
                 self.banner.show_banner("success", "Document deleted successfully.")
             except Exception as err:
@@ -9,14 +9,14 @@ from flet import (
 
 from app.controller import (
     AuthController,
-    ChatController,
-    DocumentsController,
     HomeController,
     LogoutController,
-    SettingsController,
     UnityController,
     UpdateController,
 )
+from app.controller.chat_controller import ChatController
+from app.controller.documents_controller import DocumentsController
+from app.controller.settings_controller import SettingsController
 from app.models.route_models import RouteItem, RouteParam, RouteParamKey, RouteParamValue
 from app.service_container import Container
 from app.views.footer_view import FooterView
@@ -36,6 +36,7 @@ ROUTES = {
         DocumentsController,
         [
             RouteParam(RouteParamKey.DOCS_MANAGER, RouteParamValue.DOCS_MANAGER),
+            RouteParam(RouteParamKey.INDEX_WORKER, RouteParamValue.INDEX_WORKER),
             RouteParam(RouteParamKey.AUTH_MANAGER, RouteParamValue.AUTH_MANAGER),
         ],
     ),
@@ -44,6 +45,7 @@ ROUTES = {
         DocumentsController,
         [
             RouteParam(RouteParamKey.DOCS_MANAGER, RouteParamValue.DOCS_MANAGER),
+            RouteParam(RouteParamKey.INDEX_WORKER, RouteParamValue.INDEX_WORKER),
             RouteParam(RouteParamKey.AUTH_MANAGER, RouteParamValue.AUTH_MANAGER),
         ],
     ),
@@ -52,6 +54,7 @@ ROUTES = {
         DocumentsController,
         [
             RouteParam(RouteParamKey.DOCS_MANAGER, RouteParamValue.DOCS_MANAGER),
+            RouteParam(RouteParamKey.INDEX_WORKER, RouteParamValue.INDEX_WORKER),
             RouteParam(RouteParamKey.AUTH_MANAGER, RouteParamValue.AUTH_MANAGER),
             RouteParam("is_edit", True),
         ],
@@ -1,8 +1,8 @@
 from .documents_manager import DocumentsManager
+from .index_job_manager import IndexJobManager
 from .server_manager import ServerManager
 from .settings_manager import SettingsManager
 from .file_manager import FileManager
 from .auth_manager import AuthManager
 from .obj_manager import ObjectDatabaseManager
 from .obj_manager import ObjectManager
-from .agent_manager import DisplayInfoTool, ModelChangeTool, ModelListTool
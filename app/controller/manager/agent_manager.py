@@ -1,6 +1,7 @@
+import json
 import logging
 import os
-import sqlite3
+import threading
 from time import sleep
 from typing import Annotated, Literal
 
@@ -11,20 +12,20 @@ from langchain_core.callbacks import (
 )
 from langchain_core.messages import HumanMessage
 from langchain_core.tools import BaseTool, tool
-from langgraph.checkpoint.postgres import PostgresSaver
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import create_react_agent
-from langgraph.types import Command
-from psycopg_pool import ConnectionPool
+from langgraph.types import Command, Send
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
+from app.ai.checkpointer import checkpointer_cache, get_checkpointer
+from app.ai.intent_router import IntentRouter, intent_router
+from app.ai.query_cache import query_cache
+from app.ai.search import hybrid_search
 from app.ai.settings import ChatGoogleGenerativeAI, llm_settings
-from app.ai.vector_db import get_vector_store
 from app.controller.manager.obj_manager import ObjectDatabaseManager, ObjectManager
 from app.controller.manager.server_manager import ServerManager
-from app.controller.manager.settings_manager import SettingsManager
+from app.controller.manager.settings_manager import SettingsManager, get_settings_fingerprint, load_settings
 from app.models.agent_models import State
 from app.models.database_models import DatabaseHandler
 
@@ -90,12 +91,38 @@ class SubAgent:
         self.prompt = general_prompt_with_lang + prompt
         self.name = name
         self.description = description
-        self.llm = llm_settings(tags=[self.name])
-        self.agent = self.initialize_agent(tools=self.tools)
+        # LLMとエージェントは最初に使用する時に作成する(import時に設定ファイルを読み込まないようにする)
+        self._llm = None
+        self._agent = None
+        self._lock = threading.RLock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = llm_settings(tags=[self.name])
+        return self._llm
+
+    @property
+    def agent(self):
+        agent = self._agent
+        if agent is None:
+            with self._lock:
+                if self._agent is None:
+                    self._agent = self.initialize_agent(tools=self.tools)
+                agent = self._agent
+        return agent
 
     def initialize_agent(self, tools=None):
         return create_react_agent(self.llm, tools=tools, prompt=self.prompt, name=self.name)
 
+    def reset(self):
+        """LLMの設定が変更された場合に、LLMとエージェントを次に使用する時に作り直す"""
+        with self._lock:
+            self._llm = None
+            self._agent = None
+
     def get_full_prompts(self):
         return self.agent.get_prompts()
 
@@ -113,7 +140,9 @@ class SubAgent:
         )
 
     def rebind_tools(self, tools):
-        self.agent = self.initialize_agent(tools=tools)
+        with self._lock:
+            self.tools = tools
+            self._agent = None
 
 
 # displayを扱うSubAgent ------------------------------------
@@ -242,11 +271,11 @@ display_agent = SubAgent(
 def document_search_tool(query: Annotated[str, "The query to search documents for."]) -> str:
     """
     ドキュメントを検索する関数
-    queryに基づいて、3Dモデル解説ドキュメントを検索し、類似度の高いドキュメントを返す
+    queryに基づいて、3Dモデル解説ドキュメントを全文検索とベクトル検索で検索し、関連度の高いドキュメントを返す
     """
     logger.debug(f"document_search_tool called with query={query}")
     try:
-        res = get_vector_store().similarity_search(query=query)
+        res = hybrid_search(query)
         if not res:
             return "類似ドキュメントは見つかりませんでした。"
         logger.debug(f"document_search_tool result: {res}")
@@ -383,15 +412,17 @@ options = members + ["FINISH"]
 
 
 class Router(TypedDict):
-    """Worker to route to next. If no workers needed, route to FINISH."""
+    """Workers to route to next. List several workers only if their tasks are independent; they run in parallel.
+    If no workers needed, route to FINISH."""
 
-    next: Literal[*options]  # type: ignore
+    next: list[Literal[*options]]  # type: ignore
 
 
 class PydanticRouter(BaseModel):
-    """Worker to route to next. If no workers needed, route to FINISH."""
+    """Workers to route to next. List several workers only if their tasks are independent; they run in parallel.
+    If no workers needed, route to FINISH."""
 
-    next: Literal[*options]  # type: ignore
+    next: list[Literal[*options]]  # type: ignore
 
 
 supervisor_prompt = f"""
@@ -414,6 +445,8 @@ supervisor_prompt = f"""
 - 同じ部署を何度も呼び出さないようにすること
 - もしユーザーの意図が曖昧な場合は、追加でユーザーの意図を確かめるためにFINISHを呼び出すこと
 - 質問が複合的な場合は、複数の部署を段階的に呼び出し、最後にFINISHへ誘導せよ
+- 互いの結果を必要としない独立した要求が複数ある場合は、それらの部署をまとめて選択せよ(同時に実行される)
+- ある部署の結果を使って別の部署が作業する場合は、まとめて選択せず1つずつ呼び出すこと
 - このプロンプトでの推論ステップ(内部の思考や理由付け)はユーザーには見せない
 - 完璧を求めず、ユーザーにわかりやすく、迅速に対応することを心がけよ
 
@@ -432,6 +465,10 @@ supervisor_prompt = f"""
 → DisplayControlAgent: "今映ってるモデルは..."
 → あなた: DocumentSearchAgent
 
+[例4]
+ユーザー入力: "表示できるモデルの一覧と、SRDのドキュメントに書いてある使い方を教えて"
+→ あなた: DisplayControlAgent, DocumentSearchAgent (互いの結果を必要としないため同時に実行する)
+
 """
 
 
@@ -451,21 +488,15 @@ class SupervisorAgent:
         self.language = language
         self.thread_id = thread_id
         self.verbose = verbose
+        # 明らかな要求はLLMを呼ばずにルールで振り分ける(Noneにすると常にLLMで振り分ける)
+        self.intent_router: IntentRouter | None = intent_router
 
         self._initialize_memory()
         self.graph = self._initialize_graph()
 
     def _initialize_memory(self):
-        db_settings = self.settings_manager.load_settings().database_settings
-        if db_settings.use_postgres:
-            postgres_settings = db_settings.postgres_settings
-            self.DB_URI = f"postgresql://{postgres_settings.user}:{postgres_settings.password}@{postgres_settings.host}:{postgres_settings.port}/{postgres_settings.database}?sslmode=disable"
-            self.connection_kwargs = {"autocommit": True, "prepare_threshold": 0}
-            self.pool = ConnectionPool(conninfo=self.DB_URI, max_size=20, kwargs=self.connection_kwargs, open=True)
-            self.memory = PostgresSaver(self.pool)
-            self.memory.setup()
-        else:
-            self.memory = SqliteSaver(sqlite3.connect("chat_memory.db", check_same_thread=False))
+        # チェックポイントの保存先(PostgreSQLのコネクションプール)はプロセス内で共有する
+        self.memory = get_checkpointer()
 
     def _initialize_graph(self):
         builder = StateGraph(State)
@@ -479,7 +510,11 @@ class SupervisorAgent:
 
     @property
     def memory_config(self):
-        return {"configurable": {"thread_id": self.thread_id}}
+        return self.get_memory_config(self.thread_id)
+
+    @staticmethod
+    def get_memory_config(thread_id: str) -> dict:
+        return {"configurable": {"thread_id": thread_id}}
 
     def draw_graph(self, output_file: str | None = None) -> None:
         try:
@@ -490,38 +525,94 @@ class SupervisorAgent:
         except Exception as e:
             raise ValueError("グラフの描画に失敗しました。") from e
 
+    @staticmethod
+    def _last_user_message_index(messages: list) -> int | None:
+        # 部署の回答はnameを付けたHumanMessageなので、nameのないHumanMessageをユーザーの入力とする
+        return next(
+            (i for i in range(len(messages) - 1, -1, -1) if messages[i].type == "human" and not messages[i].name),
+            None,
+        )
+
+    def _route_by_rules(self, state: State) -> str | None:
+        """
+        ユーザーの最後の入力をルールで振り分ける
+        ルールで振り分けた部署が既に回答している場合は、まとめの部署に進む
+        :return: 次に呼び出す部署の名前(ルールで判定できない場合はNone)
+        """
+        if self.intent_router is None:
+            return None
+        messages = state["messages"]
+        user_index = self._last_user_message_index(messages)
+        if user_index is None or not isinstance(messages[user_index].content, str):
+            return None
+        answered = {message.name for message in messages[user_index + 1 :]}
+        decision = self.intent_router.route(messages[user_index].content, record=not answered)
+        if decision.agent is None:
+            return None
+        return summarize_agent.name if decision.agent in answered else decision.agent
+
+    def _is_parallel_finished(self, state: State) -> bool:
+        """同時に実行した部署が全て回答したかどうかを判定する"""
+        parallel_agents = state.get("parallel_agents") or []
+        if not parallel_agents:
+            return False
+        messages = state["messages"]
+        user_index = self._last_user_message_index(messages)
+        answered = {message.name for message in messages[(user_index or 0) + 1 :]}
+        return answered.issuperset(parallel_agents)
+
     def node(self, state: State) -> Command[Literal[*members, "__end__"]]:  # type: ignore
+        if self._is_parallel_finished(state):
+            # 同時に実行した部署の回答は全てメッセージに追加されているため、そのまままとめの部署に進む
+            logger.debug("Parallel agents finished. summarizing...")
+            return Command(goto=summarize_agent.name, update={"next": summarize_agent.name, "parallel_agents": []})
+
+        goto = self._route_by_rules(state)
+        if goto is not None:
+            return Command(goto=goto, update={"next": goto, "parallel_agents": []})
+
         general_prompt_with_lang = general_prompt.format(language=self.language)
         messages = [
             {"role": "system", "content": general_prompt_with_lang + supervisor_prompt},
         ] + state["messages"]
         if isinstance(self.llm, ChatGoogleGenerativeAI):
             response = self.llm.with_structured_output(PydanticRouter).invoke(messages)
-            goto = response.next
+            next_agents = response.next
         else:
             response = self.llm.with_structured_output(Router).invoke(messages)
-            goto = response["next"]
-        if goto == "FINISH":
+            next_agents = response["next"]
+        logger.info(f"Supervisor route: agents={next_agents}")
+        # 同じ部署は1回だけ呼び出し、FINISHと同時に選択された部署は先に実行する
+        agents = [agent for agent in dict.fromkeys(next_agents) if agent in members]
+        if not agents:
             logger.debug("Finished supervisor. summarizing...")
-            goto = summarize_agent.name
+            return Command(goto=summarize_agent.name, update={"next": summarize_agent.name, "parallel_agents": []})
+        if len(agents) == 1:
+            return Command(goto=agents[0], update={"next": agents[0], "parallel_agents": []})
 
-        return Command(goto=goto, update={"next": goto})
+        # 独立した部署は同時に実行し、全ての回答がそろった後にスーパーバイザーに戻る
+        logger.debug(f"Running agents in parallel: {agents}")
+        return Command(
+            goto=[Send(agent, state) for agent in agents],
+            update={"next": ", ".join(agents), "parallel_agents": agents},
+        )
 
     def stream(self, user_message: str, thread_id: str = None, debug: bool = False):
-        if not thread_id and not self.thread_id:
+        # 複数のセッションで同じインスタンスを共有するため、thread_idはインスタンスに保存しない
+        thread_id = thread_id or self.thread_id
+        if not thread_id:
             raise ValueError("thread_id is required.")
-        if thread_id:
-            self.thread_id = thread_id
 
         send_message = {"messages": [("user", user_message)]}
         stream_mode = ["messages"] if not debug else ["updates", "messages"]
+        memory_config = self.get_memory_config(thread_id)
 
         try:
             # ここでLLMによる応答を生成、ストリーミングで返す
             if debug:
-                yield from self.graph.stream(send_message, config=self.memory_config, stream_mode=stream_mode)
+                yield from self.graph.stream(send_message, config=memory_config, stream_mode=stream_mode)
             else:
-                for _, message in self.graph.stream(send_message, config=self.memory_config, stream_mode=stream_mode):
+                for _, message in self.graph.stream(send_message, config=memory_config, stream_mode=stream_mode):
                     yield message
 
             # yield from self.graph.stream(
@@ -536,6 +627,115 @@ class SupervisorAgent:
             raise ValueError("ストリーム更新に失敗しました。") from e
 
 
+class AgentRuntime:
+    """
+    プロセス内で共有するエージェントの実行環境
+
+    SupervisorAgentとコンパイル済みのグラフ、チェックポイントの接続は最初に使用する時に1回だけ作成し、
+    全てのセッションで共有する(セッションごとの会話はthread_idで分ける)。
+    設定ファイルが更新され、LLMまたはデータベースの設定が変わっていた場合のみ作り直す。
+    """
+
+    def __init__(self, sub_agents: list[SubAgent]):
+        self.sub_agents = sub_agents
+        self._lock = threading.Lock()
+        self._supervisor: SupervisorAgent | None = None
+        self._settings: str | None = None
+        self._fingerprint: tuple[int, int] | None = None
+        self._server: ServerManager | None = None
+        self._display_db_handler: DatabaseHandler | None = None
+
+    @staticmethod
+    def _load_agent_settings() -> str:
+        return json.dumps(
+            {key: load_settings(key) for key in ("llm_settings", "database_settings")}, sort_keys=True, default=str
+        )
+
+    def get_supervisor(self, settings_manager: SettingsManager) -> SupervisorAgent:
+        """
+        共有のSupervisorAgentを取得する
+        :param settings_manager: SettingsManagerのインスタンス
+        :return: SupervisorAgent
+        """
+        fingerprint = get_settings_fingerprint()
+        supervisor = self._supervisor
+        if supervisor is not None and fingerprint == self._fingerprint:
+            return supervisor
+
+        with self._lock:
+            if self._supervisor is not None and fingerprint == self._fingerprint:
+                return self._supervisor
+            # 設定ファイルが更新されても、LLMとデータベースの設定が変わっていなければ作り直さない
+            settings = self._load_agent_settings()
+            if self._supervisor is None or settings != self._settings:
+                if self._supervisor is not None:
+                    logger.info("設定が変更されたため、エージェントを作り直します。")
+                for agent in [*self.sub_agents, summarize_agent]:
+                    agent.reset()
+                self._rebind_display_tools(settings_manager)
+                self._supervisor = SupervisorAgent(self.sub_agents, settings_manager=settings_manager)
+                self._settings = settings
+            self._fingerprint = fingerprint
+            return self._supervisor
+
+    def bind_display_tools(self, server: ServerManager):
+        """
+        DisplayControlAgentのツールが使用するServerManagerを登録する
+        アプリの起動時に1回だけ呼び出す。ツールはプロセス内で共有するManagerに対して作成し、チャットごとには作り直さない。
+        :param server: プロセス内で共有するServerManagerのインスタンス
+        """
+        with self._lock:
+            self._server = server
+            if self._supervisor is not None:
+                self._rebind_display_tools(SettingsManager())
+
+    def _rebind_display_tools(self, settings_manager: SettingsManager):
+        # データベースの設定が変わった場合に備えて、エージェントを作り直す時に接続も作り直す
+        if self._server is None:
+            return
+        if self._display_db_handler is not None:
+            self._display_db_handler.close_connection()
+        self._display_db_handler = DatabaseHandler(settings_manager)
+        obj_database_manager = ObjectDatabaseManager(self._display_db_handler)
+        obj_manager = ObjectManager(obj_database_manager, self._server)
+        display_agent.rebind_tools(
+            [
+                DisplayInfoTool(obj_manager=obj_manager),
+                ModelChangeTool(obj_manager=obj_manager),
+                ModelListTool(obj_database_manager=obj_database_manager),
+            ]
+        )
+
+    def warm_up(self, settings_manager: SettingsManager):
+        """
+        チャットページを最初に開く前に、バックグラウンドでエージェントを作成しておく
+        """
+
+        def build():
+            try:
+                self.get_supervisor(settings_manager)
+                for agent in [*self.sub_agents, summarize_agent]:
+                    agent.agent  # noqa: B018
+                logger.info("Agent runtime is ready.")
+            except Exception as e:
+                logger.warning(f"Error warming up agent runtime: {e}")
+
+        threading.Thread(target=build, name="agent-warm-up", daemon=True).start()
+
+    def close(self):
+        """共有のエージェントを破棄し、チェックポイントの接続を閉じる"""
+        logger.info(f"Query cache stats: {query_cache.stats()}")
+        with self._lock:
+            self._supervisor = None
+            if self._display_db_handler is not None:
+                self._display_db_handler.close_connection()
+                self._display_db_handler = None
+        checkpointer_cache.close()
+
+
+agent_runtime = AgentRuntime(sub_agents_with_generic)
+
+
 if __name__ == "__main__":
     from uuid import uuid4
 
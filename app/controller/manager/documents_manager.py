@@ -1,5 +1,6 @@
 import logging
 
+from app.ai.query_cache import query_cache
 from app.models.database_models import DatabaseHandler
 
 logger = logging.getLogger(__name__)
@@ -58,6 +59,7 @@ class DocumentsManager:
         """
         query = "UPDATE documents SET title = %s, content = %s WHERE document_id = %s;"
         self.db_handler.execute_query(query, (title, content, document_id))
+        query_cache.invalidate_source(document_id)
 
     def delete_document(self, document_id: int):
         """
@@ -66,6 +68,7 @@ class DocumentsManager:
         """
         query = "DELETE FROM documents WHERE document_id = %s;"
         self.db_handler.execute_query(query, (document_id,))
+        query_cache.invalidate_source(document_id)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
 import logging
 import os
+import threading
 import zipfile
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 
 from flet import FilePickerUploadFile, Page
 
@@ -13,6 +16,9 @@ from app.models.file_models import FileModel
 
 logger = logging.getLogger(__name__)
 
+# ZIPファイル内のファイルを同時に送信する数
+MAX_PARALLEL_TRANSFERS = 4
+
 
 class FileManager:
     def __init__(
@@ -63,50 +69,137 @@ class FileManager:
     def _send_file(self, command: TransferCommand) -> dict:
         """ファイルをUnityアプリに送信"""
         result = self.server.send_file(command)
-        os.remove(command.file_path)  # 一時ファイルを削除
+        if not command.is_zip_entry:
+            os.remove(command.file_path)  # 一時ファイルを削除
         return result
 
-    def send_file_to_unity(self, file_name: str) -> tuple[bool, dict]:
-        """Unityアプリにファイルを送信"""
+    def send_file_to_unity(
+        self, file_name: str, on_progress: Callable[[dict], None] | None = None
+    ) -> tuple[bool, dict]:
+        """
+        Unityアプリにファイルを送信
+
+        Args:
+            file_name (str): アップロードされたファイル名
+            on_progress (Callable[[dict], None] | None, optional): 送信の進捗を受け取るコールバック.
+                ファイルごとと全体の進捗をまとめた辞書を渡す(_send_bundleを参照). Defaults to None.
+
+        Returns:
+            tuple[bool, dict]: (成功したか, 送信結果)
+                送信結果にはアップロードされたファイルのハッシュ"content_hash"と、
+                同じファイルが以前にアップロードされていた場合はそのオブジェクトID"object_id"を含む
+        """
         command = TransferCommand(self.model.get_file_path(file_name))
         try:
             # ファイルの確認
             self._file_check(command.file_path)
 
+            # 同じファイルが以前にアップロードされていれば、そのオブジェクトIDを再利用する
+            # 送信するファイル名が前回と同じになるため、クライアントが保持しているファイルは送信を省略できる
+            content_hash = command.file_hash
+            object_id = self.obj_database_manager.get_id_by_content_hash(content_hash)
+            if object_id is not None:
+                logger.info(f"以前にアップロードされたファイルです: {file_name} (object_id: {object_id})")
+
             if self._is_zip_file(command.file_path):
-                # zipファイルの場合は解凍
-                extracted_files = self._unzip_file(command.file_path)
-                # 送信前にファイル名を連番にリネーム
-                folder_path = os.path.dirname(command.file_path)
-                renamed_files = self.rename_files_in_folder(folder_path, extracted_files)
-                logger.debug(f"リネームされたファイル: {renamed_files}")
-
-                # .objファイルを最後に送信するために順序を調整
-                renamed_files.sort(key=lambda x: (x.endswith(".obj"), x))
-
-                for renamed_file in renamed_files:
-                    if renamed_file.endswith(".obj") or renamed_file.endswith(".mtl"):
-                        # .objと.mtlファイルはリネームされたパスを使用
-                        file_path = os.path.join(folder_path, renamed_file)
-                    else:
-                        # その他のファイルは元のパスを使用
-                        original_file = next(file for file in extracted_files if os.path.basename(file) == renamed_file)
-                        file_path = os.path.join(folder_path, original_file)
-                    logger.debug(f"ファイルを送信: {file_path}")
-                    command = TransferCommand(file_path)
-                    command.convert_body()  # command_bodyを設定
-                    logger.debug(f"送信ファイル: {command}")
-                    self._send_file(command)
-                result = {"status_message": "OK", "message": "zipファイル送信完了"}
+                # zipファイルの場合は展開せずにエントリを直接送信する
+                entries = self._get_zip_entries(command.file_path)
+                # 送信時のファイル名を連番にする
+                transfer_names = self.get_transfer_names(entries, object_id)
+                logger.debug(f"送信時のファイル名: {transfer_names}")
+
+                commands = []
+                for entry, transfer_name in zip(entries, transfer_names, strict=True):
+                    logger.debug(f"送信ファイル: {entry} -> {transfer_name}")
+                    entry_command = TransferCommand.from_zip_entry(command.file_path, entry, transfer_name)
+                    entry_command.convert_body()  # command_bodyを設定
+                    commands.append(entry_command)
+                results = self._send_bundle(commands, on_progress)
+                cached_files = sum(bool(r.get("transfer_stats", {}).get("cached")) for r in results)
+                result = {"status_message": "OK", "message": "zipファイル送信完了", "cached_files": cached_files}
             else:
                 command.convert_body()  # command_bodyを設定
-                result = self._send_file(command)
+                result = self._send_bundle([command], on_progress)[0]
+            result = {**result, "content_hash": content_hash, "object_id": object_id}
             logger.debug(f"Unity送信結果: {result}")
             return True, result
         except Exception as e:
             logger.error(f"Unity送信エラー: {e}")
             return False, {"status_message": "ERROR", "error_message": f"Unity送信エラー: {e}"}
 
+    def _send_bundle(
+        self, commands: list[TransferCommand], on_progress: Callable[[dict], None] | None = None
+    ) -> list[dict]:
+        """
+        複数のファイルをパイプラインでUnityアプリに送信する
+        .obj以外のファイルは最大MAX_PARALLEL_TRANSFERS件を同時に送信し、
+        あるファイルの送信中に次のファイルの読み込み(ハッシュの計算)を進める。
+        .objファイルは依存するファイル(.mtlやテクスチャ)の送信がすべて完了してから送信する。
+
+        進捗のコールバックには以下の辞書を渡す
+        - file_name: 進捗が更新されたファイル名
+        - file_sent / file_size: そのファイルの送信済みバイト数とサイズ
+        - bundle_sent / bundle_size: 全体の送信済みバイト数と合計サイズ
+        - files_done / files_total: 送信が完了したファイル数とファイル数
+
+        Returns:
+            list[dict]: commandsと同じ順序の送信結果
+        """
+        # .objファイルを最後に送信するために順序を調整
+        dependencies = sorted(
+            (command for command in commands if not command.file_name.endswith(".obj")), key=lambda c: c.file_name
+        )
+        models = sorted(
+            (command for command in commands if command.file_name.endswith(".obj")), key=lambda c: c.file_name
+        )
+
+        lock = threading.Lock()
+        file_sizes = {command.request_id: command.file_size for command in commands}
+        sent_sizes = dict.fromkeys(file_sizes, 0)
+        files_done = 0
+
+        def report(command: TransferCommand, sent_size: int, done: bool = False):
+            nonlocal files_done
+            with lock:
+                sent_sizes[command.request_id] = max(sent_sizes[command.request_id], sent_size)
+                files_done += done
+                progress = {
+                    "file_name": command.file_name,
+                    "file_sent": sent_sizes[command.request_id],
+                    "file_size": file_sizes[command.request_id],
+                    "bundle_sent": sum(sent_sizes.values()),
+                    "bundle_size": sum(file_sizes.values()),
+                    "files_done": files_done,
+                    "files_total": len(commands),
+                }
+            logger.debug(f"送信の進捗: {progress}")
+            if on_progress:
+                on_progress(progress)
+
+        def send(command: TransferCommand) -> dict:
+            command.on_progress = lambda sent_size: report(command, sent_size)
+            result = self._send_file(command)
+            report(command, file_sizes[command.request_id], done=True)
+            return result
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_TRANSFERS, thread_name_prefix="transfer") as executor:
+            try:
+                futures = {command.request_id: executor.submit(send, command) for command in dependencies}
+                # .objファイルのハッシュは依存するファイルの送信中に計算しておく
+                prepared = [executor.submit(command.compute_checksums) for command in models]
+                for request_id, future in futures.items():
+                    results[request_id] = future.result()
+                for future in prepared:
+                    future.result()
+                for command in models:
+                    results[command.request_id] = send(command)
+            except Exception:
+                # 未着手の送信は取り消し、送信中のものは完了を待ってからエラーを返す
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        return [results[command.request_id] for command in commands]
+
     def _file_check(self, file_path: str) -> bool:
         """ファイルが存在するか確認"""
         if not os.path.exists(file_path):
@@ -120,57 +213,47 @@ class FileManager:
         else:
             return False
 
-    def _unzip_file(self, file_path: str) -> list[str]:
-        """ZIPファイルを解凍"""
-        upload_dir = f"{os.environ['FLET_APP_STORAGE_TEMP']}/uploads"
+    def _get_zip_entries(self, file_path: str) -> list[str]:
+        """ZIPファイル内のファイルのエントリ名を取得"""
         try:
             with zipfile.ZipFile(file_path, "r") as zip_ref:
-                extracted_files = []
-
-                for entry in zip_ref.namelist():
+                entries = []
+                for info in zip_ref.infolist():
                     # ディレクトリはスキップ
-                    if entry.endswith("/"):
-                        logger.debug(f"ディレクトリをスキップ: {entry}")
+                    if info.is_dir():
+                        logger.debug(f"ディレクトリをスキップ: {info.filename}")
                         continue
+                    entries.append(info.filename)
 
-                    extracted_file_path = os.path.join(upload_dir, entry)
-
-                    # 必要なディレクトリを作成
-                    os.makedirs(os.path.dirname(extracted_file_path), exist_ok=True)
-
-                    # ファイルを展開
-                    with zip_ref.open(entry) as source, open(extracted_file_path, "wb") as target:
-                        target.write(source.read())
-
-                    extracted_files.append(entry)
-
-                logger.debug(f"展開されたファイル: {extracted_files}")
-                return extracted_files
+                logger.debug(f"ZIPファイル内のファイル: {entries}")
+                return entries
         except Exception as e:
-            logger.error(f"ZIPファイル解凍エラー: {e}")
+            logger.error(f"ZIPファイル読み込みエラー: {e}")
             raise e
 
-    def rename_files_in_folder(self, folder_path: str, files: list[str]) -> list[str]:
-        """フォルダー内のファイルを連番にリネームし、新しいファイル名のリストを返す"""
-        renamed_files = []
+    def get_transfer_names(self, files: list[str], object_id: int | None = None) -> list[str]:
+        """
+        .objと.mtlファイルを連番のファイル名にし、送信時のファイル名のリストを返す
+        object_idを指定した場合は連番の代わりにそのIDを使用する
+        """
+        transfer_names = []
         try:
-            last_id = self.obj_database_manager.get_last_id()
-            last_id += 1
+            if object_id is not None:
+                last_id = object_id
+            else:
+                last_id = self.obj_database_manager.get_last_id()
+                last_id += 1
 
             for file in files:
                 file_extension = os.path.splitext(file)[1]
-                old_file_path = os.path.join(folder_path, file)
                 if file_extension.lower() in [".obj", ".mtl"]:
-                    new_file_path = os.path.join(folder_path, f"{last_id}{file_extension}")
-                    os.rename(old_file_path, new_file_path)
+                    transfer_names.append(f"{last_id}{file_extension}")
                 else:
-                    new_file_path = old_file_path
-                renamed_files.append(os.path.basename(new_file_path))
-            logger.debug(f"フォルダー内のファイルを連番にリネームしました: {folder_path}")
+                    transfer_names.append(os.path.basename(file))
         except Exception as e:
-            logger.error(f"ファイルリネーム中にエラー: {e}")
+            logger.error(f"ファイル名の変換中にエラー: {e}")
             raise e
-        return renamed_files
+        return transfer_names
 
 
 if __name__ == "__main__":
@@ -191,5 +274,5 @@ if __name__ == "__main__":
             f.write("test1.txt")
     print(file_controller.model.get_file_path("test1.txt"))  # /tmp/uploads/test1.txt
 
-    # フォルダー内のファイルを連番にリネーム
-    file_controller.rename_files_in_folder(os.path.join(os.environ["FLET_APP_STORAGE_TEMP"], "uploads"))
+    # 送信時のファイル名を連番に変換
+    print(file_controller.get_transfer_names(["model/model.obj", "model/model.mtl", "model/texture.png"]))
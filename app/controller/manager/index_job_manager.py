@@ -0,0 +1,142 @@
+import logging
+import time
+
+from app.models.database_models import DatabaseHandler
+
+logger = logging.getLogger(__name__)
+
+# ジョブの操作と状態
+INDEX_OPERATION = "index"
+DELETE_OPERATION = "delete"
+PENDING_STATUS = "pending"
+RUNNING_STATUS = "running"
+DONE_STATUS = "done"
+FAILED_STATUS = "failed"
+
+
+class IndexJobManager:
+    """
+    ドキュメントのインデックス作成ジョブのデータ操作を提供するViewModel。
+    ジョブはドキュメントごとに1件で、同じドキュメントを再度登録した場合は最新の操作で上書きする。
+    """
+
+    def __init__(self, db_handler: DatabaseHandler):
+        """
+        :param db_handler: DatabaseHandlerのインスタンス
+        """
+        self.db_handler = db_handler
+
+    def create_schema(self):
+        """
+        ジョブのテーブルが存在しない場合は作成する。
+        初期化SQLより前に作成されたデータベースでも使用できるようにする。
+        """
+        query = """
+            CREATE TABLE IF NOT EXISTS index_jobs (
+                document_id INTEGER PRIMARY KEY,
+                operation VARCHAR(16) NOT NULL,
+                status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_run_at DOUBLE PRECISION NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """
+        self.db_handler.execute_query(query)
+
+    def enqueue(self, document_id: int, operation: str = INDEX_OPERATION):
+        """
+        ジョブを登録する。
+        :param document_id: ドキュメントID
+        :param operation: 操作（"index" または "delete"）
+        """
+        query = """
+            INSERT INTO index_jobs (document_id, operation, status, attempts, next_run_at, last_error, updated_at)
+            VALUES (%s, %s, %s, 0, %s, NULL, CURRENT_TIMESTAMP)
+            ON CONFLICT (document_id) DO UPDATE SET
+                operation = EXCLUDED.operation,
+                status = EXCLUDED.status,
+                attempts = 0,
+                next_run_at = EXCLUDED.next_run_at,
+                last_error = NULL,
+                updated_at = CURRENT_TIMESTAMP;
+        """
+        self.db_handler.execute_query(query, (document_id, operation, PENDING_STATUS, time.time()))
+        logger.debug(f"Index job enqueued: {document_id} ({operation})")
+
+    def fetch_due(self, limit: int) -> list[dict]:
+        """
+        実行時刻を過ぎた待機中のジョブを取得する。
+        :param limit: 取得する最大件数
+        :return: {"document_id": int, "operation": str, "attempts": int}のリスト
+        """
+        query = """
+            SELECT document_id, operation, attempts FROM index_jobs
+            WHERE status = %s AND next_run_at <= %s
+            ORDER BY next_run_at ASC LIMIT %s;
+        """
+        results = self.db_handler.fetch_query(query, (PENDING_STATUS, time.time(), limit))
+        return [{"document_id": row[0], "operation": row[1], "attempts": row[2]} for row in results]
+
+    def get_next_run_at(self) -> float | None:
+        """
+        待機中のジョブのうち最も早い実行時刻を取得する。
+        :return: 実行時刻（UNIX時間、待機中のジョブがない場合はNone）
+        """
+        query = "SELECT MIN(next_run_at) FROM index_jobs WHERE status = %s;"
+        results = self.db_handler.fetch_query(query, (PENDING_STATUS,))
+        return results[0][0] if results else None
+
+    def mark_running(self, document_id: int):
+        """
+        ジョブを実行中にする。
+        :param document_id: ドキュメントID
+        """
+        query = "UPDATE index_jobs SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE document_id = %s;"
+        self.db_handler.execute_query(query, (RUNNING_STATUS, document_id))
+
+    def mark_done(self, document_id: int):
+        """
+        ジョブを完了にする。
+        実行中に同じドキュメントが再登録された場合は待機中のままにする。
+        :param document_id: ドキュメントID
+        """
+        query = """
+            UPDATE index_jobs SET status = %s, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE document_id = %s AND status = %s;
+        """
+        self.db_handler.execute_query(query, (DONE_STATUS, document_id, RUNNING_STATUS))
+
+    def mark_failed(self, document_id: int, error: str, next_run_at: float | None):
+        """
+        ジョブの失敗を記録する。
+        :param document_id: ドキュメントID
+        :param error: エラーメッセージ
+        :param next_run_at: 再試行する時刻（UNIX時間、再試行しない場合はNone）
+        """
+        status = FAILED_STATUS if next_run_at is None else PENDING_STATUS
+        query = """
+            UPDATE index_jobs SET status = %s, attempts = attempts + 1, next_run_at = %s, last_error = %s,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE document_id = %s AND status = %s;
+        """
+        self.db_handler.execute_query(query, (status, next_run_at or 0, error, document_id, RUNNING_STATUS))
+
+    def reset_running(self):
+        """
+        実行中のまま残っているジョブを待機中に戻す。
+        アプリの再起動時に、前回の実行中に中断されたジョブを再実行するために使用する。
+        """
+        query = "UPDATE index_jobs SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE status = %s;"
+        self.db_handler.execute_query(query, (PENDING_STATUS, RUNNING_STATUS))
+
+    def get_statuses(self) -> dict[int, dict]:
+        """
+        全てのジョブの状態を取得する。
+        :return: {ドキュメントID: {"operation": str, "status": str, "attempts": int, "last_error": str | None}}
+        """
+        query = "SELECT document_id, operation, status, attempts, last_error FROM index_jobs;"
+        results = self.db_handler.fetch_query(query)
+        return {
+            row[0]: {"operation": row[1], "status": row[2], "attempts": row[3], "last_error": row[4]} for row in results
+        }
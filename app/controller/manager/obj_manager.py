@@ -10,7 +10,7 @@ from app.models.command_models import (
     TransferCommand,
     UpdateCommand,
 )
-from app.models.database_models import DatabaseHandler
+from app.models.database_models import DatabaseHandler, SQLiteDatabaseHandler
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +26,20 @@ class ObjectDatabaseManager:
         """
         self.db_handler = db_handler
 
+    def create_schema(self):
+        """
+        オブジェクトのテーブルに、アップロードされたファイルのハッシュのカラムとインデックスがない場合は作成する。
+        初期化SQLにカラムが追加される前に作成されたデータベースでも使用できるようにする。
+        """
+        if isinstance(self.db_handler.handler, SQLiteDatabaseHandler):
+            # SQLiteはADD COLUMN IF NOT EXISTSに対応していないため、カラムの有無を確認してから追加する
+            columns = {row[1] for row in self.db_handler.fetch_query("PRAGMA table_info(objects);")}
+            if "content_hash" not in columns:
+                self.db_handler.execute_query("ALTER TABLE objects ADD COLUMN content_hash TEXT;")
+        else:
+            self.db_handler.execute_query("ALTER TABLE objects ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);")
+        self.db_handler.execute_query("CREATE INDEX IF NOT EXISTS idx_objects_content_hash ON objects (content_hash);")
+
     def get_name_by_id(self, object_id: int) -> str:
         """
         指定されたIDのオブジェクト名を取得する。
@@ -70,14 +84,28 @@ class ObjectDatabaseManager:
             return results[0][0]
         return 0  # オブジェクトがない場合は0から開始
 
-    def new_object(self, object_name: str) -> int:
+    def get_id_by_content_hash(self, content_hash: str) -> int | None:
+        """
+        アップロードされたファイルのハッシュが一致するオブジェクトのIDを取得する。
+        削除済みのオブジェクトも対象とする。
+        :param content_hash: アップロードされたファイルのハッシュ
+        :return: オブジェクトID（一致するオブジェクトがない場合はNone）
+        """
+        query = "SELECT object_id FROM objects WHERE content_hash = %s ORDER BY object_id DESC LIMIT 1;"
+        results = self.db_handler.fetch_query(query, (content_hash,))
+        if results:
+            return results[0][0]
+        return None
+
+    def new_object(self, object_name: str, content_hash: str | None = None) -> int:
         """
         新しいオブジェクトを追加する。
         :param object_name: オブジェクト名
+        :param content_hash: アップロードされたファイルのハッシュ（オプション）
         :return: 追加されたオブジェクトのID
         """
-        query = "INSERT INTO objects (object_name) VALUES (%s) RETURNING object_id;"
-        results = self.db_handler.fetch_query(query, (object_name,))
+        query = "INSERT INTO objects (object_name, content_hash) VALUES (%s, %s) RETURNING object_id;"
+        results = self.db_handler.fetch_query(query, (object_name, content_hash))
         if results:
             return results[0][0]
         else:
@@ -99,6 +127,20 @@ class ObjectDatabaseManager:
         )
         logger.info(f"{results} objects updated.")
 
+    def restore_object(self, object_id: int, object_name: str):
+        """
+        同じファイルが再アップロードされた場合に、既存のオブジェクトを再利用する。
+        名前を更新し、削除フラグを解除する。
+        :param object_id: オブジェクトID
+        :param object_name: 新しい名前
+        """
+        query = (
+            "UPDATE objects SET object_name = %s, delete_flag = FALSE, updated_at = CURRENT_TIMESTAMP "
+            "WHERE object_id = %s;"
+        )
+        results = self.db_handler.execute_query(query, (object_name, object_id))
+        logger.info(f"{results} objects restored.")
+
     def delete_object(self, object_id: int):
         """
         指定されたIDのオブジェクトを削除フラグを立てる。
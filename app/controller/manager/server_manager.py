@@ -1,28 +1,524 @@
-import json
+import asyncio
+import concurrent.futures
+import contextlib
+import io
 import logging
 import socket
 import threading
 import time
+from typing import BinaryIO
 
-from app.models.command_models import CommandBase, PingCommand, TransferCommand
+from app.models.command_models import (
+    ChunkCommand,
+    CommandBase,
+    PingCommand,
+    ResponseModel,
+    ResponseReader,
+    TransferCommand,
+    TransferEndCommand,
+    compress_chunk,
+)
 
 logger = logging.getLogger(__name__)
 
+READ_BUFFER_SIZE = 64 * 1024
+# sendfileが使えない環境でファイルを送信する際の読み込みサイズ
+SENDFILE_FALLBACK_BUFFER_SIZE = 1024 * 1024
+# チャンク転送の検証に失敗した際に再送する回数
+MAX_RESUME_ATTEMPTS = 3
+# 死活監視のPingの間隔とタイムアウト(秒)、切断とみなす連続失敗回数
+DEFAULT_PING_INTERVAL = 10
+DEFAULT_PING_TIMEOUT = 5
+MAX_MISSED_PINGS = 2
+# send_commandとsend_fileで応答を待つ時間の既定値(秒)、ファイル転送は大きなファイルを考慮して長くする
+DEFAULT_COMMAND_TIMEOUT = 30
+DEFAULT_TRANSFER_TIMEOUT = 300
+# TCPキープアライブの設定(秒): 無通信になってから確認を始めるまでの時間、確認の間隔、切断とみなす回数
+TCP_KEEPALIVE_IDLE = 30
+TCP_KEEPALIVE_INTERVAL = 10
+TCP_KEEPALIVE_COUNT = 3
+# RTTの指数移動平均の重み
+RTT_SMOOTHING = 0.2
+
+
+def _has_fileno(source: BinaryIO) -> bool:
+    """sendfileで送信できる実ファイルか確認する"""
+    try:
+        source.fileno()
+    except (AttributeError, io.UnsupportedOperation, OSError):
+        return False
+    return True
+
+
+def _enable_keepalive(sock: socket.socket | None) -> None:
+    """
+    TCPキープアライブを有効にする
+    アプリケーションのPingとは別に、OSがネットワークの切断を検知できるようにする
+    """
+    if sock is None:
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # 設定できる項目はOSによって異なるため、対応しているものだけ設定する
+    for name, value in (
+        ("TCP_KEEPIDLE", TCP_KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", TCP_KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", TCP_KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, name):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
+
+def _seek(source: BinaryIO, offset: int):
+    """
+    読み込み位置を移動する
+    ZIPファイル内のエントリは後方へのシークで先頭から展開し直すため、位置が同じ場合は移動しない
+    """
+    if source.tell() != offset:
+        source.seek(offset)
+
+
+class ClientConnection:
+    """
+    接続中のUnityクライアント1台分の状態を保持するクラス
+
+    コマンドはリクエストIDごとに応答待ちのFutureを登録してから送信し、
+    受信タスクが届いたレスポンスをリクエストIDで対応するFutureに振り分ける。
+    そのため複数のコマンドを同時に送信でき、応答の順番が前後しても正しく対応付けられる。
+    リクエストIDを1度も返していない古いクライアントの場合のみ、最も古い応答待ちのコマンドに対応付ける。
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, groups: set[str] | None = None):
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")
+        self.client_id = f"{self.address[0]}:{self.address[1]}" if self.address else str(id(self))
+        self.groups: set[str] = set(groups or [])
+        self.connected_at = time.time()
+        # 死活監視の状態(最後に受信した時刻、直近と平均のRTT、連続して失敗したPingの数)
+        self.last_seen = time.monotonic()
+        self.rtt: float | None = None
+        self.rtt_avg: float | None = None
+        self.missed_pings = 0
+        self.write_lock = asyncio.Lock()
+        # チャンク転送に対応しているか(最初のファイル転送の応答で判定する)
+        self.supports_chunked: bool | None = None
+        # リクエストIDを返すクライアントか(リクエストID付きのレスポンスを受信した時点でTrueにする)
+        self.sends_request_ids = False
+        self.transfer_lock = asyncio.Lock()
+        self.closed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.response_reader = ResponseReader()
+        self._pending: dict[str, asyncio.Future] = {}
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    def __str__(self):
+        return f"client_id: {self.client_id}, groups: {sorted(self.groups)}, pending: {len(self._pending)}"
+
+    @property
+    def pending_count(self) -> int:
+        """応答待ちのコマンド数"""
+        return len(self._pending)
+
+    @property
+    def state(self) -> str:
+        """接続状態("connected", "unresponsive", "disconnected")"""
+        if self.closed.is_set():
+            return "disconnected"
+        if self.missed_pings > 0:
+            return "unresponsive"
+        return "connected"
+
+    def get_state(self) -> dict:
+        """通信を行わずに接続状態を取得する"""
+        return {
+            "client_id": self.client_id,
+            "groups": sorted(self.groups),
+            "state": self.state,
+            "connected_at": self.connected_at,
+            "idle_seconds": time.monotonic() - self.last_seen,
+            "rtt_ms": None if self.rtt is None else self.rtt * 1000,
+            "rtt_avg_ms": None if self.rtt_avg is None else self.rtt_avg * 1000,
+            "missed_pings": self.missed_pings,
+            "pending": self.pending_count,
+        }
+
+    async def ping(self, timeout: float) -> bool:
+        """
+        Pingを送信してRTTを計測する
+        送信後、応答がtimeout秒以内に返らなかった場合は失敗とする
+        ファイル本体の送信などで書き込みを占有されている間は送信を待つため、その時間はタイムアウトに含めない
+
+        Returns:
+            bool: 応答があったかどうか
+        """
+        command = PingCommand()
+        async with self.write_lock:
+            future = self._register(command.request_id)
+            await self._write_command(command)
+        started_at = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._wait_result(command.request_id, future), timeout=timeout)
+        except TimeoutError:
+            self.missed_pings += 1
+            logger.warning(f"Pingの応答がありません: {self.client_id} (連続 {self.missed_pings} 回)")
+            return False
+        if result.get("status_message") != "OK":
+            self.missed_pings += 1
+            logger.warning(f"接続確認に失敗しました: {result}")
+            return False
+
+        self.rtt = time.perf_counter() - started_at
+        self.rtt_avg = (
+            self.rtt if self.rtt_avg is None else (1 - RTT_SMOOTHING) * self.rtt_avg + RTT_SMOOTHING * self.rtt
+        )
+        self.missed_pings = 0
+        logger.debug(f"Ping: {self.client_id} rtt={self.rtt * 1000:.1f} ms (avg {self.rtt_avg * 1000:.1f} ms)")
+        return True
+
+    async def request(self, command: CommandBase) -> dict:
+        """
+        コマンドを送信して結果を待つ
+
+        Args:
+            command (CommandBase): 送信するコマンドのインスタンス
+
+        Returns:
+            dict: クライアントからのレスポンスのボディ
+        """
+        async with self.write_lock:
+            future = self._register(command.request_id)
+            await self._write_command(command)
+        return await self._wait_result(command.request_id, future)
+
+    async def send_file(self, command: TransferCommand) -> dict:
+        """
+        ファイル情報を送信し、続けてファイル本体を送信する
+        チャンク転送に対応したクライアントにはチャンク単位で送信し、
+        クライアントが受信済みの位置から再開する。
+        チャンク転送に対応したクライアントには複数のファイルを同時に送信できる。
+
+        Args:
+            command (TransferCommand): 送信するファイルのコマンド
+
+        Raises:
+            Exception: ファイル情報の送信、またはファイルの検証に失敗した場合
+        """
+        if self.supports_chunked:
+            return await self._transfer(command)
+        # ファイル本体をそのまま送信するクライアントでは本体が他の転送と混ざらないよう、
+        # チャンク転送に対応していると分かるまでは1件ずつ送信する
+        async with self.transfer_lock:
+            return await self._transfer(command)
+
+    async def _transfer(self, command: TransferCommand) -> dict:
+        if not command.has_checksums:
+            # ハッシュの計算はファイル全体を読み込むため、イベントループを止めないよう別スレッドで行う
+            await asyncio.get_running_loop().run_in_executor(None, command.compute_checksums)
+
+        if self.supports_chunked:
+            return await self._send_body(command, await self.request(command))
+
+        # チャンク転送に対応していないクライアントは、ファイル情報に応答した直後からファイル本体を読み込む。
+        # その間にPingなど他のコマンドが書き込まれないよう、ファイル情報の送信から本体の送信まで書き込みを占有する
+        async with self.write_lock:
+            future = self._register(command.request_id)
+            await self._write_command(command)
+            result = await self._wait_result(command.request_id, future)
+            if result["status_message"] == "OK" and not result.get("cached") and not result.get("chunked"):
+                return await self._send_body(command, result, write_locked=True)
+        return await self._send_body(command, result)
+
+    async def _send_body(self, command: TransferCommand, result: dict, write_locked: bool = False) -> dict:
+        """
+        ファイル情報への応答に従ってファイル本体を送信する
+
+        Args:
+            command (TransferCommand): 送信するファイルのコマンド
+            result (dict): ファイル情報への応答
+            write_locked (bool, optional): 呼び出し元が書き込みを占有しているかどうか. Defaults to False.
+        """
+        if result["status_message"] != "OK":
+            logger.error(f"ファイル情報の送信に失敗しました: {result}")
+            raise Exception(f"ファイル情報の送信に失敗しました: {result}")
+        if result.get("cached"):
+            # クライアントが同じ内容のファイルを保持しているため本体は送信しない
+            logger.info(f"クライアントが保持しているため送信を省略しました: {command.file_name} -> {self.client_id}")
+            command.report_progress(command.file_size)
+            stats = {"bytes": 0, "seconds": 0.0, "bytes_per_sec": 0.0, "compression": None, "cached": True}
+            return {**result, "transfer_stats": stats}
+        self.supports_chunked = bool(result.get("chunked"))
+
+        # クライアントが選んだ圧縮方式(提案した方式以外は無視して非圧縮で送る)
+        compression = result.get("compression")
+        if compression not in command.compression_levels:
+            compression = None
+
+        started_at = time.perf_counter()
+        # 送信中はファイルを開いたままにし、ZIPファイル内のエントリも先頭から順に展開しながら送信する
+        with command.open() as source:
+            if result.get("chunked"):
+                result, sent_size = await self._send_chunks(command, source, int(result.get("offset", 0)), compression)
+            else:
+                result, sent_size = await self._send_raw_body(command, source, write_locked)
+        elapsed = time.perf_counter() - started_at
+
+        stats = {
+            "bytes": sent_size,
+            "seconds": elapsed,
+            "bytes_per_sec": sent_size / elapsed if elapsed > 0 else float(sent_size),
+            "compression": compression,
+            "cached": False,
+        }
+        logger.info(
+            f"ファイルを送信しました: {command.file_name} -> {self.client_id} "
+            f"({sent_size} bytes, {elapsed:.3f} s, {stats['bytes_per_sec'] / 1024 / 1024:.2f} MiB/s, "
+            f"compression: {compression})"
+        )
+        logger.info(f"ファイルの送信結果: {result}")
+        return {**result, "transfer_stats": stats}
+
+    async def _send_raw_body(
+        self, command: TransferCommand, source: BinaryIO, write_locked: bool = False
+    ) -> tuple[dict, int]:
+        """
+        チャンク転送に対応していないクライアントにファイル本体をそのまま送信する
+        ファイル本体の送信中は書き込みを占有する(呼び出し元が占有している場合はそのまま送信する)
+        """
+        async with contextlib.nullcontext() if write_locked else self.write_lock:
+            future = self._register(command.request_id)
+            sent_size = await self._write_file(source)
+        command.report_progress(sent_size)
+        if sent_size != command.file_size:
+            logger.warning(f"送信したサイズがファイルサイズと一致しません: {sent_size} != {command.file_size}")
+        return await self._wait_result(command.request_id, future), sent_size
+
+    async def _send_chunks(
+        self, command: TransferCommand, source: BinaryIO, offset: int, compression: str | None = None
+    ) -> tuple[dict, int]:
+        """
+        offset以降のチャンクを送信し、クライアントにファイル全体を検証させる
+        検証に失敗した場合はクライアントが返した位置から再送する
+        チャンクの間は書き込みを解放するため、転送中も他のコマンドを送信できる
+
+        Returns:
+            tuple[dict, int]: (クライアントの検証結果, 送信したバイト数(圧縮後))
+        """
+        sent_size = 0
+        for attempt in range(MAX_RESUME_ATTEMPTS + 1):
+            if offset > 0:
+                logger.info(f"ファイルの転送を再開します: {command.file_name} offset={offset} (attempt: {attempt})")
+            for index, chunk_offset, size, chunk_hash in command.iter_chunks(offset):
+                if compression:
+                    sent_size += await self._write_compressed_chunk(
+                        command, source, (index, chunk_offset, size, chunk_hash), compression
+                    )
+                else:
+                    chunk_command = ChunkCommand(command.request_id, index, chunk_offset, size, chunk_hash)
+                    async with self.write_lock:
+                        await self._write_command(chunk_command)
+                        sent_size += await self._write_file(source, chunk_offset, size)
+                command.report_progress(chunk_offset + size)
+
+            end_command = TransferEndCommand(command.request_id, command.file_size, command.file_hash)
+            result = await self.request(end_command)
+            if result["status_message"] == "OK":
+                return result, sent_size
+            if "offset" not in result:
+                break
+            offset = int(result["offset"])
+
+        logger.error(f"ファイルの検証に失敗しました: {result}")
+        raise Exception(f"ファイルの検証に失敗しました: {result}")
+
+    async def _write_compressed_chunk(
+        self, command: TransferCommand, source: BinaryIO, chunk: tuple[int, int, int, str], compression: str
+    ) -> int:
+        """
+        チャンクを読み込んで圧縮し、送信する
+        読み込みと圧縮は別スレッドで行い、書き込みを占有するのは送信の間だけにする
+
+        Args:
+            chunk (tuple[int, int, int, str]): TransferCommand.iter_chunksが返すチャンクの情報
+
+        Returns:
+            int: 送信したバイト数(圧縮後)
+        """
+        loop = asyncio.get_running_loop()
+        level = command.compression_levels[compression]
+        index, offset, size, chunk_hash = chunk
+
+        def read_and_compress() -> bytes:
+            _seek(source, offset)
+            return compress_chunk(source.read(size), compression, level)
+
+        payload = await loop.run_in_executor(None, read_and_compress)
+        chunk_command = ChunkCommand(command.request_id, index, offset, size, chunk_hash)
+        chunk_command.compression = compression
+        chunk_command.compressed_size = len(payload)
+        async with self.write_lock:
+            await self._write_command(chunk_command)
+            self.writer.write(payload)
+            await self.writer.drain()
+        return len(payload)
+
+    async def _write_file(self, source: BinaryIO, offset: int = 0, count: int | None = None) -> int:
+        """
+        ファイルの内容をそのままソケットに書き込む
+        可能な場合はsendfileでカーネル内でコピーし、使えない場合(ZIPファイル内のエントリなど)は
+        大きめのバッファで読み込んで送信する
+
+        Args:
+            source (BinaryIO): 送信するファイル(TransferCommand.openで開いたもの)
+            offset (int, optional): 送信を開始する位置. Defaults to 0.
+            count (int | None, optional): 送信するバイト数(Noneの場合は末尾まで). Defaults to None.
+
+        Returns:
+            int: 送信したバイト数
+        """
+        loop = asyncio.get_running_loop()
+        if _has_fileno(source):
+            try:
+                sent_size = await loop.sendfile(self.writer.transport, source, offset, count, fallback=False)
+            except (asyncio.SendfileNotAvailableError, NotImplementedError) as e:
+                logger.debug(f"sendfileが使用できないため通常の送信を行います: {e}")
+            else:
+                return sent_size
+
+        await loop.run_in_executor(None, _seek, source, offset)
+        sent_size = 0
+        remaining = count
+        while remaining is None or remaining > 0:
+            size = SENDFILE_FALLBACK_BUFFER_SIZE if remaining is None else remaining
+            chunk = await loop.run_in_executor(None, source.read, min(size, SENDFILE_FALLBACK_BUFFER_SIZE))
+            if not chunk:
+                break
+            self.writer.write(chunk)
+            await self.writer.drain()
+            sent_size += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+        return sent_size
+
+    def _register(self, request_id: str) -> asyncio.Future:
+        if self.closed.is_set():
+            raise ConnectionError(f"クライアントとの接続が切断されています: {self.client_id}")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        return future
+
+    async def _wait_result(self, request_id: str, future: asyncio.Future) -> dict:
+        logger.debug(f"Waiting for result from {self.client_id} (request_id: {request_id})...")
+        try:
+            return await future
+        finally:
+            if self._pending.get(request_id) is future:
+                del self._pending[request_id]
+
+    async def _write_command(self, command: CommandBase) -> None:
+        full_message = command.get_command()
+        self.writer.write(full_message.encode("utf-8"))
+        await self.writer.drain()
+
+    async def _read_loop(self) -> None:
+        """
+        レスポンスを受信し続け、応答待ちのFutureに振り分ける
+        """
+        error: Exception = ConnectionError(f"クライアントとの接続が切断されました: {self.client_id}")
+        try:
+            while data := await self.reader.read(READ_BUFFER_SIZE):
+                self.last_seen = time.monotonic()
+                for response in self.response_reader.feed(data):
+                    self._dispatch(response)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"レスポンスの受信中にエラーが発生しました: {self.client_id}: {e}")
+            error = e
+        finally:
+            self.closed.set()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    def _dispatch(self, response: ResponseModel) -> None:
+        logger.debug(f"受信したレスポンス: ヘッダー={response.header}, ボディ={response.body}")
+        if response.framing_error:
+            # 受信データを読み取れなかったエラーは、どのコマンドの応答でもないため記録のみ行う
+            logger.error(f"レスポンスを読み取れませんでした: {self.client_id}: {response.body.get('error_message')}")
+            return
+        request_id = response.request_id
+        if request_id is not None:
+            self.sends_request_ids = True
+        elif not self.sends_request_ids and self._pending:
+            # リクエストIDを返さない古いクライアントの場合は最も古い応答待ちのコマンドに対応付ける
+            request_id = next(iter(self._pending))
+        if request_id not in self._pending:
+            # タイムアウトしたPingの遅れた応答などは、他のコマンドの応答として扱わずに破棄する
+            logger.warning(
+                f"対応するコマンドがないレスポンスを破棄しました: {response.header} (request_id: {request_id})"
+            )
+            return
+        future = self._pending.pop(request_id)
+        if not future.done():
+            future.set_result(response.body)
+
+    async def close(self, send_quit: bool = True) -> None:
+        """
+        クライアントとの接続を閉じる
+
+        Args:
+            send_quit (bool, optional): 終了メッセージを送信するかどうか. Defaults to True.
+        """
+        if send_quit and not self.closed.is_set():
+            try:
+                self.writer.write(b"quit\n")
+                await self.writer.drain()
+            except Exception as e:
+                logger.warning(f"クライアントに終了メッセージを送信中にエラーが発生しました: {e}")
+        self._read_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception as _:
+            pass
+
 
 class ServerManager:
     """
     Socketサーバーを管理するクラス
+
+    asyncioのイベントループを専用スレッドで動かし、複数のUnityクライアントを同時に扱う。
+    同期的なメソッド(send_commandなど)はFletのイベントハンドラなど別スレッドから呼び出せる。
     """
 
-    def __init__(self, host="0.0.0.0", port=8765):
+    def __init__(
+        self,
+        host="0.0.0.0",
+        port=8765,
+        ping_interval: float = DEFAULT_PING_INTERVAL,
+        ping_timeout: float = DEFAULT_PING_TIMEOUT,
+        command_timeout: float = DEFAULT_COMMAND_TIMEOUT,
+        transfer_timeout: float = DEFAULT_TRANSFER_TIMEOUT,
+    ):
         self.host = host
         self.port = port
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.command_timeout = command_timeout
+        self.transfer_timeout = transfer_timeout
         self.server_socket = None
-        self.client_socket = None
-        self.client_address = None
+        self.server: asyncio.Server | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
         self.thread = None
         self.running = False
-        self.is_connected = False
+        self.clients: dict[str, ClientConnection] = {}
+        self._stop_event: asyncio.Event | None = None
+
+    @property
+    def is_connected(self) -> bool:
+        """1台以上のクライアントが接続されているかどうか"""
+        return self.running and bool(self.clients)
 
     def start(self) -> None:
         """
@@ -32,7 +528,8 @@ class ServerManager:
             logger.info(f"Starting server: {self.host}:{self.port}")
             self.running = True
             self.server_socket = self._create_server_socket()
-            self.thread = threading.Thread(target=self.wait_for_connection, daemon=True)
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self._run_loop, daemon=True)
             self.thread.start()
         except OSError as e:
             logger.error(f"サーバを起動させるポートがすでに使用されています: {e}")
@@ -48,156 +545,268 @@ class ServerManager:
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_socket.bind((self.host, self.port))
-        server_socket.listen(1)
-        server_socket.settimeout(1)
+        server_socket.listen()
+        server_socket.setblocking(False)
         return server_socket
 
-    def wait_for_connection(self) -> None:
+    def _run_loop(self) -> None:
         """
-        クライアントの接続を待機
+        イベントループを実行するスレッドの処理
         """
+        asyncio.set_event_loop(self.loop)
         try:
-            logger.info("クライアントの接続を待機中...")
-            while self.running:
-                # time.sleep(0.1)
-                if self.server_socket is None:
-                    break
-                try:
-                    self.client_socket, self.client_address = self.server_socket.accept()
-                    logger.info(f"クライアントが接続しました: {self.client_address}")
-                    self.handle_client(self.client_socket)
-                except TimeoutError:
-                    continue
-        except OSError as e:
-            if self.running:
-                logger.error(f"サーバーでエラーが発生しました {e} (type: {type(e)})")
+            self.loop.run_until_complete(self._serve())
         except BaseException as e:
             logger.error(f"サーバーでエラーが発生しました {e} (type: {type(e)})")
         finally:
-            self.stop()
+            self.running = False
+            self.loop.close()
+
+    async def _serve(self) -> None:
+        """
+        クライアントの接続を待機
+        """
+        self._stop_event = asyncio.Event()
+        self.server = await asyncio.start_server(self._handle_client, sock=self.server_socket)
+        logger.info("クライアントの接続を待機中...")
+        await self._stop_event.wait()
+
+        connections = list(self.clients.values())
+        for connection in connections:
+            await connection.close()
+            if connection.task:
+                connection.task.cancel()
+        await asyncio.gather(*(c.task for c in connections if c.task), return_exceptions=True)
+        self.clients.clear()
+        self.server.close()
 
     def stop(self) -> None:
         """
         サーバーを停止
         """
         self.running = False
-        self.is_connected = False
-        if self.client_socket:
-            try:
-                self.client_socket.sendall(b"quit\n".encode("utf-8"))
-            except Exception as e:
-                logger.warning(f"クライアントに終了メッセージを送信中にエラーが発生しました: {e}")
-            finally:
-                self.client_socket.close()
-        if self.server_socket:
+        if self.loop and self.loop.is_running() and self._stop_event:
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+        elif self.server_socket:
             self.server_socket.close()
-        if self.thread and self.thread.is_alive():
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
             try:
-                # if self.thread != threading.current_thread():
                 self.thread.join(timeout=3)
             except RuntimeError as _:
                 pass
 
-    def _wait_for_result(self) -> dict:
-        logger.debug("Waiting for result...")
-
-        data = self.client_socket.recv(1024).decode("utf-8")
-        response = data.split("\n")
-        header = response[0]
-        body = response[1]
-        # ボディの文字列を辞書型に変換
-        try:
-            body_dict = json.loads(body)
-        except json.JSONDecodeError as e:
-            logger.error(f"ボディの文字列を辞書型に変換中にエラーが発生しました: {e}")
-            body_dict = {"status_message": "ERROR", "error_message": str(e)}
-
-        logger.debug(f"受信したレスポンス: ヘッダー={header}, ボディ={body_dict}")
-        return body_dict
+    async def _check_connection(self, connection: ClientConnection) -> bool:
+        """
+        クライアントの死活を確認する
+        直近ping_interval秒以内に受信がある場合はPingを送信せずに生存しているとみなす
 
-    def _check_connection(self) -> bool:
+        Returns:
+            bool: 接続を維持するかどうか(連続してMAX_MISSED_PINGS回失敗した場合はFalse)
+        """
+        if connection.missed_pings == 0 and time.monotonic() - connection.last_seen < self.ping_interval:
+            return True
         try:
-            command = PingCommand()
-            result = self.send_command(command)
-            if result["status_message"] == "OK":
-                return True
-            else:
-                logger.warning(f"接続確認に失敗しました: {result}")
-                return False
+            await connection.ping(self.ping_timeout)
         except Exception as e:
             logger.error(f"接続確認中にエラーが発生しました: {e}")
             return False
+        return connection.missed_pings < MAX_MISSED_PINGS
 
-    def handle_client(self, client_socket: socket.socket) -> None:
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
         """
-        クライアントとの通信を処理するスレッドを管理
+        クライアントとの通信を処理するタスク
 
         Args:
-            client_socket (socket.socket): クライアントとの通信用ソケット
+            reader (asyncio.StreamReader): クライアントからの受信用ストリーム
+            writer (asyncio.StreamWriter): クライアントへの送信用ストリーム
         """
-        self.is_connected = True
         try:
-            while self.is_connected:
-                if not self._check_connection():
+            _enable_keepalive(writer.get_extra_info("socket"))
+        except OSError as e:
+            logger.warning(f"TCPキープアライブを設定できませんでした: {e}")
+        connection = ClientConnection(reader, writer)
+        connection.task = asyncio.current_task()
+        self.clients[connection.client_id] = connection
+        logger.info(f"クライアントが接続しました: {connection.client_id} (接続数: {len(self.clients)})")
+        try:
+            while self.running:
+                if not await self._check_connection(connection):
+                    break
+                try:
+                    # 切断された場合は次のPingを待たずに終了する
+                    # 応答がない間は間隔を短くして確認する
+                    interval = self.ping_interval if connection.missed_pings == 0 else self.ping_timeout
+                    await asyncio.wait_for(connection.closed.wait(), timeout=interval)
                     break
-                time.sleep(60)
+                except TimeoutError:
+                    continue
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
             logger.error(f"クライアント処理中にエラーが発生しました: {e}")
         finally:
-            client_socket.close()
-            self.is_connected = False
-            logger.info("クライアントとの接続を終了しました")
+            if self.clients.get(connection.client_id) is connection:
+                del self.clients[connection.client_id]
+                await connection.close(send_quit=False)
+            logger.info(f"クライアントとの接続を終了しました: {connection.client_id}")
 
-    def _send_command(self, command: CommandBase) -> dict:
-        if self.client_socket:
-            try:
-                full_message = command.get_command()
-                self.client_socket.sendall(full_message.encode("utf-8"))
+    def connection_state(self) -> dict:
+        """
+        サーバーと各クライアントの接続状態を取得
+        クライアントとの通信は行わず、死活監視で記録した値を返すため頻繁に呼び出してもよい
 
-                result = self._wait_for_result()
-                return result
-            except Exception as e:
-                logger.error(f"コマンド送信中にエラーが発生しました: {e}")
-                raise e
-        else:
+        Returns:
+            dict: {"running": bool, "connected": bool, "clients": [ClientConnection.get_stateの結果]}
+        """
+        clients = [connection.get_state() for connection in list(self.clients.values())]
+        return {
+            "running": self.running,
+            "connected": self.running and any(c["state"] != "disconnected" for c in clients),
+            "clients": clients,
+        }
+
+    def get_clients(self, group: str | None = None) -> list[str]:
+        """
+        接続中のクライアントIDの一覧を取得
+
+        Args:
+            group (str | None, optional): 指定した場合はそのグループに属するクライアントのみ. Defaults to None.
+        """
+        return [c.client_id for c in self.clients.values() if group is None or group in c.groups]
+
+    def assign_group(self, client_id: str, group: str) -> None:
+        """
+        クライアントをグループに追加
+
+        Args:
+            client_id (str): クライアントID
+            group (str): グループ名
+        """
+        if client_id not in self.clients:
+            raise KeyError(f"クライアントが見つかりません: {client_id}")
+        self.clients[client_id].groups.add(group)
+
+    def remove_group(self, client_id: str, group: str) -> None:
+        """
+        クライアントをグループから外す
+
+        Args:
+            client_id (str): クライアントID
+            group (str): グループ名
+        """
+        if client_id in self.clients:
+            self.clients[client_id].groups.discard(group)
+
+    def _resolve_targets(self, client_id: str | None = None, group: str | None = None) -> list[ClientConnection]:
+        if client_id is not None:
+            connection = self.clients.get(client_id)
+            return [connection] if connection else []
+        return [c for c in self.clients.values() if group is None or group in c.groups]
+
+    def _submit(self, coro) -> concurrent.futures.Future:
+        """
+        コルーチンをイベントループのスレッドで実行するようにスケジュールする
+        """
+        if not (self.loop and self.loop.is_running()):
+            coro.close()
+            logger.warning("クライアントが接続されていません")
+            future = concurrent.futures.Future()
+            future.set_result({"status_message": "ERROR", "error_message": "クライアントが接続されていません"})
+            return future
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def _send_to_targets(self, command: CommandBase, client_id: str | None, group: str | None) -> dict:
+        targets = self._resolve_targets(client_id, group)
+        if not targets:
             logger.warning("クライアントが接続されていません")
             return {"status_message": "ERROR", "error_message": "クライアントが接続されていません"}
 
-    def send_command(self, command: CommandBase) -> dict:
+        if isinstance(command, TransferCommand):
+            coros = [connection.send_file(command) for connection in targets]
+        else:
+            coros = [connection.request(command) for connection in targets]
+        results = await asyncio.gather(*coros, return_exceptions=True)
+
+        if len(targets) == 1:
+            if isinstance(results[0], BaseException):
+                logger.error(f"コマンド送信中にエラーが発生しました: {results[0]}")
+                raise results[0]
+            return results[0]
+
+        results_by_client = {}
+        for connection, result in zip(targets, results, strict=True):
+            if isinstance(result, BaseException):
+                logger.error(f"コマンド送信中にエラーが発生しました: {connection.client_id}: {result}")
+                results_by_client[connection.client_id] = {"status_message": "ERROR", "error_message": str(result)}
+            else:
+                results_by_client[connection.client_id] = result
+        return self._merge_results(results_by_client)
+
+    @staticmethod
+    def _merge_results(results: dict[str, dict]) -> dict:
         """
-        クライアントにコマンドを送信
+        複数クライアントの結果を1つにまとめる
+        最初のクライアントの結果を代表値とし、全クライアントの結果は"results"に格納する
+        """
+        merged = dict(next(iter(results.values())))
+        is_all_ok = all(result.get("status_message") == "OK" for result in results.values())
+        merged["status_message"] = "OK" if is_all_ok else "ERROR"
+        merged["results"] = results
+        return merged
+
+    def submit_command(
+        self, command: CommandBase, client_id: str | None = None, group: str | None = None
+    ) -> concurrent.futures.Future:
+        """
+        クライアントにコマンドを送信し、結果を待たずにFutureを返す
+        複数のコマンドを同時に送信したい場合に使用する
 
         Args:
             command (CommandBase): 送信するコマンドのインスタンス
+            client_id (str | None, optional): 送信先のクライアントID. Defaults to None.
+            group (str | None, optional): 送信先のグループ名. Defaults to None.
+
+        Returns:
+            concurrent.futures.Future: send_commandと同じ形式の結果を持つFuture
         """
-        if isinstance(command, TransferCommand):
-            return self.send_file(command)
+        return self._submit(self._send_to_targets(command, client_id, group))
+
+    def send_command(self, command: CommandBase, client_id: str | None = None, group: str | None = None) -> dict:
+        """
+        クライアントにコマンドを送信
+        client_idとgroupのどちらも指定しない場合は接続中の全クライアントに送信する
 
-        return self._send_command(command)
+        Args:
+            command (CommandBase): 送信するコマンドのインスタンス
+            client_id (str | None, optional): 送信先のクライアントID. Defaults to None.
+            group (str | None, optional): 送信先のグループ名. Defaults to None.
+        """
+        return self._get_result(self.submit_command(command, client_id, group), self.command_timeout)
 
-    def send_file(self, command: TransferCommand) -> dict:
+    def send_file(self, command: TransferCommand, client_id: str | None = None, group: str | None = None) -> dict:
         """
         クライアントにファイルを送信
 
         Args:
-            file_path (str): 送信するファイルのパス
+            command (TransferCommand): 送信するファイルのコマンド
+            client_id (str | None, optional): 送信先のクライアントID. Defaults to None.
+            group (str | None, optional): 送信先のグループ名. Defaults to None.
 
         Raises:
             FileNotFoundError: ファイルが見つからない場合
             e: その他のエラー
         """
-        result = self._send_command(command)
-
-        if result["status_message"] != "OK":
-            logger.error(f"ファイル情報の送信に失敗しました: {result}")
-            raise Exception(f"ファイル情報の送信に失敗しました: {result}")
+        return self._get_result(self.submit_command(command, client_id, group), self.transfer_timeout)
 
-        with open(command.file_path, "rb") as f:
-            while chunk := f.read(1024):
-                self.client_socket.sendall(chunk)
-
-        logger.debug(f"ファイルを送信しました: {command.file_path}")
-
-        result = self._wait_for_result()
-        logger.info(f"ファイルの送信結果: {result}")
-        return result
+    @staticmethod
+    def _get_result(future: concurrent.futures.Future, timeout: float) -> dict:
+        """
+        イベントループのスレッドで実行中のコマンドの結果を待つ
+        timeout秒以内に応答がない場合はコマンドをキャンセルし(応答待ちの登録も解除される)、エラーの結果を返す
+        """
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            logger.error(f"コマンドの応答が{timeout}秒以内に返りませんでした")
+            return {"status_message": "ERROR", "error_message": f"応答がタイムアウトしました({timeout}秒)"}
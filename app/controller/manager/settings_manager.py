@@ -114,6 +114,18 @@ class SettingsManager:
             return DEFAULT_SETTINGS
 
 
+def get_settings_fingerprint() -> tuple[int, int] | None:
+    """
+    設定ファイルの更新日時とサイズを取得する。
+    設定ファイルを読み込まずに変更を検知するために使用する。
+    """
+    try:
+        stat = os.stat(SettingsManager.SETTINGS_FILE)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def load_settings(key) -> dict:
     """
     指定されたキーの設定をファイルからロードして辞書型で返す。
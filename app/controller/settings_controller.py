@@ -1,6 +1,8 @@
 import logging
+import threading
 
 from flet import (
+    Colors,
     Column,
     Divider,
     ElevatedButton,
@@ -8,10 +10,13 @@ from flet import (
     Text,
 )
 
+from app.ai import local_embeddings
+from app.ai.reindex import ReindexStats, reindex_documents
 from app.controller.core import AbstractController
 from app.controller.manager.auth_manager import AuthManager
 from app.controller.manager.settings_manager import SettingsManager
-from app.models.settings_models import LlmProvider
+from app.models.database_models import DatabaseHandler
+from app.models.settings_models import EmbeddingProvider, LlmProvider
 from app.views.core import BannerView, create_dropdown, create_switch, create_text_field
 from app.views.settings_view import (
     BaseSettingsView,
@@ -46,6 +51,32 @@ class SettingsController(AbstractController):
             logger.error(f"Error saving settings: {e}")
             self.banner.show_banner("error", "Error saving settings.")
 
+    def _start_reindex(self, event):
+        """
+        ドキュメントのインデックスの再作成をバックグラウンドで開始する
+        """
+        self.reindex_button.disabled = True
+        self.reindex_status.value = "Reindexing..."
+        self.page.update()
+        threading.Thread(target=self._run_reindex, name="reindex", daemon=True).start()
+
+    def _run_reindex(self):
+        db_handler = DatabaseHandler(self.manager)
+        try:
+            stats = reindex_documents(db_handler, on_progress=self._on_reindex_progress)
+            self.banner.show_banner("success", f"Reindexed {stats.docs} documents in {stats.elapsed:.1f} s.")
+        except Exception as e:
+            logger.error(f"Error reindexing documents: {e}")
+            self.banner.show_banner("error", "Error reindexing documents.")
+        finally:
+            db_handler.close_connection()
+            self.reindex_button.disabled = False
+            self.page.update()
+
+    def _on_reindex_progress(self, stats: ReindexStats):
+        self.reindex_status.value = str(stats)
+        self.page.update()
+
     def _toggle_visibility(self, visible_body: Column):
         def update_ui(event):
             visible_body.visible = event.control.value
@@ -107,6 +138,21 @@ class SettingsController(AbstractController):
                     value=self.manager.get_setting(f"{nested_key}.postgres_settings.database"),
                     on_change=self._change_settings_value(f"{nested_key}.postgres_settings.database"),
                 ),
+                create_text_field(
+                    label="Pool Min Size",
+                    value=self.manager.get_setting(f"{nested_key}.postgres_settings.pool_min_size"),
+                    on_change=self._change_settings_value(f"{nested_key}.postgres_settings.pool_min_size"),
+                ),
+                create_text_field(
+                    label="Pool Max Size",
+                    value=self.manager.get_setting(f"{nested_key}.postgres_settings.pool_max_size"),
+                    on_change=self._change_settings_value(f"{nested_key}.postgres_settings.pool_max_size"),
+                ),
+                create_text_field(
+                    label="Pool Timeout (sec)",
+                    value=self.manager.get_setting(f"{nested_key}.postgres_settings.pool_timeout"),
+                    on_change=self._change_settings_value(f"{nested_key}.postgres_settings.pool_timeout"),
+                ),
             ],
         )
         return BaseSettingsView(
@@ -180,6 +226,46 @@ class SettingsController(AbstractController):
             body = [Text("Unknown provider selected.")]
         return visible_body_column(True, body)
 
+    def _get_local_embedding_body(self) -> list:
+        nested_key = "llm_settings.local_embedding_settings"
+        # ライブラリがない場合は保存しても埋め込みを計算できないため、インストール方法を表示する
+        notice = []
+        if not local_embeddings.is_available():
+            notice.append(
+                Text(
+                    "sentence-transformers is not installed. Install it with "
+                    "`poetry install --extras local-embeddings` or `pip install sentence-transformers`.",
+                    color=Colors.RED,
+                )
+            )
+        return [
+            *notice,
+            create_text_field(
+                label="Local Embedding Model",
+                value=self.manager.get_setting(f"{nested_key}.model_name"),
+                on_change=self._change_settings_value(f"{nested_key}.model_name"),
+            ),
+            create_text_field(
+                label="Device",
+                value=self.manager.get_setting(f"{nested_key}.device"),
+                on_change=self._change_settings_value(f"{nested_key}.device"),
+            ),
+            create_text_field(
+                label="Local Batch Size",
+                value=self.manager.get_setting(f"{nested_key}.batch_size"),
+                on_change=self._change_settings_value(f"{nested_key}.batch_size"),
+            ),
+            create_text_field(
+                label="Local Workers",
+                value=self.manager.get_setting(f"{nested_key}.max_workers"),
+                on_change=self._change_settings_value(f"{nested_key}.max_workers"),
+            ),
+        ]
+
+    def _update_embedding_provider_body(self, event):
+        self.local_embedding_body.visible = event.control.value == EmbeddingProvider.LOCAL.value
+        self.page.update()
+
     def _update_provider_body(self, event):
         provider = event.control.value
         self.llm_provider_body.controls = self._get_provider_body(provider).controls
@@ -188,6 +274,11 @@ class SettingsController(AbstractController):
     def _create_llm_tab(self) -> BaseSettingsView:
         nested_key = "llm_settings"
         self.llm_provider_body = self._get_provider_body(self.manager.get_setting(f"{nested_key}.llm_provider"))
+        embedding_provider = self.manager.get_setting(f"{nested_key}.embedding_provider")
+        self.local_embedding_body = visible_body_column(
+            embedding_provider in (EmbeddingProvider.LOCAL, EmbeddingProvider.LOCAL.value),
+            self._get_local_embedding_body(),
+        )
         self.langsmith_body = visible_body_column(
             self.manager.get_setting(f"{nested_key}.use_langsmith"),
             [
@@ -205,6 +296,8 @@ class SettingsController(AbstractController):
                 ),
             ],
         )
+        self.reindex_button = ElevatedButton(text="インデックスを再作成する", on_click=self._start_reindex)
+        self.reindex_status = Text("")
         return BaseSettingsView(
             title="LLM Provider",
             body_content=[
@@ -215,6 +308,20 @@ class SettingsController(AbstractController):
                     on_change=self._change_settings_value(f"{nested_key}.llm_provider", self._update_provider_body),
                 ),
                 self.llm_provider_body,
+                create_dropdown(
+                    label="Embedding Provider",
+                    value=embedding_provider,
+                    items=[provider.value for provider in EmbeddingProvider],
+                    on_change=self._change_settings_value(
+                        f"{nested_key}.embedding_provider", self._update_embedding_provider_body
+                    ),
+                ),
+                self.local_embedding_body,
+                create_text_field(
+                    label="Embedding Batch Size",
+                    value=self.manager.get_setting(f"{nested_key}.embedding_batch_size"),
+                    on_change=self._change_settings_value(f"{nested_key}.embedding_batch_size"),
+                ),
                 Divider(),
                 create_switch(
                     label="Use Langsmith",
@@ -224,6 +331,9 @@ class SettingsController(AbstractController):
                     ),
                 ),
                 self.langsmith_body,
+                Divider(),
+                self.reindex_button,
+                self.reindex_status,
             ],
         )
 
@@ -1,5 +1,7 @@
 import logging
 import os
+import threading
+import time
 
 from flet import (
     Colors,
@@ -34,6 +36,9 @@ from app.views.unity_view import (
 
 logger = logging.getLogger(__name__)
 
+# ディスプレイアプリへの送信の進捗を画面に反映する最小の間隔(秒)
+TRANSFER_PROGRESS_INTERVAL = 0.25
+
 
 class OldUnityController(AbstractController):
     def __init__(
@@ -173,6 +178,11 @@ class UnityController(AbstractController):
         self.obj_database_manager = obj_database_manager
         self.obj_manager = obj_manager
         self.auth_manager = auth_manager
+        # 送信の進捗は送信中のスレッドから通知されるため、ロックで保護する
+        self._transfer_lock = threading.Lock()
+        self._transferring = False
+        self._last_transfer_progress: tuple[int, int] | None = None
+        self._last_transfer_update = 0.0
         self._initialize_model_upload_view()
 
     def _initialize_model_upload_view(self):
@@ -261,16 +271,56 @@ class UnityController(AbstractController):
         """アップロード進捗"""
         logger.debug(f"Uploading: {e.progress}")
 
+    def _on_transfer_progress(self, progress: dict):
+        """
+        ディスプレイアプリへの送信の進捗を表示
+        ServerManagerのイベントループや送信用のスレッドから呼び出されるため、表示の更新はFletのスレッドで行う
+        """
+        percent = progress["bundle_sent"] * 100 // max(progress["bundle_size"], 1)
+        now = time.monotonic()
+        with self._transfer_lock:
+            # 表示の更新はファイルの送信が完了したとき、またはパーセントが変わって一定の間隔が経ったときだけ行う
+            last = self._last_transfer_progress
+            if last is not None and last[1] == progress["files_done"]:
+                if last[0] == percent or now - self._last_transfer_update < TRANSFER_PROGRESS_INTERVAL:
+                    return
+            self._last_transfer_progress = (percent, progress["files_done"])
+            self._last_transfer_update = now
+        self.page.run_thread(
+            self._show_transfer_progress,
+            f"ディスプレイアプリに送信中: {progress['file_name']} "
+            f"({progress['files_done']}/{progress['files_total']}ファイル, 全体 {percent}%)",
+        )
+
+    def _show_transfer_progress(self, message: str):
+        """送信の進捗を表示に反映する(Fletのスレッドで実行する)"""
+        with self._transfer_lock:
+            # 送信の完了後に遅れて届いた進捗で、完了のメッセージを上書きしない
+            if not self._transferring:
+                return
+            self.model_upload_view.add_model_file_name.value = message
+        self.page.update()
+
     def _on_upload_complete(self, e):
         """アップロード完了"""
-        success, result = self.file_manager.send_file_to_unity(e.file_name)
+        with self._transfer_lock:
+            self._transferring = True
+            self._last_transfer_progress = None
+        try:
+            success, result = self.file_manager.send_file_to_unity(e.file_name, self._on_transfer_progress)
+        finally:
+            with self._transfer_lock:
+                self._transferring = False
         if success:
             if self.model_upload_view.add_model_name.value:
                 new_name = self.model_upload_view.add_model_name.value
-                self.obj_database_manager.new_object(new_name)
             else:
                 new_name = os.path.splitext(e.file_name)[0]
-                self.obj_database_manager.new_object(new_name)
+            if result.get("object_id") is not None:
+                # 同じファイルが以前にアップロードされている場合は既存のオブジェクトを再利用する
+                self.obj_database_manager.restore_object(result["object_id"], new_name)
+            else:
+                self.obj_database_manager.new_object(new_name, result.get("content_hash"))
             self.model_upload_view.add_model_file_name.value = "モデルのアップロードが完了しました"
             self.page.pubsub.send_all("current_obj_name")
         else:
@@ -323,12 +373,23 @@ class UnityController(AbstractController):
 
     def get_unity_status(self):
         """Unityの接続状況を取得"""
-        logger.debug(f"Unity status: {self.server.is_connected}")
-        if self.server.is_connected:
-            return "ディスプレイアプリ 接続状況: ✅ 接続中", Colors.GREEN_700
-        else:
+        # 死活監視で記録した状態を参照するため、ディスプレイアプリとの通信は発生しない
+        state = self.server.connection_state()
+        logger.debug(f"Unity status: {state}")
+        if not state["connected"]:
             return "ディスプレイアプリ 接続状況: ❌ 未接続", Colors.RED_700
 
+        clients = [c for c in state["clients"] if c["state"] != "disconnected"]
+        rtts = [c["rtt_avg_ms"] for c in clients if c["rtt_avg_ms"] is not None]
+        rtt = f", 応答 {max(rtts):.0f}ms" if rtts else ""
+        unresponsive = sum(c["state"] == "unresponsive" for c in clients)
+        if unresponsive:
+            return (
+                f"ディスプレイアプリ 接続状況: ⚠️ 応答なし {unresponsive}台 / 接続中 {len(clients)}台{rtt}",
+                Colors.ORANGE_700,
+            )
+        return f"ディスプレイアプリ 接続状況: ✅ 接続中 ({len(clients)}台{rtt})", Colors.GREEN_700
+
     def refresh_unity_status(self):
         value, color = self.get_unity_status()
         self.view.unity_status.value = value
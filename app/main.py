@@ -11,6 +11,7 @@ from flet import (
     app,
 )
 
+from app.ai.index_worker import IndexWorker
 from app.controller import (
     AuthManager,
     DocumentsManager,
@@ -20,16 +21,29 @@ from app.controller import (
     ServerManager,
     SettingsManager,
 )
+from app.controller.manager.agent_manager import agent_runtime
 from app.logging_config import setup_logging
 from app.models.database_models import DatabaseHandler
 from app.service_container import Container
 from app.views.views import MyView
 
 server = ServerManager()
+index_worker = IndexWorker()
 
 
 def server_clean_up():
     server.stop()
+    index_worker.stop()
+    agent_runtime.close()
+
+
+def update_database_schema():
+    """初期化SQLより前に作成されたデータベースに、追加されたカラムとインデックスを作成する"""
+    db_handler = DatabaseHandler(SettingsManager())
+    try:
+        ObjectDatabaseManager(db_handler).create_schema()
+    finally:
+        db_handler.close_connection()
 
 
 def initialize_services(page: Page) -> Container:
@@ -52,6 +66,7 @@ def initialize_services(page: Page) -> Container:
     container.register("obj_manager", obj_manager)
     container.register("docs_manager", docs_manager)
     container.register("socket_server", server)
+    container.register("index_worker", index_worker)
     container.register("file_manager", file_manager)
     container.register("auth_manager", auth_manager)
 
@@ -111,7 +126,11 @@ if not os.environ.get("FLET_SECRET_KEY"):
     os.environ["FLET_SECRET_KEY"] = "secret"
 
 try:
+    update_database_schema()
     server.start()  # ServerManagerがスレッドを内部で管理
+    index_worker.start()  # ドキュメントのインデックス作成をバックグラウンドで行う
+    agent_runtime.bind_display_tools(server)  # 表示操作のツールは全てのチャットで共有する
+    agent_runtime.warm_up(SettingsManager())  # チャットページを開く前にエージェントを作成しておく
     atexit.register(server_clean_up)
     app(target=main, port=8000, assets_dir="assets", upload_dir="storage/temp/uploads")
 except KeyboardInterrupt:
@@ -126,4 +145,5 @@ finally:
     # container.get("db_handler").close_connection()
     server.stop()
     server.thread.join(timeout=3)
+    index_worker.stop()
     logging.shutdown()
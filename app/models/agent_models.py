@@ -3,3 +3,5 @@ from langgraph.graph import MessagesState
 
 class State(MessagesState):
     next: str
+    # 同時に実行している部署の名前(全ての部署が回答した後にまとめの部署に進む)
+    parallel_agents: list[str]
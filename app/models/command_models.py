@@ -1,9 +1,66 @@
+import hashlib
 import json
 import logging
 import os
+import zipfile
+import zlib
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import BinaryIO
+from uuid import uuid4
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+# ファイル転送時のチャンクサイズとハッシュアルゴリズム
+TRANSFER_CHUNK_SIZE = 4 * 1024 * 1024
+TRANSFER_HASH_ALGORITHM = "sha256"
+
+# 拡張子ごとの圧縮方式と圧縮レベル(優先度順)
+# テキスト形式のモデルは高圧縮、サイズの大きいPLYは速度を優先する
+# 画像など既に圧縮されている形式は圧縮しない
+COMPRESSION_LEVELS = {
+    ".obj": {"zstd": 9, "zlib": 6},
+    ".mtl": {"zstd": 9, "zlib": 6},
+    ".ply": {"zstd": 3, "zlib": 1},
+    ".txt": {"zstd": 9, "zlib": 6},
+}
+
+
+def get_compression_levels(file_name: str) -> dict[str, int]:
+    """
+    ファイルの拡張子に応じて使用できる圧縮方式と圧縮レベルを返す
+
+    Args:
+        file_name (str): ファイル名
+
+    Returns:
+        dict[str, int]: {圧縮方式: 圧縮レベル} (優先度順、圧縮しない場合は空)
+    """
+    levels = COMPRESSION_LEVELS.get(os.path.splitext(file_name)[1].lower(), {})
+    return {name: level for name, level in levels.items() if name != "zstd" or zstandard is not None}
+
+
+def compress_chunk(data: bytes, compression: str, level: int) -> bytes:
+    """
+    チャンクを圧縮する
+    チャンクごとに独立して圧縮するため、どのチャンクからでも再開できる
+
+    Args:
+        data (bytes): 圧縮するデータ
+        compression (str): 圧縮方式("zstd"または"zlib")
+        level (int): 圧縮レベル
+    """
+    if compression == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if compression == "zlib":
+        return zlib.compress(data, level)
+    raise ValueError(f"対応していない圧縮方式です: {compression}")
+
 
 class CommandBase:
     """
@@ -14,6 +71,7 @@ class CommandBase:
         self._command_name = command_name
         self._body_size = body_size
         self._command_body = command_body
+        self.request_id = uuid4().hex
 
     def __str__(self):
         try:
@@ -30,6 +88,8 @@ class CommandBase:
 
     def get_command(self):
         self.convert_body()
+        # レスポンスと対応付けるためにリクエストIDをボディに含める
+        self.command_body = {**self.command_body, "request_id": self.request_id}
         return f"{self.command_header}\n{self.get_body_to_str()}"
 
     @property
@@ -154,13 +214,61 @@ class ControlCommand(CommandBase):
 class TransferCommand(CommandBase):
     """
     ファイル転送コマンドを管理するクラス
+
+    チャンク転送に対応したクライアントとは以下の手順でファイルを転送する。
+    1. TRANSFER: ファイル名、サイズ、ファイル全体のハッシュ、チャンクサイズを送信する
+       クライアントは"chunked": trueと、受信済みのバイト数"offset"を返す(新規の場合は0)
+    2. CHUNK: offsetから順にチャンクの情報(ChunkCommand)とチャンク本体を送信する
+    3. TRANSFER_END: ファイル全体のハッシュを送信し、クライアントが検証結果を返す
+       検証に失敗した場合、クライアントは再送を開始する"offset"を返す
+    "chunked"を返さない古いクライアントにはTRANSFERの応答後にファイル本体をそのまま送信する。
+    クライアントがfile_hashと同じ内容のファイルを既に保持している場合は"cached": trueを返す。
+    この場合はファイル本体を送信せず、クライアントは保持しているファイルをfile_nameで参照できるようにする。
+
+    圧縮できる形式のファイルの場合はTRANSFERで対応している圧縮方式の一覧"compression"を送信する。
+    クライアントが"compression"で圧縮方式を1つ選んで返した場合、各チャンクを圧縮して送信する。
+
+    from_zip_entryで作成した場合はZIPファイル内のエントリを展開せずに直接読み込んで送信する。
     """
 
-    def __init__(self, file_path: str | None = None):
+    def __init__(self, file_path: str | None = None, chunk_size: int = TRANSFER_CHUNK_SIZE, compression: bool = True):
         super().__init__(
             command_name="TRANSFER",
         )
         self._file_path = file_path
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self._file_hash: str | None = None
+        self._chunk_hashes: list[str] | None = None
+        # ZIPファイル内のエントリを送信する場合のエントリ名と送信時のファイル名
+        self.zip_entry: str | None = None
+        self._file_name: str | None = None
+        # 送信の進捗を受け取るコールバック(送信済みのバイト数(圧縮前)を渡す)
+        # サーバーのイベントループのスレッドから呼ばれるため、重い処理は行わないこと
+        self.on_progress: Callable[[int], None] | None = None
+
+    @classmethod
+    def from_zip_entry(cls, zip_path: str, entry: str, file_name: str | None = None, **kwargs) -> "TransferCommand":
+        """
+        ZIPファイル内のエントリを送信するコマンドを作成する
+        エントリは一時ファイルに展開せず、送信時にZIPファイルから直接読み込む
+
+        Args:
+            zip_path (str): ZIPファイルのパス
+            entry (str): 送信するエントリ名
+            file_name (str | None, optional): 送信時のファイル名(Noneの場合はエントリのファイル名). Defaults to None.
+
+        Returns:
+            TransferCommand: ファイル転送コマンド
+        """
+        command = cls(zip_path, **kwargs)
+        command.zip_entry = entry
+        command._file_name = file_name
+        return command
+
+    @property
+    def is_zip_entry(self) -> bool:
+        return self.zip_entry is not None
 
     @property
     def file_path(self) -> str:
@@ -175,15 +283,108 @@ class TransferCommand(CommandBase):
         if not os.path.exists(value):
             raise FileNotFoundError(f"ファイルが見つかりません: {value}")
         self._file_path = value
+        self._file_hash = None
+        self._chunk_hashes = None
 
     @property
     def file_name(self) -> str:
-        return os.path.basename(self.file_path)
+        if self._file_name is not None:
+            return self._file_name
+        return os.path.basename(self.zip_entry or self.file_path)
 
     @property
     def file_size(self) -> int:
+        if self.is_zip_entry:
+            with zipfile.ZipFile(self.file_path, "r") as zip_ref:
+                return zip_ref.getinfo(self.zip_entry).file_size
         return os.path.getsize(self.file_path)
 
+    @contextmanager
+    def open(self) -> Iterator[BinaryIO]:
+        """
+        送信するファイルをバイナリモードで開く
+        ZIPファイル内のエントリの場合は展開しながら読み込むストリームを返す
+        (先頭以外へのシークは先頭から読み直しになるため、順番に読み込むこと)
+        """
+        if not self.is_zip_entry:
+            with open(self.file_path, "rb") as f:
+                yield f
+            return
+        with zipfile.ZipFile(self.file_path, "r") as zip_ref, zip_ref.open(self.zip_entry) as f:
+            yield f
+
+    @property
+    def file_hash(self) -> str:
+        if self._file_hash is None:
+            self.compute_checksums()
+        return self._file_hash
+
+    @property
+    def compression_levels(self) -> dict[str, int]:
+        """このファイルで提案する圧縮方式と圧縮レベル"""
+        if not self.compression:
+            return {}
+        return get_compression_levels(self.file_name)
+
+    @property
+    def has_checksums(self) -> bool:
+        return self._chunk_hashes is not None
+
+    @property
+    def chunk_hashes(self) -> list[str]:
+        if self._chunk_hashes is None:
+            self.compute_checksums()
+        return self._chunk_hashes
+
+    def compute_checksums(self) -> str:
+        """
+        ファイル全体とチャンクごとのハッシュを計算する
+        ファイルを1回だけ読み込んで両方を計算する
+
+        Returns:
+            str: ファイル全体のハッシュ
+        """
+        file_hasher = hashlib.new(TRANSFER_HASH_ALGORITHM)
+        chunk_hashes = []
+        with self.open() as f:
+            while chunk := f.read(self.chunk_size):
+                file_hasher.update(chunk)
+                chunk_hashes.append(hashlib.new(TRANSFER_HASH_ALGORITHM, chunk).hexdigest())
+        self._file_hash = file_hasher.hexdigest()
+        self._chunk_hashes = chunk_hashes
+        return self._file_hash
+
+    def report_progress(self, sent_size: int):
+        """
+        送信の進捗をコールバックに通知する
+        コールバックで発生したエラーは送信に影響させない
+
+        Args:
+            sent_size (int): ファイルの先頭から送信済みのバイト数(圧縮前)
+        """
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(sent_size)
+        except Exception as e:
+            logger.warning(f"進捗の通知中にエラーが発生しました: {e}")
+
+    def iter_chunks(self, offset: int = 0):
+        """
+        指定した位置以降のチャンクの情報を返す
+        offsetがチャンクの途中の場合はそのチャンクの先頭から返す
+
+        Args:
+            offset (int, optional): 再開する位置. Defaults to 0.
+
+        Yields:
+            tuple[int, int, int, str]: (チャンク番号, 開始位置, サイズ, ハッシュ)
+        """
+        file_size = self.file_size
+        for index in range(max(offset, 0) // self.chunk_size, len(self.chunk_hashes)):
+            chunk_offset = index * self.chunk_size
+            yield index, chunk_offset, min(self.chunk_size, file_size - chunk_offset), self.chunk_hashes[index]
+
     def convert_body(self) -> dict:
         """
         コマンドのボディを生成
@@ -191,12 +392,139 @@ class TransferCommand(CommandBase):
         body = {
             "file_name": self.file_name,
             "file_size": self.file_size,
+            "file_hash": self.file_hash,
+            "hash_algorithm": TRANSFER_HASH_ALGORITHM,
+            "chunk_size": self.chunk_size,
+            "chunked": True,
         }
+        if self.compression_levels:
+            body["compression"] = list(self.compression_levels)
         self.command_body = body
         logger.debug(f"ファイル転送コマンドのボディ: {body}")
         return body
 
 
+class ChunkCommand(CommandBase):
+    """
+    ファイル転送のチャンクを送信するコマンド
+    このコマンドの直後にチャンク本体を送信する
+    圧縮する場合はcompressed_sizeバイト、しない場合はsizeバイトの本体が続く
+    sizeとhashは常に圧縮前のチャンクの値
+    """
+
+    def __init__(
+        self,
+        transfer_id: str | None = None,
+        index: int | None = None,
+        offset: int | None = None,
+        size: int | None = None,
+        chunk_hash: str | None = None,
+    ):
+        super().__init__(
+            command_name="CHUNK",
+        )
+        self._transfer_id = transfer_id
+        self._index = index
+        self._offset = offset
+        self._size = size
+        self._chunk_hash = chunk_hash
+        # 圧縮して送信する場合に設定する
+        self.compression: str | None = None
+        self.compressed_size: int | None = None
+
+    @property
+    def transfer_id(self) -> str:
+        if self._transfer_id is None:
+            raise ValueError("transfer_idが設定されていません")
+        return self._transfer_id
+
+    @property
+    def index(self) -> int:
+        if self._index is None:
+            raise ValueError("indexが設定されていません")
+        return self._index
+
+    @property
+    def offset(self) -> int:
+        if self._offset is None:
+            raise ValueError("offsetが設定されていません")
+        return self._offset
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            raise ValueError("sizeが設定されていません")
+        return self._size
+
+    @property
+    def chunk_hash(self) -> str:
+        if self._chunk_hash is None:
+            raise ValueError("chunk_hashが設定されていません")
+        return self._chunk_hash
+
+    def convert_body(self) -> dict:
+        """
+        コマンドのボディを生成
+        """
+        body = {
+            "transfer_id": self.transfer_id,
+            "index": self.index,
+            "offset": self.offset,
+            "size": self.size,
+            "hash": self.chunk_hash,
+        }
+        if self.compression:
+            body["compression"] = self.compression
+            body["compressed_size"] = self.compressed_size
+        self.command_body = body
+        return body
+
+
+class TransferEndCommand(CommandBase):
+    """
+    ファイル転送の終了を通知し、ファイル全体の検証を依頼するコマンド
+    """
+
+    def __init__(self, transfer_id: str | None = None, file_size: int | None = None, file_hash: str | None = None):
+        super().__init__(
+            command_name="TRANSFER_END",
+        )
+        self._transfer_id = transfer_id
+        self._file_size = file_size
+        self._file_hash = file_hash
+
+    @property
+    def transfer_id(self) -> str:
+        if self._transfer_id is None:
+            raise ValueError("transfer_idが設定されていません")
+        return self._transfer_id
+
+    @property
+    def file_size(self) -> int:
+        if self._file_size is None:
+            raise ValueError("file_sizeが設定されていません")
+        return self._file_size
+
+    @property
+    def file_hash(self) -> str:
+        if self._file_hash is None:
+            raise ValueError("file_hashが設定されていません")
+        return self._file_hash
+
+    def convert_body(self) -> dict:
+        """
+        コマンドのボディを生成
+        """
+        body = {
+            "transfer_id": self.transfer_id,
+            "file_size": self.file_size,
+            "file_hash": self.file_hash,
+            "hash_algorithm": TRANSFER_HASH_ALGORITHM,
+        }
+        self.command_body = body
+        return body
+
+
 class NextCommand(CommandBase):
     """
     次のオブジェクトに変更するコマンド
@@ -475,19 +803,127 @@ class ResponseModel:
     レスポンスモデル
     """
 
-    def __init__(self, header: str, body: dict):
+    def __init__(self, header: str, body: dict, framing_error: bool = False):
         self._header = header
         self._body = body
+        self._framing_error = framing_error
 
     @property
     def header(self) -> str:
         return self._header
 
+    @property
+    def framing_error(self) -> bool:
+        """
+        受信したデータをレスポンスとして読み取れなかったため、ResponseReaderが作成したエラーかどうか
+        クライアントが返したレスポンスではないため、どのコマンドの応答でもない
+        """
+        return self._framing_error
+
     @property
     def body(self) -> dict:
         return self._body
 
+    @property
+    def request_id(self) -> str | None:
+        """
+        対応するコマンドのリクエストID
+        リクエストIDを返さない古いクライアントの場合はNone
+        """
+        if not isinstance(self._body, dict):
+            return None
+        return self._body.get("request_id")
+
     @classmethod
     def from_str(cls, response_str: str) -> "ResponseModel":
         header, body = response_str.split("\n", 1)
         return cls(header, json.loads(body))
+
+
+class ResponseReader:
+    """
+    受信したバイト列を「ヘッダー(NAME SIZE)\nボディ(SIZEバイト)」単位のレスポンスに切り出すクラス
+
+    TCPでは1回の受信で1つのレスポンスが届くとは限らないため、
+    受信データをバッファに溜め、ボディがSIZEバイト揃った時点でResponseModelを生成する。
+    余ったバイト列は次のレスポンスのためにバッファに残す。
+
+    Example:
+        ```python
+        reader = ResponseReader()
+        for response in reader.feed(data):
+            print(response.header, response.body)
+        ```
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._header: str | None = None
+        self._body_size: int | None = None
+
+    @property
+    def buffered_size(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[ResponseModel]:
+        """
+        受信したバイト列を追加し、完成したレスポンスを返す
+
+        Args:
+            data (bytes): 受信したバイト列
+
+        Returns:
+            list[ResponseModel]: 完成したレスポンスのリスト(未完成の場合は空)
+        """
+        self._buffer.extend(data)
+        responses = []
+        while (response := self._next_response()) is not None:
+            responses.append(response)
+        return responses
+
+    def _next_response(self) -> ResponseModel | None:
+        try:
+            if self._header is None and not self._read_header():
+                return None
+        except ValueError as e:
+            return ResponseModel("ERROR 0", {"status_message": "ERROR", "error_message": str(e)}, framing_error=True)
+
+        if len(self._buffer) < self._body_size:
+            return None
+
+        body = bytes(self._buffer[: self._body_size])
+        del self._buffer[: self._body_size]
+        header = self._header
+        self._header = None
+        self._body_size = None
+
+        try:
+            return ResponseModel.from_str(f"{header}\n{body.decode('utf-8')}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            logger.error(f"ボディの文字列を辞書型に変換中にエラーが発生しました: {e}")
+            return ResponseModel(header, {"status_message": "ERROR", "error_message": str(e)}, framing_error=True)
+
+    def _read_header(self) -> bool:
+        # 前のレスポンスの末尾に付いている改行は読み飛ばす
+        while self._buffer[:1] in (b"\n", b"\r"):
+            del self._buffer[:1]
+
+        index = self._buffer.find(b"\n")
+        if index < 0:
+            return False
+        line = self._buffer[:index].decode("utf-8", errors="replace").strip()
+        del self._buffer[: index + 1]
+
+        try:
+            name, size = line.rsplit(" ", 1)
+            self._body_size = int(size)
+            if self._body_size < 0:
+                raise ValueError(f"body_sizeが負の値です: {size}")
+        except ValueError as e:
+            # ヘッダーが壊れている場合は区切りがわからないため、バッファを破棄して次の受信から読み直す
+            self._buffer.clear()
+            self._body_size = None
+            raise ValueError(f"レスポンスのヘッダーが不正です: {line!r}") from e
+
+        self._header = f"{name} {self._body_size}"
+        return True
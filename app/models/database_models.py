@@ -1,5 +1,6 @@
 import logging
 import sqlite3
+import threading
 from abc import ABC, abstractmethod
 from pathlib import Path
 
@@ -9,6 +10,93 @@ from app.controller.manager.settings_manager import SettingsManager
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQLのコネクションプールの既定値(接続数と、接続が空くまで待つ時間(秒))
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_POOL_TIMEOUT = 30.0
+# LangGraphのPostgresSaverが必要とする接続の設定(DatabaseHandlerのクエリもこの設定で実行する)
+POOL_CONNECTION_KWARGS = {"autocommit": True, "prepare_threshold": 0}
+
+
+def build_postgres_conninfo(user: str, password: str, host: str, port: int, database: str) -> str:
+    """PostgreSQLの接続文字列を作成する"""
+    return f"postgresql://{user}:{password}@{host}:{port}/{database}?sslmode=disable"
+
+
+class ConnectionPoolRegistry:
+    """
+    プロセス内で共有するPostgreSQLのコネクションプールを保持するクラス
+
+    DatabaseHandlerとチャットのチェックポイントは同じ接続先ごとに1つのプールを使用し、
+    PostgreSQLへの接続数がmax_sizeを超えないようにする。プールはプロセスの終了時にclose_allで閉じる。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: dict[str, ConnectionPool] = {}
+
+    def get_pool(
+        self,
+        conninfo: str,
+        min_size: int = DEFAULT_POOL_MIN_SIZE,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+    ) -> ConnectionPool:
+        """
+        接続先のプールを取得する(存在しない場合は作成する)
+        設定が変更されていた場合はプールの大きさを変更する
+
+        Args:
+            conninfo (str): 接続文字列
+            min_size (int, optional): 維持する接続数. Defaults to DEFAULT_POOL_MIN_SIZE.
+            max_size (int, optional): 最大の接続数. Defaults to DEFAULT_POOL_MAX_SIZE.
+            timeout (float, optional): 接続が空くまで待つ時間(秒). Defaults to DEFAULT_POOL_TIMEOUT.
+
+        Returns:
+            ConnectionPool: 共有のプール
+        """
+        max_size = max(max_size, min_size, 1)
+        with self._lock:
+            pool = self._pools.get(conninfo)
+            if pool is None:
+                pool = ConnectionPool(
+                    conninfo=conninfo,
+                    min_size=min_size,
+                    max_size=max_size,
+                    timeout=timeout,
+                    kwargs=POOL_CONNECTION_KWARGS,
+                    name=f"pool-{len(self._pools) + 1}",
+                    open=True,
+                )
+                self._pools[conninfo] = pool
+                logger.info(f"PostgreSQL connection pool initialized: {pool.name} (max_size={max_size})")
+            else:
+                if (pool.min_size, pool.max_size) != (min_size, max_size):
+                    pool.resize(min_size, max_size)
+                    logger.info(f"PostgreSQL connection pool resized: {pool.name} (max_size={max_size})")
+                pool.timeout = timeout
+            return pool
+
+    def get_stats(self) -> dict[str, dict[str, int]]:
+        """
+        プールごとの使用状況を取得する
+        :return: {プール名: {"pool_size": int, "pool_available": int, "requests_waiting": int,
+                  "requests_wait_ms": int, "requests_errors": int, ...}}
+        """
+        with self._lock:
+            return {pool.name: pool.get_stats() for pool in self._pools.values()}
+
+    def close_all(self):
+        """全てのプールを閉じる"""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+        logger.info("PostgreSQL connection pools closed.")
+
+
+pool_registry = ConnectionPoolRegistry()
+
 
 class BaseDatabaseHandler(ABC):
     """
@@ -83,15 +171,23 @@ class SQLiteDatabaseHandler(BaseDatabaseHandler):
 
 
 class PostgreSQLDatabaseHandler(BaseDatabaseHandler):
-    def __init__(self, conninfo: str):
+    def __init__(
+        self,
+        conninfo: str,
+        min_size: int = DEFAULT_POOL_MIN_SIZE,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+    ):
         self.conninfo = conninfo
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
         self.pool: ConnectionPool | None = None
         self.connect()
 
     def connect(self):
-        """PostgreSQLデータベースに接続する"""
-        self.pool = ConnectionPool(conninfo=self.conninfo, max_size=20, open=True)
-        logger.info("PostgreSQL connection pool initialized.")
+        """PostgreSQLデータベースに接続する(同じ接続先のプールはプロセス内で共有する)"""
+        self.pool = pool_registry.get_pool(self.conninfo, self.min_size, self.max_size, self.timeout)
 
     def execute_query(self, query: str, params: tuple | None = None):
         """クエリを実行（データ挿入、更新、削除）"""
@@ -108,10 +204,11 @@ class PostgreSQLDatabaseHandler(BaseDatabaseHandler):
                 return cursor.fetchall()
 
     def close_connection(self):
-        """PostgreSQL接続を閉じる"""
-        if self.pool:
-            self.pool.close()
-            logger.info("PostgreSQL connection pool closed.")
+        """
+        PostgreSQL接続を閉じる
+        プールは他のDatabaseHandlerやチェックポイントと共有しているため、閉じずに参照のみを外す
+        """
+        self.pool = None
 
 
 class DatabaseHandler:
@@ -119,14 +216,20 @@ class DatabaseHandler:
         use_postgres = settings_manager.get_setting("database_settings.use_postgres")
 
         if use_postgres:
-            conninfo = (
-                f"postgresql://{settings_manager.get_setting('database_settings.postgres_settings.user')}:"
-                f"{settings_manager.get_setting('database_settings.postgres_settings.password')}@"
-                f"{settings_manager.get_setting('database_settings.postgres_settings.host')}:"
-                f"{settings_manager.get_setting('database_settings.postgres_settings.port')}/"
-                f"{settings_manager.get_setting('database_settings.postgres_settings.database')}?sslmode=disable"
+            postgres_settings = settings_manager.get_setting("database_settings.postgres_settings")
+            conninfo = build_postgres_conninfo(
+                postgres_settings.user,
+                postgres_settings.password,
+                postgres_settings.host,
+                postgres_settings.port,
+                postgres_settings.database,
+            )
+            self.handler = PostgreSQLDatabaseHandler(
+                conninfo,
+                min_size=int(postgres_settings.pool_min_size),
+                max_size=int(postgres_settings.pool_max_size),
+                timeout=float(postgres_settings.pool_timeout),
             )
-            self.handler = PostgreSQLDatabaseHandler(conninfo)
         else:
             database_path = settings_manager.get_setting("database_settings.sqlite_settings.database")
             init_sql_path = "db/sqlite/init/1_init.sql"
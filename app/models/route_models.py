@@ -10,6 +10,7 @@ class RouteParamKey(Enum):
     SETTINGS = "settings_manager"
     DB_HANDLER = "db_handler"
     DOCS_MANAGER = "docs_manager"
+    INDEX_WORKER = "index_worker"
     SERVER = "socket_server"
     SERVER_THREAD = "server_thread"
     FILE_MANAGER = "file_manager"
@@ -25,6 +26,7 @@ class RouteParamValue(Enum):
     SETTINGS = "data:settings_manager"
     DB_HANDLER = "data:db_handler"
     DOCS_MANAGER = "data:docs_manager"
+    INDEX_WORKER = "data:index_worker"
     SERVER = "data:socket_server"
     SERVER_THREAD = "data:server_thread"
     FILE_MANAGER = "data:file_manager"
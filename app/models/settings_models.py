@@ -10,6 +10,7 @@ class LlmProvider(Enum):
 
 class EmbeddingProvider(Enum):
     AZURE = "azure"
+    LOCAL = "local"
 
 
 # データクラスで設定の構造を定義
@@ -26,6 +27,10 @@ class PostgresSettings:
     database: str = "main_db"
     user: str = "postgres"
     password: str = "postgres"
+    # プロセス内で共有するコネクションプールの接続数と、接続が空くまで待つ時間(秒)
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_timeout: float = 30.0
 
 
 @dataclass
@@ -55,6 +60,19 @@ class GeminiLlmSettings:
     model: str = ""
 
 
+@dataclass
+class LocalEmbeddingSettings:
+    # sentence-transformersで読み込むモデル(Hugging Faceのモデル名またはローカルのパス)
+    model_name: str = "intfloat/multilingual-e5-small"
+    device: str = "cpu"
+    batch_size: int = 32
+    # 埋め込みを計算するスレッド数
+    max_workers: int = 2
+    # e5系のモデルはクエリと文書で異なる接頭辞を付けて埋め込みを計算する
+    query_prefix: str = "query: "
+    document_prefix: str = "passage: "
+
+
 @dataclass
 class LangsmithSettings:
     endpoint: str = "https://api.smith.langchain.com"
@@ -66,8 +84,11 @@ class LangsmithSettings:
 class LlmSettings:
     llm_provider: LlmProvider = LlmProvider.AZURE
     embedding_provider: EmbeddingProvider = EmbeddingProvider.AZURE
+    # 埋め込みのキャッシュにないテキストを1回のリクエストで送信する件数
+    embedding_batch_size: int = 64
     azure_llm_settings: AzureLlmSettings = field(default_factory=AzureLlmSettings)
     gemini_llm_settings: GeminiLlmSettings = field(default_factory=GeminiLlmSettings)
+    local_embedding_settings: LocalEmbeddingSettings = field(default_factory=LocalEmbeddingSettings)
     use_langsmith: bool = False
     langsmith_settings: LangsmithSettings = field(default_factory=LangsmithSettings)
 
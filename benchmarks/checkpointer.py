@@ -0,0 +1,138 @@
+"""
+SQLiteのチェックポイントの保存先の比較ベンチマーク
+
+1つの接続をロックで共有するSqliteSaver(変更前の実装)と、WALモードでスレッドごとに読み込み、
+書き込みをまとめてコミットするWalSqliteSaverを比較する。
+チャットと同じくメッセージを追加するグラフを用意し、指定した数のセッションをスレッドで同時に実行する。
+1ターンはグラフの実行(チェックポイントの書き込み)と、履歴の取得(get_state)からなる。
+
+使い方:
+    python -m benchmarks.checkpointer [--sessions 1 4 16] [--turns 20] [--message-size 2000] [--output result.json]
+
+アプリの設定を読み込むモジュールを使用するため、アプリと同じくFLET_APP_STORAGE_DATAを指定して実行する。
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import START, MessagesState, StateGraph
+
+from app.ai.checkpointer import WalSqliteSaver
+from benchmarks.retrieval import percentile
+
+
+def create_graph(checkpointer: BaseCheckpointSaver, message_size: int):
+    """ユーザーのメッセージにmessage_size文字の応答を追加するグラフを作成する"""
+
+    def respond(state: MessagesState) -> dict:
+        return {"messages": [AIMessage(content="応" * message_size)]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.add_edge(START, "respond")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def run_sessions(graph, session_count: int, turns: int) -> dict:
+    """
+    session_count個のセッションを同時に実行し、ターンごとのレイテンシとスループットを集計する
+    """
+    latencies: list[float] = []
+    errors: list[str] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(session_count)
+
+    def session(index: int):
+        config = {"configurable": {"thread_id": f"session-{index}"}}
+        barrier.wait()
+        for turn in range(turns):
+            started_at = time.perf_counter()
+            try:
+                graph.invoke({"messages": [HumanMessage(content=f"質問{turn}")]}, config)
+                graph.get_state(config)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started_at) * 1000)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(session_count)]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "sessions": session_count,
+        "turns": len(latencies),
+        "errors": len(errors),
+        "turns_per_sec": len(latencies) / elapsed,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        },
+    }
+
+
+def run(session_counts: list[int], turns: int, message_size: int) -> dict:
+    """
+    保存先ごとに、セッション数を変えて計測する
+    """
+    savers: dict[str, Callable[[str], BaseCheckpointSaver]] = {
+        "single": lambda path: SqliteSaver(sqlite3.connect(path, check_same_thread=False)),
+        "wal": WalSqliteSaver,
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, create_saver in savers.items():
+            results[name] = []
+            for session_count in session_counts:
+                saver = create_saver(os.path.join(work_dir, f"{name}_{session_count}.db"))
+                result = run_sessions(create_graph(saver, message_size), session_count, turns)
+                if isinstance(saver, WalSqliteSaver):
+                    result["write_stats"] = saver.stats()
+                    saver.close()
+                else:
+                    saver.conn.close()
+                results[name].append(result)
+    return {"turns_per_session": turns, "message_size": message_size, "results": results}
+
+
+def print_results(result: dict) -> None:
+    print(f"turns per session: {result['turns_per_session']}, message size: {result['message_size']}")
+    print(f"{'saver':<8} {'sessions':>8} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, rows in result["results"].items():
+        for r in rows:
+            latency = r["latency_ms"]
+            print(
+                f"{name:<8} {r['sessions']:>8} {r['turns_per_sec']:>9.1f} {latency['p50']:>8.2f} "
+                f"{latency['p95']:>8.2f} {latency['p99']:>8.2f} {r['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLiteのチェックポイントの保存先の比較ベンチマーク")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16], help="同時に実行するセッション数")
+    parser.add_argument("--turns", type=int, default=20, help="1セッションあたりのターン数")
+    parser.add_argument("--message-size", type=int, default=2000, help="応答メッセージの文字数")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    benchmark_result = run(args.sessions, args.turns, args.message_size)
+    print_results(benchmark_result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(benchmark_result, f, indent=4, ensure_ascii=False)
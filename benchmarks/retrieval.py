@@ -0,0 +1,253 @@
+"""
+ドキュメント検索の精度と速度のベンチマーク
+
+documentsテーブルと同じスキーマの一時的なSQLiteに合成したドキュメントを登録し、
+アプリと同じ分割・インデックス作成・検索(hybrid_search)で正解付きのクエリを検索する。
+埋め込みはAPIを呼ばず、トークンをハッシュしてベクトルにする決定的なEmbeddingsで計算する。
+
+検索方式(lexical / vector / hybrid)ごとに recall@k, MRR, レイテンシのパーセンタイルを計測し、
+インデックスの作成時間と合わせて出力する。
+
+使い方:
+    python -m benchmarks.retrieval [--documents 500] [--k 4] [--repeat 3] [--output result.json]
+
+アプリの設定を読み込むモジュールを使用するため、アプリと同じくFLET_APP_STORAGE_DATAを指定して実行する。
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import zlib
+from collections.abc import Callable
+
+from langchain.indexes import SQLRecordManager
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.ai.reindex import ReindexOptions, reindex_documents
+from app.ai.search import SEARCH_CANDIDATES, LexicalIndex, hybrid_search, tokenize
+from app.models.database_models import SQLiteDatabaseHandler
+
+INIT_SQL_PATH = os.path.join(os.path.dirname(__file__), "..", "db", "sqlite", "init", "1_init.sql")
+
+CATEGORIES = ["恐竜", "ロボット", "寺院", "自動車", "楽器", "帆船", "昆虫", "城", "飛行機", "仏像"]
+MATERIALS = ["木製", "金属製", "石造り", "ガラス製", "陶器", "プラスチック製", "青銅製"]
+COLORS = ["赤い", "青い", "白い", "黒い", "金色の", "緑の"]
+ERAS = ["江戸時代", "白亜紀", "明治時代", "現代", "平安時代", "未来"]
+FEATURES = [
+    "細部まで再現された彫刻",
+    "動く関節",
+    "光る目",
+    "回転する台座",
+    "透明な外装",
+    "分解できる構造",
+    "音が鳴る仕組み",
+]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    検索用のトークンを固定の次元にハッシュして埋め込みにする決定的なEmbeddings
+    同じトークンを含むテキストほど類似度が高くなるため、APIを呼ばずにベクトル検索の挙動を再現できる
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.size
+        for token in tokenize(text):
+            digest = zlib.crc32(token.encode("utf-8"))
+            vector[digest % self.size] += 1.0 if digest & 0x80000000 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def create_corpus(document_count: int, seed: int = 0) -> tuple[list[str], list[dict]]:
+    """
+    計測用のドキュメントと正解付きのクエリを生成する
+
+    Args:
+        document_count (int): 生成するドキュメント数
+        seed (int, optional): 乱数のシード. Defaults to 0.
+
+    Returns:
+        tuple[list[str], list[dict]]: ドキュメントの内容のリスト(先頭から順にdocument_idが1, 2, ...)と、
+            {"query": str, "type": str, "relevant": list[int]}のリスト
+    """
+    rng = random.Random(seed)
+    documents = []
+    attributes = []
+    for i in range(document_count):
+        model_id = f"SPX-{i + 1:04d}"
+        attribute = {
+            "category": rng.choice(CATEGORIES),
+            "material": rng.choice(MATERIALS),
+            "color": rng.choice(COLORS),
+            "era": rng.choice(ERAS),
+            "feature": rng.choice(FEATURES),
+        }
+        attributes.append(attribute)
+        documents.append(
+            f"# {model_id} {attribute['color']}{attribute['category']}\n\n"
+            f"{model_id}は{attribute['era']}をモチーフにした{attribute['material']}の{attribute['category']}の3Dモデルです。\n"
+            f"{attribute['feature']}が特徴で、展示ではSRDに立体的に表示されます。\n\n"
+            f"## 展示メモ\n\n"
+            f"型番{model_id}の展示には{rng.choice(COLORS)}背景を推奨します。"
+        )
+
+    queries = []
+    for i in rng.sample(range(document_count), min(document_count, 100)):
+        queries.append({"query": f"SPX-{i + 1:04d}", "type": "identifier", "relevant": [i + 1]})
+    for i in rng.sample(range(document_count), min(document_count, 100)):
+        attribute = attributes[i]
+        keys = ("color", "material", "category", "feature")
+        relevant = [j + 1 for j, other in enumerate(attributes) if all(other[key] == attribute[key] for key in keys)]
+        query = f"{attribute['feature']}がある{attribute['color']}{attribute['material']}の{attribute['category']}"
+        queries.append({"query": query, "type": "description", "relevant": relevant})
+    return documents, queries
+
+
+def percentile(values: list[float], p: float) -> float:
+    """最近傍順位法でパーセンタイルを計算する"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def _document_ids(results: list[Document]) -> list[int]:
+    """チャンクの検索結果を、重複を除いたドキュメントIDの順位にする"""
+    document_ids = []
+    for result in results:
+        document_id = int(result.metadata["source"])
+        if document_id not in document_ids:
+            document_ids.append(document_id)
+    return document_ids
+
+
+def evaluate(search: Callable[[str], list[Document]], queries: list[dict], k: int, repeat: int) -> dict:
+    """
+    検索関数で全てのクエリを検索し、精度とレイテンシを集計する
+    """
+    latencies = []
+    recalls = []
+    reciprocal_ranks = []
+    for _ in range(repeat):
+        for query in queries:
+            started_at = time.perf_counter()
+            results = search(query["query"])
+            latencies.append((time.perf_counter() - started_at) * 1000)
+
+            ranked = _document_ids(results)[:k]
+            relevant = set(query["relevant"])
+            recalls.append(len(relevant.intersection(ranked)) / len(relevant))
+            rank = next((i for i, document_id in enumerate(ranked, start=1) if document_id in relevant), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    return {
+        "queries": len(queries),
+        f"recall@{k}": sum(recalls) / len(recalls),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies),
+        },
+    }
+
+
+def run(document_count: int, k: int, repeat: int, embedding_size: int) -> dict:
+    """
+    合成したドキュメントでインデックスを作成し、検索方式ごとに計測する
+    """
+    documents, queries = create_corpus(document_count)
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_handler = SQLiteDatabaseHandler(os.path.join(work_dir, "main.db"), INIT_SQL_PATH)
+        for content in documents:
+            db_handler.execute_query("INSERT INTO documents (title, content) VALUES (%s, %s);", ("benchmark", content))
+
+        vector_store = Chroma(
+            collection_name="retrieval_benchmark",
+            embedding_function=HashingEmbeddings(embedding_size),
+            persist_directory=os.path.join(work_dir, "chroma_db"),
+        )
+        record_manager = SQLRecordManager(
+            namespace="chromadb/retrieval_benchmark", db_url=f"sqlite:///{os.path.join(work_dir, 'indexing.db')}"
+        )
+        record_manager.create_schema()
+        reindex_stats = reindex_documents(db_handler, ReindexOptions(), target=(vector_store, record_manager))
+
+        lexical = LexicalIndex()
+        started_at = time.perf_counter()
+        lexical.load(db_handler)
+        lexical_build_seconds = time.perf_counter() - started_at
+
+        searches: dict[str, Callable[[str], list[Document]]] = {
+            "lexical": lambda query: [document for document, _ in lexical.search(query, SEARCH_CANDIDATES)],
+            "vector": lambda query: vector_store.similarity_search(query, k=SEARCH_CANDIDATES),
+            "hybrid": lambda query: hybrid_search(
+                query, SEARCH_CANDIDATES, vector_store=vector_store, index=lexical, use_cache=False
+            ),
+        }
+        results = {}
+        for name, search in searches.items():
+            results[name] = {
+                query_type: evaluate(search, [query for query in queries if query["type"] == query_type], k, repeat)
+                for query_type in ("identifier", "description")
+            }
+        db_handler.close_connection()
+
+    return {
+        "documents": document_count,
+        "chunks": reindex_stats.chunks,
+        "k": k,
+        "repeat": repeat,
+        "embedding_size": embedding_size,
+        "build_seconds": {"vector": reindex_stats.elapsed, "lexical": lexical_build_seconds},
+        "results": results,
+    }
+
+
+def print_results(result: dict) -> None:
+    k = result["k"]
+    print(
+        f"documents: {result['documents']}, chunks: {result['chunks']}, "
+        f"build: vector {result['build_seconds']['vector']:.2f} s / lexical {result['build_seconds']['lexical']:.2f} s"
+    )
+    print(f"{'mode':<8} {'queries':<12} {f'recall@{k}':>9} {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode, by_type in result["results"].items():
+        for query_type, r in by_type.items():
+            latency = r["latency_ms"]
+            print(
+                f"{mode:<8} {query_type:<12} {r[f'recall@{k}']:>9.3f} {r['mrr']:>6.3f} "
+                f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ドキュメント検索の精度と速度のベンチマーク")
+    parser.add_argument("--documents", type=int, default=500, help="生成するドキュメント数")
+    parser.add_argument("--k", type=int, default=4, help="recall@kのk")
+    parser.add_argument("--repeat", type=int, default=3, help="クエリを繰り返す回数")
+    parser.add_argument("--embedding-size", type=int, default=256, help="埋め込みの次元")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    benchmark_result = run(args.documents, args.k, args.repeat, args.embedding_size)
+    print_results(benchmark_result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(benchmark_result, f, indent=4, ensure_ascii=False)
@@ -0,0 +1,153 @@
+"""
+モデル転送の圧縮方式ごとの比較ベンチマーク
+
+TransferCommandと同じくチャンクごとに圧縮した場合の、圧縮にかかる時間と送信バイト数を比較する。
+送信時間は指定した帯域幅の回線を想定して計算し、圧縮時間と合わせた所要時間を出力する。
+
+使い方:
+    python -m benchmarks.transfer_compression [ファイル ...] [--bandwidth-mbps 50] [--output result.json]
+
+ファイルを指定しない場合は、OBJ/MTL/PLY(ASCII・バイナリ)/PNG相当の典型的なアセットを生成して計測する。
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import tempfile
+import time
+
+from app.models.command_models import (
+    COMPRESSION_LEVELS,
+    TRANSFER_CHUNK_SIZE,
+    compress_chunk,
+    get_compression_levels,
+    zstandard,
+)
+
+
+def create_sample_assets(directory: str, scale: int = 1) -> list[str]:
+    """
+    計測用の典型的なアセットを生成する
+
+    Args:
+        directory (str): 出力先のディレクトリ
+        scale (int, optional): 生成するデータ量の倍率. Defaults to 1.
+
+    Returns:
+        list[str]: 生成したファイルのパス
+    """
+    rng = random.Random(0)
+    vertex_count = 200_000 * scale
+
+    obj_path = os.path.join(directory, "sample.obj")
+    with open(obj_path, "w", encoding="utf-8") as f:
+        f.write("mtllib sample.mtl\n")
+        for _ in range(vertex_count):
+            f.write(f"v {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f}\n")
+        for _ in range(vertex_count):
+            f.write(f"vt {rng.random():.6f} {rng.random():.6f}\n")
+        for i in range(1, vertex_count - 2, 3):
+            f.write(f"f {i}/{i} {i + 1}/{i + 1} {i + 2}/{i + 2}\n")
+
+    mtl_path = os.path.join(directory, "sample.mtl")
+    with open(mtl_path, "w", encoding="utf-8") as f:
+        for i in range(50):
+            f.write(f"newmtl material_{i}\nKa 1.000 1.000 1.000\nKd 0.800 0.800 0.800\nmap_Kd texture_{i}.png\n\n")
+
+    # 3DGSのPLYはバイナリの浮動小数点が並ぶ
+    properties = ["x", "y", "z", "nx", "ny", "nz", "f_dc_0", "f_dc_1", "f_dc_2", "opacity", "scale_0", "scale_1"]
+    ply_path = os.path.join(directory, "sample_binary.ply")
+    with open(ply_path, "wb") as f:
+        header = "ply\nformat binary_little_endian 1.0\n" f"element vertex {vertex_count}\n"
+        header += "".join(f"property float {name}\n" for name in properties) + "end_header\n"
+        f.write(header.encode("ascii"))
+        for _ in range(vertex_count):
+            values = [rng.uniform(-1, 1) for _ in range(6)] + [0.0] * 3 + [rng.random()] + [-4.0, -4.0]
+            f.write(struct.pack(f"<{len(properties)}f", *values))
+
+    ascii_ply_path = os.path.join(directory, "sample_ascii.ply")
+    with open(ascii_ply_path, "w", encoding="utf-8") as f:
+        f.write(f"ply\nformat ascii 1.0\nelement vertex {vertex_count}\n")
+        f.write("property float x\nproperty float y\nproperty float z\nend_header\n")
+        for _ in range(vertex_count):
+            f.write(f"{rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f}\n")
+
+    # PNGなどの画像は既に圧縮されているため、乱数データで代用する
+    png_path = os.path.join(directory, "texture.png")
+    with open(png_path, "wb") as f:
+        f.write(os.urandom(4 * 1024 * 1024 * scale))
+
+    return [obj_path, mtl_path, ply_path, ascii_ply_path, png_path]
+
+
+def measure(file_path: str, compression: str | None, level: int, bandwidth_mbps: float) -> dict:
+    """
+    1つのファイルをチャンクごとに圧縮した場合の時間と送信バイト数を計測する
+    """
+    raw_size = 0
+    wire_size = 0
+    started_at = time.perf_counter()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(TRANSFER_CHUNK_SIZE):
+            raw_size += len(chunk)
+            wire_size += len(compress_chunk(chunk, compression, level)) if compression else len(chunk)
+    compress_seconds = time.perf_counter() - started_at
+    transfer_seconds = wire_size * 8 / (bandwidth_mbps * 1_000_000)
+    return {
+        "file": os.path.basename(file_path),
+        "compression": compression or "none",
+        "level": level if compression else None,
+        "raw_bytes": raw_size,
+        "wire_bytes": wire_size,
+        "ratio": wire_size / raw_size if raw_size else 1.0,
+        "compress_seconds": compress_seconds,
+        "transfer_seconds": transfer_seconds,
+        "total_seconds": compress_seconds + transfer_seconds,
+    }
+
+
+def run(files: list[str], bandwidth_mbps: float) -> list[dict]:
+    results = []
+    for file_path in files:
+        results.append(measure(file_path, None, 0, bandwidth_mbps))
+        # 実際に使用するレベルに加えて、拡張子の設定がない場合も比較のため全方式を計測する
+        levels = get_compression_levels(file_path) or COMPRESSION_LEVELS[".obj"]
+        for compression, level in levels.items():
+            if compression == "zstd" and zstandard is None:
+                continue
+            results.append(measure(file_path, compression, level, bandwidth_mbps))
+    return results
+
+
+def print_results(results: list[dict], bandwidth_mbps: float) -> None:
+    print(f"想定帯域幅: {bandwidth_mbps} Mbps, チャンクサイズ: {TRANSFER_CHUNK_SIZE} bytes")
+    print(
+        f"{'file':<20} {'codec':<6} {'lv':>3} {'raw MiB':>9} {'wire MiB':>9} "
+        f"{'ratio':>6} {'comp s':>7} {'total s':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['file']:<20} {r['compression']:<6} {r['level'] if r['level'] is not None else '-':>3} "
+            f"{r['raw_bytes'] / 1024 / 1024:>9.2f} {r['wire_bytes'] / 1024 / 1024:>9.2f} {r['ratio']:>6.2f} "
+            f"{r['compress_seconds']:>7.2f} {r['total_seconds']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="モデル転送の圧縮方式ごとの比較ベンチマーク")
+    parser.add_argument("files", nargs="*", help="計測するファイル(省略時はサンプルを生成)")
+    parser.add_argument("--bandwidth-mbps", type=float, default=50.0, help="想定する回線の帯域幅(Mbps)")
+    parser.add_argument("--scale", type=int, default=1, help="サンプル生成時のデータ量の倍率")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        target_files = args.files or create_sample_assets(tmp_dir, args.scale)
+        benchmark_results = run(target_files, args.bandwidth_mbps)
+
+    print_results(benchmark_results, args.bandwidth_mbps)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(benchmark_results, f, indent=4, ensure_ascii=False)
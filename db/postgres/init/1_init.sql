@@ -16,10 +16,26 @@ DROP TABLE IF EXISTS objects;
 CREATE TABLE objects (
 	object_id SERIAL PRIMARY KEY,
 	object_name VARCHAR(100) NOT NULL,
+	content_hash VARCHAR(64),
 	created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
 	updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
 	delete_flag BOOLEAN NOT NULL DEFAULT FALSE
 );
+-- アップロードされたファイルのハッシュから既存のオブジェクトを検索するためのインデックス
+CREATE INDEX idx_objects_content_hash ON objects (content_hash);
+
+-- ドキュメントのインデックス作成ジョブを保存するテーブル
+-- next_run_atは再試行する時刻(UNIX時間)
+DROP TABLE IF EXISTS index_jobs;
+CREATE TABLE index_jobs (
+	document_id INTEGER PRIMARY KEY,
+	operation VARCHAR(16) NOT NULL,
+	status VARCHAR(16) NOT NULL DEFAULT 'pending',
+	attempts INTEGER NOT NULL DEFAULT 0,
+	next_run_at DOUBLE PRECISION NOT NULL DEFAULT 0,
+	last_error TEXT,
+	updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
 
 -- データベースののぞき方
 -- docker container exec -it spadge-main_db bash
@@ -13,7 +13,23 @@ DROP TABLE IF EXISTS objects;
 CREATE TABLE objects (
     object_id INTEGER PRIMARY KEY AUTOINCREMENT,
     object_name TEXT NOT NULL,
+    content_hash TEXT,
     created_at DATETIME NOT NULL DEFAULT (DATETIME(CURRENT_TIMESTAMP,'localtime')),
     updated_at DATETIME NOT NULL DEFAULT (DATETIME(CURRENT_TIMESTAMP,'localtime')),
     delete_flag INTEGER NOT NULL DEFAULT 0
 );
+-- アップロードされたファイルのハッシュから既存のオブジェクトを検索するためのインデックス
+CREATE INDEX IF NOT EXISTS idx_objects_content_hash ON objects (content_hash);
+
+-- ドキュメントのインデックス作成ジョブを保存するテーブル
+-- next_run_atは再試行する時刻(UNIX時間)
+DROP TABLE IF EXISTS index_jobs;
+CREATE TABLE index_jobs (
+    document_id INTEGER PRIMARY KEY,
+    operation TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at DATETIME NOT NULL DEFAULT (DATETIME(CURRENT_TIMESTAMP,'localtime'))
+);
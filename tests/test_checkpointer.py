@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from app.ai.checkpointer import WalSqliteSaver
+
+
+class WalSqliteSaverTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "checkpoints.db")
+        self.saver = WalSqliteSaver(self.path, busy_timeout=10)
+        with self.saver.cursor() as cur:
+            cur.execute("CREATE TABLE items (value INTEGER PRIMARY KEY)")
+
+    def tearDown(self):
+        self.saver.close()
+        self.temp_dir.cleanup()
+
+    def _write(self, sql: str, parameters: tuple, errors: dict, key):
+        try:
+            with self.saver.cursor() as cur:
+                cur.execute(sql, parameters)
+        except sqlite3.Error as e:
+            errors[key] = e
+
+    def _write_while_blocked(self, statements: list[tuple[str, tuple]]) -> dict:
+        """
+        書き込み用のスレッドを最初のトランザクションで止めている間に、各スレッドから書き込みを送信する
+        止めている間に届いた書き込みは、再開後に1つのトランザクションにまとめて書き込まれる
+        """
+        started = threading.Event()
+        release = threading.Event()
+        write_batch = self.saver._write_batch
+
+        def blocking_write_batch(conn, jobs):
+            if not started.is_set():
+                started.set()
+                release.wait()
+            write_batch(conn, jobs)
+
+        self.saver._write_batch = blocking_write_batch
+        errors = {}
+        blocker = threading.Thread(target=self._write, args=("INSERT INTO items VALUES (?)", (-1,), errors, -1))
+        blocker.start()
+        started.wait()
+        threads = [
+            threading.Thread(target=self._write, args=(sql, parameters, errors, i))
+            for i, (sql, parameters) in enumerate(statements)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while self.saver._queue.qsize() < len(statements) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in [blocker, *threads]:
+            thread.join()
+        return errors
+
+    def _values(self) -> list[int]:
+        with self.saver.cursor(transaction=False) as cur:
+            cur.execute("SELECT value FROM items ORDER BY value")
+            return [row[0] for row in cur.fetchall()]
+
+    def test_concurrent_writes_are_batched(self):
+        statements = [("INSERT INTO items VALUES (?)", (i,)) for i in range(20)]
+        before = self.saver.stats()
+
+        errors = self._write_while_blocked(statements)
+
+        stats = self.saver.stats()
+        self.assertEqual(errors, {})
+        self.assertEqual(self._values(), [-1, *range(20)])
+        self.assertEqual(stats["writes"] - before["writes"], 21)
+        self.assertLess(stats["batches"] - before["batches"], stats["writes"] - before["writes"])
+
+    def test_failing_job_does_not_roll_back_other_jobs_in_batch(self):
+        statements = [
+            ("INSERT INTO items VALUES (?)", (1,)),
+            ("INSERT INTO missing_table VALUES (?)", (2,)),
+            ("INSERT INTO items VALUES (?)", (3,)),
+        ]
+        before = self.saver.stats()
+
+        errors = self._write_while_blocked(statements)
+
+        stats = self.saver.stats()
+        self.assertEqual(list(errors), [1])
+        self.assertIsInstance(errors[1], sqlite3.OperationalError)
+        self.assertEqual(self._values(), [-1, 1, 3])
+        # 止めていた書き込みと、まとめて書き込んだ3件の2回のトランザクション
+        self.assertEqual(stats["batches"] - before["batches"], 2)
+        self.assertEqual(stats["errors"] - before["errors"], 1)
+
+    def test_writes_after_close_fail(self):
+        self.saver.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            with self.saver.cursor() as cur:
+                cur.execute("INSERT INTO items VALUES (?)", (1,))
+
+
+if __name__ == "__main__":
+    unittest.main()
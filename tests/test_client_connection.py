@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+import unittest
+
+from app.controller.manager.server_manager import ClientConnection, ServerManager
+from app.models.command_models import ListCommand, ResponseModel, ResponseReader, TransferCommand
+
+
+def encode_response(name: str, body: dict) -> bytes:
+    """クライアントと同じ「ヘッダー(NAME SIZE)\\nボディ」の形式に変換する"""
+    data = json.dumps(body).encode("utf-8")
+    return f"{name} {len(data)}\n".encode() + data
+
+
+class FakeWriter:
+    """ClientConnectionが使用するStreamWriterのメソッドだけを持つクラス"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 50000) if name == "peername" else None
+
+    def write(self, data: bytes):
+        self.data.extend(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class ResponseReaderTest(unittest.TestCase):
+    def test_split_response_across_reads(self):
+        reader = ResponseReader()
+        data = encode_response("PING", {"status_message": "OK", "request_id": "a"})
+        self.assertEqual(reader.feed(data[:5]), [])
+        self.assertEqual(reader.feed(data[5:-3]), [])
+        responses = reader.feed(data[-3:])
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(responses[0].header, "PING " + str(len(data.split(b"\n", 1)[1])))
+        self.assertEqual(responses[0].request_id, "a")
+
+    def test_multiple_responses_in_one_read(self):
+        reader = ResponseReader()
+        data = encode_response("A", {"request_id": "1"}) + b"\n" + encode_response("B", {"request_id": "2"})
+        responses = reader.feed(data)
+        self.assertEqual([response.request_id for response in responses], ["1", "2"])
+        self.assertEqual(reader.buffered_size, 0)
+
+    def test_multibyte_body(self):
+        reader = ResponseReader()
+        data = encode_response("LIST", {"status_message": "OK", "message": "恐竜のモデル"})
+        responses = reader.feed(data)
+        self.assertEqual(responses[0].body["message"], "恐竜のモデル")
+
+    def test_invalid_header(self):
+        reader = ResponseReader()
+        responses = reader.feed(b"BROKEN\n{}")
+        self.assertEqual(responses[0].body["status_message"], "ERROR")
+        self.assertTrue(responses[0].framing_error)
+        self.assertEqual(reader.buffered_size, 0)
+
+    def test_client_response_is_not_framing_error(self):
+        reader = ResponseReader()
+        responses = reader.feed(encode_response("ERROR", {"status_message": "ERROR"}))
+        self.assertFalse(responses[0].framing_error)
+
+
+class ClientConnectionDispatchTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = ClientConnection(asyncio.StreamReader(), FakeWriter())
+
+    async def asyncTearDown(self):
+        for future in self.connection._pending.values():
+            future.cancel()
+        await self.connection.close(send_quit=False)
+
+    async def test_dispatch_by_request_id(self):
+        first = self.connection._register("first")
+        second = self.connection._register("second")
+        self.connection._dispatch(ResponseModel("B 0", {"status_message": "OK", "request_id": "second"}))
+        self.assertFalse(first.done())
+        self.assertEqual(second.result()["request_id"], "second")
+
+    async def test_response_without_request_id_resolves_oldest(self):
+        first = self.connection._register("first")
+        second = self.connection._register("second")
+        self.connection._dispatch(ResponseModel("A 0", {"status_message": "OK"}))
+        self.assertEqual(first.result(), {"status_message": "OK"})
+        self.assertFalse(second.done())
+
+    async def test_unknown_request_id_is_discarded(self):
+        # タイムアウトしたPingの応答が遅れて届いても、転送中の他のコマンドの結果にしない
+        transfer_end = self.connection._register("transfer")
+        self.connection._dispatch(ResponseModel("PING 0", {"status_message": "OK", "request_id": "stale-ping"}))
+        self.assertFalse(transfer_end.done())
+        self.assertIn("transfer", self.connection._pending)
+
+    async def test_malformed_header_does_not_resolve_pending_command(self):
+        # ヘッダーが壊れていた場合のエラーを、最も古い応答待ちのコマンドの結果にしない
+        pending = self.connection._register("first")
+        for response in self.connection.response_reader.feed(b"BROKEN\n{}"):
+            self.connection._dispatch(response)
+        self.assertFalse(pending.done())
+        self.assertIn("first", self.connection._pending)
+
+    async def test_response_without_request_id_is_discarded_after_ids_are_seen(self):
+        # リクエストIDを返すクライアントからのIDのない応答は、最も古いコマンドに対応付けない
+        self.connection._register("first")
+        self.connection._dispatch(ResponseModel("A 0", {"status_message": "OK", "request_id": "first"}))
+        second = self.connection._register("second")
+        self.connection._dispatch(ResponseModel("PING 0", {"status_message": "OK"}))
+        self.assertFalse(second.done())
+
+
+class ClientConnectionRawTransferTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.writer = FakeWriter()
+        self.connection = ClientConnection(asyncio.StreamReader(), self.writer)
+
+        async def write_file(source, offset=0, count=None):
+            data = source.read()
+            self.writer.write(data)
+            return len(data)
+
+        # テストではソケットがないため、sendfileを使わずにバッファに書き込む
+        self.connection._write_file = write_file
+        fd, self.file_path = tempfile.mkstemp(suffix=".obj")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"FILE-BODY")
+
+    async def asyncTearDown(self):
+        for future in self.connection._pending.values():
+            future.cancel()
+        await self.connection.close(send_quit=False)
+        os.remove(self.file_path)
+
+    async def test_ping_waits_until_raw_body_is_sent(self):
+        # チャンク転送に対応していないクライアントでは、ファイル情報の応答から本体の送信までの間にPingを書き込まない
+        command = TransferCommand(self.file_path, compression=False)
+        command.compute_checksums()
+        transfer = asyncio.create_task(self.connection.send_file(command))
+        await asyncio.sleep(0)
+        ping = asyncio.create_task(self.connection.ping(timeout=1))
+        await asyncio.sleep(0)
+
+        self.connection._dispatch(
+            ResponseModel("TRANSFER 0", {"status_message": "OK", "request_id": command.request_id})
+        )
+        for _ in range(5):
+            await asyncio.sleep(0)
+        self.connection._dispatch(
+            ResponseModel("TRANSFER 0", {"status_message": "OK", "request_id": command.request_id})
+        )
+        await transfer
+        while not any(key != command.request_id for key in self.connection._pending):
+            await asyncio.sleep(0)
+        ping_id = next(iter(self.connection._pending))
+        self.connection._dispatch(ResponseModel("PING 0", {"status_message": "OK", "request_id": ping_id}))
+        self.assertTrue(await ping)
+
+        data = bytes(self.writer.data)
+        self.assertLess(data.index(b"FILE-BODY"), data.index(b"PING"))
+        self.assertLess(data.index(b"TRANSFER"), data.index(b"FILE-BODY"))
+
+
+class ServerManagerTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ServerManager(host="127.0.0.1", port=0, command_timeout=0.3)
+        self.server.start()
+        # 接続するが応答を返さないクライアント
+        self.client = socket.create_connection(self.server.server_socket.getsockname())
+        deadline = time.monotonic() + 5
+        while not self.server.clients and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_send_command_times_out_and_unregisters(self):
+        started_at = time.monotonic()
+        result = self.server.send_command(ListCommand())
+        self.assertLess(time.monotonic() - started_at, 2)
+        self.assertEqual(result["status_message"], "ERROR")
+
+        connection = next(iter(self.server.clients.values()))
+        deadline = time.monotonic() + 2
+        while connection.pending_count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(connection.pending_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from app.ai.intent_router import DISPLAY_AGENT, DOCUMENT_AGENT, MAX_ROUTE_LENGTH, IntentRouter
+
+# (入力, 振り分ける部署, 一致するルール)
+ROUTED_CASES = [
+    ("次のシーン", DISPLAY_AGENT, "scene_change"),
+    ("前のシーンに戻して", DISPLAY_AGENT, "scene_change"),
+    ("シーンを切り替えて", DISPLAY_AGENT, "scene_change"),
+    ("ＮＥＸＴ　次の シーン", DISPLAY_AGENT, "scene_change"),
+    ("モデルを変更して", DISPLAY_AGENT, "model_change"),
+    ("恐竜に変えて", DISPLAY_AGENT, "model_change"),
+    ("今映ってるのは何", DISPLAY_AGENT, "current_display"),
+    ("何が表示されてる？", DISPLAY_AGENT, "current_display"),
+    ("表示できるモデルの一覧を見せて", DISPLAY_AGENT, "model_list"),
+    ("モデルの一覧", DISPLAY_AGENT, "model_list"),
+    ("ティラノサウルスについて教えて", DOCUMENT_AGENT, "explanation"),
+    ("このモデルの歴史を詳しく", DOCUMENT_AGENT, "explanation"),
+]
+
+# (入力, LLMに任せる理由)
+FALLBACK_CASES = [
+    # 表示中のモデルの解説は、表示操作とドキュメント検索のどちらの部署かをLLMに判断させる
+    ("今映っているモデルの解説", "ambiguous"),
+    ("次のシーンにしてから解説して", "compound"),
+    ("モデルを変更してそれから説明して", "compound"),
+    ("次のシーンにしてからモデルを変更して", "compound"),
+    ("次のシーン" + "あ" * MAX_ROUTE_LENGTH, "too_long"),
+    ("こんにちは", "no_match"),
+]
+
+
+class IntentRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.router = IntentRouter()
+
+    def test_obvious_intents_are_routed_by_rules(self):
+        for text, agent, rule in ROUTED_CASES:
+            with self.subTest(text=text):
+                decision = self.router.route(text, record=False)
+                self.assertEqual(decision.agent, agent)
+                self.assertEqual(decision.rule, rule)
+                self.assertEqual(decision.reason, "rule")
+
+    def test_uncertain_intents_fall_back_to_llm(self):
+        for text, reason in FALLBACK_CASES:
+            with self.subTest(text=text):
+                decision = self.router.route(text, record=False)
+                self.assertIsNone(decision.agent)
+                self.assertIsNone(decision.rule)
+                self.assertEqual(decision.reason, reason)
+
+    def test_max_length_is_configurable(self):
+        self.assertEqual(IntentRouter(max_length=3).route("次のシーン", record=False).reason, "too_long")
+
+    def test_stats_count_recorded_decisions_only(self):
+        self.router.route("次のシーン")
+        self.router.route("次のシーン")
+        self.router.route("こんにちは")
+        self.router.route("モデルを変更して", record=False)
+        self.assertEqual(self.router.stats(), {"scene_change": 2, "fallback:no_match": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
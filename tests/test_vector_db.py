@@ -0,0 +1,61 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from langchain_community.storage import SQLStore
+from langchain_core.embeddings import Embeddings
+
+from app.ai.vector_db import EMBEDDING_CACHE_NAMESPACE, create_cached_embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """埋め込みを計算したテキストを記録するEmbeddings"""
+
+    def __init__(self, model: str = "test-model"):
+        self.model = model
+        self.embedded: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_url = f"sqlite:///{os.path.join(self.temp_dir.name, 'cache.db')}"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_cached_texts_are_not_embedded_again(self):
+        embeddings = CountingEmbeddings()
+        cached = create_cached_embeddings(embeddings, batch_size=2, db_url=self.db_url)
+        first = cached.embed_documents(["a", "bb", "c"])
+        self.assertEqual(embeddings.embedded, ["a", "bb", "c"])
+
+        # 作り直したEmbeddingsでも、DBに保存したキャッシュを使用する
+        embeddings.embedded.clear()
+        cached = create_cached_embeddings(embeddings, batch_size=2, db_url=self.db_url)
+        second = cached.embed_documents(["a", "bb", "d"])
+        self.assertEqual(embeddings.embedded, ["d"])
+        self.assertEqual(second[:2], first[:2])
+
+    def test_keys_are_namespaced_sha256(self):
+        create_cached_embeddings(CountingEmbeddings(), db_url=self.db_url).embed_documents(["恐竜"])
+        keys = list(SQLStore(namespace=EMBEDDING_CACHE_NAMESPACE, db_url=self.db_url).yield_keys())
+        self.assertEqual(keys, [f"test-model/{hashlib.sha256('恐竜'.encode()).hexdigest()}"])
+
+    def test_models_do_not_share_cache(self):
+        create_cached_embeddings(CountingEmbeddings("model-a"), db_url=self.db_url).embed_documents(["a"])
+        embeddings = CountingEmbeddings("model-b")
+        create_cached_embeddings(embeddings, db_url=self.db_url).embed_documents(["a"])
+        self.assertEqual(embeddings.embedded, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()